@@ -1,8 +1,14 @@
 import pandas as pd
 import numpy as np
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, g
+from flask import has_request_context, Response, stream_with_context, abort
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 import joblib
 import os
@@ -17,10 +23,35 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from io import BytesIO
 import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.cell import WriteOnlyCell
 
 from datetime import timedelta
 import re
+import unicodedata
+import base64
+import csv
+import json
+import queue
+import zlib
+import gzip
+import hashlib
+import hmac
+import mimetypes
+import stat
+import tempfile
+import itertools
+from collections import OrderedDict, deque, namedtuple
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoTimeout
+import time
+from prometheus_client import (Counter, Gauge, Histogram, CollectorRegistry, REGISTRY,
+                               CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # sin brotli se comprime solo con gzip
 
 
 # ========== CONFIGURACIÓN DE FLASK ==========
@@ -53,8 +84,315 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 print("📌 Base de datos configurada:", DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else 'local')
 
+# ========== RÉPLICAS DE LECTURA ==========
+# URLs separadas por comas; sin réplicas todo va al primario.
+# En Postgres conviene añadir ?connect_timeout=2 para detectar caídas rápido.
+DATABASE_REPLICA_URLS = [
+    re.sub(r'^postgres://', 'postgresql://', url.strip())
+    for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+]
+REPLICAS = [f'replica_{i}' for i in range(len(DATABASE_REPLICA_URLS))]
+app.config['SQLALCHEMY_BINDS'] = dict(zip(REPLICAS, DATABASE_REPLICA_URLS))
+
+# Segundos que una réplica caída queda fuera antes de volver a sondearla
+REPLICA_REINTENTO_SEGUNDOS = float(os.environ.get('REPLICA_REINTENTO_SEGUNDOS', 30))
+# Tras una escritura, las lecturas del mismo usuario siguen en el primario (retraso de replicación)
+VENTANA_LECTURA_PROPIA_SEGUNDOS = float(os.environ.get('VENTANA_LECTURA_PROPIA_SEGUNDOS', 5))
+
+if REPLICAS:
+    print(f"📌 Réplicas de lectura: {len(REPLICAS)}")
+
+# ========== MÉTRICAS (PROMETHEUS) ==========
+# Con gunicorn, PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py) hace que cada
+# worker escriba sus valores en archivos mmap y /metrics los suma todos.
+# Sin esa variable las métricas son solo del proceso actual.
+# /metrics y /api/metricas piden "Authorization: Bearer <METRICAS_TOKEN>"; sin
+# token configurado solo responden con el servidor de desarrollo en modo debug.
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+BUCKETS_ETAPAS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+BUCKETS_EXPORTACIONES = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+LATENCIA_PETICIONES = Histogram('aeropredict_peticion_segundos', 'Latencia por ruta, método y estado',
+                                ['ruta', 'metodo', 'estado'])
+ETAPAS_PREDECIR = Histogram('aeropredict_predecir_etapa_segundos', 'Duración de cada etapa de /api/predecir',
+                            ['etapa'], buckets=BUCKETS_ETAPAS)
+DURACION_EXPORTACIONES = Histogram('aeropredict_exportacion_segundos', 'Duración de exportaciones del historial',
+                                   ['formato', 'estado'], buckets=BUCKETS_EXPORTACIONES)
+CARGA_MODELO_SEGUNDOS = Gauge('aeropredict_modelo_carga_segundos', 'Tiempo de la última carga del modelo',
+                              multiprocess_mode='mostrecent')
+FILAS_DATASET = Gauge('aeropredict_dataset_filas', 'Filas del dataset en memoria', multiprocess_mode='mostrecent')
+ESPERA_POOL = Histogram('aeropredict_db_pool_espera_segundos', 'Espera por una conexión del pool',
+                        buckets=BUCKETS_ETAPAS)
+CONEXIONES_NUEVAS = Histogram('aeropredict_db_conexion_segundos', 'Latencia al abrir una conexión nueva',
+                              buckets=BUCKETS_ETAPAS)
+AGOTAMIENTOS_POOL = Counter('aeropredict_db_pool_agotamientos', 'Checkouts que agotaron pool_timeout')
+CONEXIONES_EN_USO = Gauge('aeropredict_db_pool_en_uso', 'Conexiones prestadas por el pool',
+                          multiprocess_mode='livesum')
+
+# Series ya resueltas: .labels() toma un candado y arma la clave en cada llamada
+_series_peticiones = {}
+_etapas_predecir = {etapa: ETAPAS_PREDECIR.labels(etapa)
+                    for etapa in ('codificacion', 'escalado', 'modelo', 'guardado')}
+
+
+class MedirPeticiones:
+    """Middleware WSGI de latencia por ruta; evita los proxies de Flask (request, g),
+    que cuestan más que la propia observación"""
+    
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+    
+    def __call__(self, environ, start_response):
+        inicio = time.perf_counter()
+        clave = None
+        
+        def iniciar_respuesta(status, headers, exc_info=None):
+            nonlocal clave
+            # Aún dentro del contexto: Flask deja su Request en el environ hasta cerrarlo.
+            # La regla (no la URL) mantiene acotado el número de series.
+            peticion = environ.get('werkzeug.request')
+            regla = peticion.url_rule if peticion is not None else None
+            clave = (regla.rule if regla is not None else 'sin_ruta', environ['REQUEST_METHOD'], status[:3])
+            return start_response(status, headers, exc_info)
+        
+        cuerpo = self.wsgi_app(environ, iniciar_respuesta)
+        observar_peticion(clave, time.perf_counter() - inicio)
+        return cuerpo
+
+
+app.wsgi_app = MedirPeticiones(app.wsgi_app)
+
+
+def observar_peticion(clave, segundos):
+    """Observa la latencia de (ruta, método, estado); también la usan las rutas de asgi.py"""
+    serie = _series_peticiones.get(clave)
+    if serie is None:
+        serie = _series_peticiones[clave] = LATENCIA_PETICIONES.labels(*clave)
+    serie.observe(segundos)
+
+
+def metricas_autorizadas(autorizacion):
+    """Valida la cabecera Authorization contra METRICAS_TOKEN"""
+    if not METRICAS_TOKEN:
+        return app.debug
+    return hmac.compare_digest(autorizacion.encode(), f'Bearer {METRICAS_TOKEN}'.encode())
+
+
+def metricas_protegidas(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # 404 y no 401: sin token el endpoint no se anuncia
+        if not metricas_autorizadas(request.headers.get('Authorization', '')):
+            abort(404)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def registrar_etapa(etapa, desde):
+    """Observa la duración de una etapa de /api/predecir y devuelve el instante actual"""
+    ahora = time.perf_counter()
+    _etapas_predecir[etapa].observe(ahora - desde)
+    return ahora
+
+
+def medir_exportacion(partes, formato):
+    """Duración de una descarga por streaming, hasta el último byte o el corte del cliente"""
+    inicio = time.perf_counter()
+    estado = 'cancelada'
+    try:
+        yield from partes
+        estado = 'listo'
+    except Exception:
+        estado = 'error'
+        raise
+    finally:
+        DURACION_EXPORTACIONES.labels(formato, estado).observe(time.perf_counter() - inicio)
+
+
+def registro_metricas():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registro = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registro)
+    return registro
+
+
+# ========== POOL DE CONEXIONES ==========
+# Por proceso: workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW) debe caber en max_connections
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+
+_metricas_pool = {'checkouts': 0, 'espera_total': 0.0, 'espera_max': 0.0, 'agotamientos': 0,
+                  'conexiones': 0, 'conexion_total': 0.0, 'conexion_max': 0.0}
+_candado_metricas_pool = threading.Lock()
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mide la espera por conexión, la latencia de conexión y los agotamientos"""
+    
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            AGOTAMIENTOS_POOL.inc()
+            with _candado_metricas_pool:
+                _metricas_pool['agotamientos'] += 1
+            print(f"⚠️ Pool agotado: {self.checkedout()} conexiones en uso, "
+                  f"espera > {DB_POOL_TIMEOUT}s")
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            ESPERA_POOL.observe(espera)
+            with _candado_metricas_pool:
+                _metricas_pool['checkouts'] += 1
+                _metricas_pool['espera_total'] += espera
+                _metricas_pool['espera_max'] = max(_metricas_pool['espera_max'], espera)
+    
+    def _create_connection(self):
+        inicio = time.perf_counter()
+        conexion = super()._create_connection()
+        latencia = time.perf_counter() - inicio
+        CONEXIONES_NUEVAS.observe(latencia)
+        with _candado_metricas_pool:
+            _metricas_pool['conexiones'] += 1
+            _metricas_pool['conexion_total'] += latencia
+            _metricas_pool['conexion_max'] = max(_metricas_pool['conexion_max'], latencia)
+        return conexion
+    
+    def _do_get(self):
+        registro = super()._do_get()
+        CONEXIONES_EN_USO.inc()
+        return registro
+    
+    def _do_return_conn(self, registro):
+        CONEXIONES_EN_USO.dec()
+        super()._do_return_conn(registro)
+
+
+if DATABASE_URL in ('sqlite://', 'sqlite:///:memory:'):
+    # SQLite en memoria usa su propio pool de una conexión
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_pre_ping': True}
+else:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': PoolMedido,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True,
+    }
+
+
+class SesionEnrutada(Session):
+    """Sesión que envía las consultas de vistas @solo_lectura a la réplica elegida"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = g.get('replica')
+        if replica and bind is None and not self._flushing:
+            return db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
 # ========== INICIALIZAR SQLAlchemy AQUÍ (ANTES DE LOS MODELOS) ==========
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': SesionEnrutada})
+# ========== HASH DE CONTRASEÑAS ==========
+# El hash es caro a propósito: se calcula en un pool acotado para que una ráfaga
+# de logins no acapare la CPU (hashlib libera el GIL mientras calcula).
+HASH_METODO = os.environ.get('HASH_METODO', 'scrypt:32768:8:1')
+HASH_MAX_CONCURRENCIA = int(os.environ.get('HASH_MAX_CONCURRENCIA', 2))
+HASH_MAX_COLA = int(os.environ.get('HASH_MAX_COLA', 16))
+HASH_TIMEOUT = float(os.environ.get('HASH_TIMEOUT', 10))
+
+_ejecutor_hash = ThreadPoolExecutor(max_workers=HASH_MAX_CONCURRENCIA, thread_name_prefix='hash')
+_cupo_hash = threading.BoundedSemaphore(HASH_MAX_CONCURRENCIA + HASH_MAX_COLA)
+_metricas_hash = {'hashes': 0, 'cola_total': 0.0, 'cola_max': 0.0, 'calculo_total': 0.0,
+                  'rechazados': 0, 'pendientes': 0}
+_candado_metricas_hash = threading.Lock()
+
+
+class HashSaturado(Exception):
+    """La cola de hashing está llena o no respondió a tiempo"""
+
+
+def _ejecutar_hash(funcion, *args):
+    """Ejecuta `funcion` en el pool de hashing y espera su resultado"""
+    if not _cupo_hash.acquire(blocking=False):
+        with _candado_metricas_hash:
+            _metricas_hash['rechazados'] += 1
+        raise HashSaturado('Demasiadas autenticaciones en curso')
+    
+    encolado = time.perf_counter()
+    
+    def tarea():
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args)
+        finally:
+            fin = time.perf_counter()
+            with _candado_metricas_hash:
+                _metricas_hash['hashes'] += 1
+                _metricas_hash['cola_total'] += inicio - encolado
+                _metricas_hash['cola_max'] = max(_metricas_hash['cola_max'], inicio - encolado)
+                _metricas_hash['calculo_total'] += fin - inicio
+    
+    def liberar(_):
+        _cupo_hash.release()
+        with _candado_metricas_hash:
+            _metricas_hash['pendientes'] -= 1
+    
+    with _candado_metricas_hash:
+        _metricas_hash['pendientes'] += 1
+    futuro = _ejecutor_hash.submit(tarea)
+    futuro.add_done_callback(liberar)
+    try:
+        return futuro.result(timeout=HASH_TIMEOUT)
+    except FuturoTimeout:
+        with _candado_metricas_hash:
+            _metricas_hash['rechazados'] += 1
+        raise HashSaturado('El hash de la contraseña tardó demasiado')
+
+
+def _reiniciar_pool_hash():
+    """Los hilos del pool no sobreviven al fork: cada worker crea el suyo"""
+    global _ejecutor_hash, _cupo_hash, _candado_metricas_hash
+    _ejecutor_hash = ThreadPoolExecutor(max_workers=HASH_MAX_CONCURRENCIA, thread_name_prefix='hash')
+    _cupo_hash = threading.BoundedSemaphore(HASH_MAX_CONCURRENCIA + HASH_MAX_COLA)
+    _candado_metricas_hash = threading.Lock()
+    _metricas_hash['pendientes'] = 0
+
+
+os.register_at_fork(after_in_child=_reiniciar_pool_hash)
+
+
+def calcular_hash(contrasena):
+    return _ejecutar_hash(generate_password_hash, contrasena, HASH_METODO)
+
+
+def verificar_hash(hash_guardado, contrasena):
+    return _ejecutar_hash(check_password_hash, hash_guardado, contrasena)
+
+
+def hash_obsoleto(hash_guardado):
+    """True si el hash usa parámetros distintos de HASH_METODO"""
+    return hash_guardado.split('$', 1)[0] != HASH_METODO
+
+
+def metricas_hash():
+    with _candado_metricas_hash:
+        m = dict(_metricas_hash)
+    return {
+        'concurrencia': HASH_MAX_CONCURRENCIA,
+        'pendientes': m['pendientes'],
+        'hashes': m['hashes'],
+        'rechazados': m['rechazados'],
+        'cola_promedio_ms': round(m['cola_total'] / max(m['hashes'], 1) * 1000, 3),
+        'cola_max_ms': round(m['cola_max'] * 1000, 3),
+        'calculo_promedio_ms': round(m['calculo_total'] / max(m['hashes'], 1) * 1000, 3),
+    }
+
 # ========== MODELOS DE BASE DE DATOS ==========
 class Usuario(db.Model):
     __tablename__ = 'usuarios'
@@ -73,11 +411,18 @@ class Usuario(db.Model):
         cascade='all, delete-orphan'
     )
 
+    estadisticas = db.relationship(
+        'UsuarioEstadisticas',
+        uselist=False,
+        lazy=True,
+        cascade='all, delete-orphan'
+    )
+
     def set_password(self, contrasena):
-        self.contrasena = generate_password_hash(contrasena)
+        self.contrasena = calcular_hash(contrasena)
     
     def check_password(self, contrasena):
-        return check_password_hash(self.contrasena, contrasena)
+        return verificar_hash(self.contrasena, contrasena)
 
 
 class Prediccion(db.Model):
@@ -96,12 +441,238 @@ class Prediccion(db.Model):
     precio_predicho = db.Column(db.Float, nullable=False)
     fecha_prediccion = db.Column(db.DateTime, default=datetime.now)
 
+    # Sirve al historial paginado por (fecha_prediccion, id) de cada usuario
+    __table_args__ = (
+        db.Index('ix_predicciones_usuario_fecha', usuario_id, fecha_prediccion.desc(), id.desc()),
+    )
+
+class UsuarioEstadisticas(db.Model):
+    """Resumen del historial de cada usuario, mantenido con cada predicción"""
+    __tablename__ = 'usuario_estadisticas'
+    
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    suma_precio = db.Column(db.Float, nullable=False, default=0)
+    precio_min = db.Column(db.Float)
+    precio_max = db.Column(db.Float)
+    suma_duracion = db.Column(db.Float, nullable=False, default=0)
+    total_escalas = db.Column(db.Integer, nullable=False, default=0)
+    ultima_prediccion = db.Column(db.DateTime)
+    ultima_prediccion_id = db.Column(db.Integer)
+    rutas = db.Column(db.JSON, nullable=False, default=dict)  # {"LIM-CUZ": 12, ...}
+
+    @property
+    def precio_promedio(self):
+        return self.suma_precio / self.total if self.total else 0
+
+    @property
+    def duracion_promedio(self):
+        return self.suma_duracion / self.total if self.total else 0
+
+    def rutas_top(self, n=5):
+        return dict(sorted(self.rutas.items(), key=lambda x: (-x[1], x[0]))[:n])
+
+    def registrar(self, prediccion):
+        """Suma una predicción nueva al resumen"""
+        precio = prediccion.precio_predicho
+        ruta = f"{prediccion.origen}-{prediccion.destino}"
+        
+        self.total = (self.total or 0) + 1
+        self.suma_precio = (self.suma_precio or 0) + precio
+        self.precio_min = precio if self.precio_min is None else min(self.precio_min, precio)
+        self.precio_max = precio if self.precio_max is None else max(self.precio_max, precio)
+        self.suma_duracion = (self.suma_duracion or 0) + prediccion.duracion
+        self.total_escalas = (self.total_escalas or 0) + prediccion.escalas
+        self.ultima_prediccion = prediccion.fecha_prediccion
+        self.ultima_prediccion_id = prediccion.id
+        # Reasignar el dict para que SQLAlchemy detecte el cambio en la columna JSON
+        rutas = dict(self.rutas or {})
+        rutas[ruta] = rutas.get(ruta, 0) + 1
+        self.rutas = rutas
+
+# Tablas que se pueden exportar/importar en bloque (mantenimiento_db.py)
+TABLAS_MASIVAS = {
+    'usuarios': Usuario.__table__,
+    'predicciones': Prediccion.__table__,
+}
+
+# ========== ESQUEMA ==========
+def inicializar_esquema():
+    """Crea las tablas y los índices que create_all() no agrega a tablas existentes"""
+    if es_postgres() and not db.inspect(db.engine).has_table(Prediccion.__tablename__):
+        # En Postgres, predicciones se crea particionada por mes
+        Usuario.__table__.create(bind=db.engine, checkfirst=True)
+        with db.engine.begin() as conexion:
+            conexion.execute(db.text(DDL_PREDICCIONES_PARTICIONADA))
+    
+    estadisticas_nueva = not db.inspect(db.engine).has_table(UsuarioEstadisticas.__tablename__)
+    db.create_all()
+    for indice in Prediccion.__table__.indexes:
+        indice.create(bind=db.engine, checkfirst=True)
+    asegurar_particiones()
+    
+    if estadisticas_nueva:
+        # Base existente: el resumen se llena desde el historial que ya hay
+        try:
+            usuarios = reconstruir_estadisticas()
+            print(f"✓ usuario_estadisticas creada para {usuarios} usuarios")
+        except exc.IntegrityError:
+            # Otro worker la llenó al mismo tiempo
+            db.session.rollback()
+
+# ========== PARTICIONADO DE PREDICCIONES (POSTGRES) ==========
+# La tabla se particiona por rango mensual de fecha_prediccion. Postgres exige
+# que la clave primaria incluya la columna de partición, por eso la PK física
+# es (id, fecha_prediccion); el modelo Prediccion sigue usando solo id.
+PARTICIONES_MESES_FUTUROS = int(os.environ.get('PARTICIONES_MESES_FUTUROS', 3))
+
+DDL_PREDICCIONES_PARTICIONADA = """
+CREATE TABLE predicciones (
+    id SERIAL,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    aerolinea VARCHAR(100) NOT NULL,
+    origen VARCHAR(10) NOT NULL,
+    destino VARCHAR(10) NOT NULL,
+    fecha_viaje DATE NOT NULL,
+    hora_salida VARCHAR(10) NOT NULL,
+    duracion FLOAT NOT NULL,
+    escalas INTEGER NOT NULL,
+    informacion VARCHAR(100) NOT NULL,
+    precio_predicho FLOAT NOT NULL,
+    fecha_prediccion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, fecha_prediccion)
+) PARTITION BY RANGE (fecha_prediccion)
+"""
+
+_mes_particiones_verificado = None
+
+def es_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+def predicciones_particionada():
+    """True si predicciones es una tabla particionada de Postgres"""
+    if not es_postgres():
+        return False
+    return db.session.execute(db.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = to_regclass('predicciones'))"
+    )).scalar()
+
+def sumar_meses(fecha, meses):
+    total = fecha.year * 12 + fecha.month - 1 + meses
+    return fecha.replace(year=total // 12, month=total % 12 + 1, day=1)
+
+def nombre_particion(mes):
+    return f"predicciones_{mes.year:04d}_{mes.month:02d}"
+
+def crear_particion(conexion, mes):
+    conexion.execute(db.text(
+        f"CREATE TABLE IF NOT EXISTS {nombre_particion(mes)} PARTITION OF predicciones "
+        f"FOR VALUES FROM ('{mes:%Y-%m-%d}') TO ('{sumar_meses(mes, 1):%Y-%m-%d}')"
+    ))
+
+def asegurar_particiones(desde=None, meses_futuros=PARTICIONES_MESES_FUTUROS):
+    """Crea las particiones mensuales desde `desde` (o el mes actual) hasta N meses adelante"""
+    global _mes_particiones_verificado
+    mes_actual = datetime.now().date().replace(day=1)
+    if not predicciones_particionada():
+        # También se recuerda el resultado negativo: no repetir la consulta al catálogo
+        _mes_particiones_verificado = mes_actual
+        return False
+    
+    mes = (desde or mes_actual).replace(day=1)
+    with db.engine.begin() as conexion:
+        # Varios procesos pueden llegar a la vez (arranque de workers, cambio de mes):
+        # CREATE TABLE IF NOT EXISTS concurrente falla, así que se serializa
+        conexion.execute(db.text("SELECT pg_advisory_xact_lock(hashtext('predicciones_particiones'))"))
+        while mes <= sumar_meses(mes_actual, meses_futuros):
+            crear_particion(conexion, mes)
+            mes = sumar_meses(mes, 1)
+        # Red de seguridad para filas fuera del rango creado
+        conexion.execute(db.text(
+            "CREATE TABLE IF NOT EXISTS predicciones_default PARTITION OF predicciones DEFAULT"
+        ))
+    _mes_particiones_verificado = mes_actual
+    return True
+
+def asegurar_particiones_mes_actual():
+    """Respaldo en el camino de inserción, una vez por mes y proceso.
+
+    Las particiones se crean por adelantado al iniciar la app y con
+    `mantenimiento_db.py crear-particiones` (programarlo mensualmente); aquí solo
+    se comprueba que exista la del mes y se crea si alguien olvidó hacerlo."""
+    global _mes_particiones_verificado
+    mes_actual = datetime.now().date().replace(day=1)
+    if _mes_particiones_verificado == mes_actual:
+        return
+    if es_postgres() and db.session.execute(
+            db.text("SELECT to_regclass(:nombre) IS NOT NULL"), {'nombre': nombre_particion(mes_actual)}).scalar():
+        _mes_particiones_verificado = mes_actual
+        return
+    asegurar_particiones()
+
+def particiones_predicciones():
+    """Particiones mensuales existentes como [(nombre, primer día del mes)] ordenadas"""
+    filas = db.session.execute(db.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('predicciones')"
+    )).scalars()
+    particiones = []
+    for nombre in filas:
+        coincidencia = re.fullmatch(r'predicciones_(\d{4})_(\d{2})', nombre)
+        if coincidencia:
+            particiones.append((nombre, datetime(int(coincidencia[1]), int(coincidencia[2]), 1).date()))
+    return sorted(particiones, key=lambda p: p[1])
+
+def particionar_predicciones():
+    """Convierte una tabla predicciones existente (sin particionar) en particionada"""
+    if not es_postgres():
+        raise RuntimeError('El particionado solo está disponible en PostgreSQL')
+    if predicciones_particionada():
+        return 0
+    
+    minimo = db.session.execute(db.text("SELECT min(fecha_prediccion) FROM predicciones")).scalar()
+    db.session.rollback()
+    mes_actual = datetime.now().date().replace(day=1)
+    
+    with db.engine.begin() as conexion:
+        conexion.execute(db.text("ALTER TABLE predicciones RENAME TO predicciones_sin_particionar"))
+        conexion.execute(db.text(
+            "ALTER INDEX IF EXISTS ix_predicciones_usuario_fecha "
+            "RENAME TO ix_predicciones_usuario_fecha_sin_particionar"
+        ))
+        conexion.execute(db.text(DDL_PREDICCIONES_PARTICIONADA))
+        
+        mes = (minimo.date() if minimo else mes_actual).replace(day=1)
+        while mes <= sumar_meses(mes_actual, PARTICIONES_MESES_FUTUROS):
+            crear_particion(conexion, mes)
+            mes = sumar_meses(mes, 1)
+        conexion.execute(db.text(
+            "CREATE TABLE predicciones_default PARTITION OF predicciones DEFAULT"
+        ))
+        
+        columnas = ', '.join(c.name for c in Prediccion.__table__.columns)
+        filas = conexion.execute(db.text(
+            f"INSERT INTO predicciones ({columnas}) "
+            f"SELECT {columnas} FROM predicciones_sin_particionar"
+        )).rowcount
+        conexion.execute(db.text(
+            "SELECT setval(pg_get_serial_sequence('predicciones', 'id'), "
+            "COALESCE((SELECT max(id) FROM predicciones), 0) + 1, false)"
+        ))
+        conexion.execute(db.text("DROP TABLE predicciones_sin_particionar"))
+    
+    for indice in Prediccion.__table__.indexes:
+        indice.create(bind=db.engine, checkfirst=True)
+    return filas
+
 # ========== VARIABLES GLOBALES ==========
 modelo = None
 scaler = None
 label_encoders = None
 features = None
 datos_cache = None
+indice_precios = None
 
 # ========== DECORADORES ==========
 def login_requerido(f):
@@ -112,6 +683,938 @@ def login_requerido(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# ========== ENRUTADO A RÉPLICAS ==========
+_replicas_caidas = {}  # clave -> instante hasta el que no se usa
+_turno_replicas = itertools.count()
+
+
+def marcar_replica_caida(clave):
+    if clave not in _replicas_caidas:
+        print(f"⚠️ Réplica {clave} no disponible, usando el primario")
+    _replicas_caidas[clave] = time.time() + REPLICA_REINTENTO_SEGUNDOS
+
+
+def replica_disponible(clave):
+    """Una réplica caída se sondea con SELECT 1 cuando vence su intervalo de reintento"""
+    caida_hasta = _replicas_caidas.get(clave)
+    if caida_hasta is None:
+        return True
+    if time.time() < caida_hasta:
+        return False
+    try:
+        with db.engines[clave].connect() as conexion:
+            conexion.execute(db.text('SELECT 1'))
+    except exc.SQLAlchemyError:
+        marcar_replica_caida(clave)
+        return False
+    _replicas_caidas.pop(clave, None)
+    print(f"✅ Réplica {clave} recuperada")
+    return True
+
+
+def elegir_replica():
+    """Réplica sana por turno rotatorio; None si no hay ninguna"""
+    if not REPLICAS:
+        return None
+    inicio = next(_turno_replicas)
+    for i in range(len(REPLICAS)):
+        clave = REPLICAS[(inicio + i) % len(REPLICAS)]
+        if replica_disponible(clave):
+            return clave
+    return None
+
+
+def _error_en_replica(contexto):
+    """Marca la réplica como caída ante errores de conexión"""
+    if contexto.is_disconnect or isinstance(contexto.sqlalchemy_exception, exc.OperationalError):
+        clave = g.get('replica')
+        if clave:
+            marcar_replica_caida(clave)
+            g.replica_fallida = True
+
+
+with app.app_context():
+    for _clave in REPLICAS:
+        event.listen(db.engines[_clave], 'handle_error', _error_en_replica)
+
+
+def _reiniciar_pool_en_hijo():
+    """Tras fork (gunicorn --preload) el hijo no debe reutilizar sockets del padre"""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reiniciar_pool_en_hijo)
+
+
+def metricas_pool():
+    """Estado de los pools de este proceso y acumulados de espera/conexión"""
+    with _candado_metricas_pool:
+        m = dict(_metricas_pool)
+    pools = {}
+    for clave, engine in db.engines.items():
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            pools[clave or 'primario'] = {
+                'tamano': pool.size(),
+                'en_uso': pool.checkedout(),
+                'libres': pool.checkedin(),
+                'overflow': pool.overflow(),
+            }
+    return {
+        'pid': os.getpid(),
+        'pools': pools,
+        'checkouts': m['checkouts'],
+        'espera_promedio_ms': round(m['espera_total'] / max(m['checkouts'], 1) * 1000, 3),
+        'espera_max_ms': round(m['espera_max'] * 1000, 3),
+        'agotamientos': m['agotamientos'],
+        'conexiones_abiertas': m['conexiones'],
+        'conexion_promedio_ms': round(m['conexion_total'] / max(m['conexiones'], 1) * 1000, 3),
+        'conexion_max_ms': round(m['conexion_max'] * 1000, 3),
+    }
+
+
+@event.listens_for(SesionEnrutada, 'after_flush')
+def _marcar_escritura(sesion, contexto_flush):
+    if has_request_context():
+        g.escritura = True
+
+
+@app.after_request
+def _recordar_escritura(respuesta):
+    """Guarda en la sesión el instante de la última escritura (lectura de lo propio)"""
+    if REPLICAS and g.get('escritura') and 'usuario_id' in session:
+        session['ultima_escritura'] = time.time()
+    return respuesta
+
+
+def solo_lectura(f):
+    """Ejecuta la vista en una réplica; si la réplica falla, la repite en el primario"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        reciente = time.time() - session.get('ultima_escritura', 0) < VENTANA_LECTURA_PROPIA_SEGUNDOS
+        g.replica = None if reciente else elegir_replica()
+        if g.replica is None:
+            return f(*args, **kwargs)
+        
+        try:
+            respuesta = f(*args, **kwargs)
+            if not g.get('replica_fallida'):
+                return respuesta
+        except exc.OperationalError:
+            if not g.get('replica_fallida'):
+                raise
+        db.session.rollback()
+        g.replica = None
+        return f(*args, **kwargs)
+    return decorated_function
+
+# ========== CACHÉ DE PERFILES ==========
+# Caché LRU por proceso. La clave incluye la versión guardada en la cookie de
+# sesión: al editar el perfil se cambia la versión solo en la cookie del
+# navegador que editó, y esa sesión falla la caché en todos los workers. Las
+# otras sesiones del mismo usuario conservan su versión y, en los workers que
+# no atendieron la edición, pueden ver el usuario y el email anteriores hasta
+# PERFIL_CACHE_TTL segundos.
+PERFIL_CACHE_MAX = int(os.environ.get('PERFIL_CACHE_MAX', 1024))
+PERFIL_CACHE_TTL = float(os.environ.get('PERFIL_CACHE_TTL', 300))
+
+PerfilUsuario = namedtuple('PerfilUsuario', 'id usuario email fecha_creacion')
+
+_cache_perfiles = OrderedDict()  # (usuario_id, versión) -> (expira, PerfilUsuario)
+_candado_perfiles = threading.Lock()
+_metricas_perfiles = {'aciertos': 0, 'fallos': 0}
+
+
+def nueva_version_perfil():
+    session['version_perfil'] = time.time_ns()
+
+
+def obtener_perfil(usuario_id):
+    """Datos básicos del usuario desde la caché; consulta la base solo si falla"""
+    version = session.get('version_perfil')
+    perfil = perfil_en_cache(usuario_id, version)
+    if perfil is None:
+        usuario = db.session.get(Usuario, usuario_id)
+        perfil = PerfilUsuario(usuario.id, usuario.usuario, usuario.email, usuario.fecha_creacion)
+        guardar_perfil_en_cache(usuario_id, version, perfil)
+    return perfil
+
+
+def perfil_en_cache(usuario_id, version):
+    clave = (usuario_id, version)
+    with _candado_perfiles:
+        entrada = _cache_perfiles.get(clave)
+        if entrada and entrada[0] > time.monotonic():
+            _cache_perfiles.move_to_end(clave)
+            _metricas_perfiles['aciertos'] += 1
+            return entrada[1]
+        _metricas_perfiles['fallos'] += 1
+    return None
+
+
+def guardar_perfil_en_cache(usuario_id, version, perfil):
+    clave = (usuario_id, version)
+    with _candado_perfiles:
+        _cache_perfiles[clave] = (time.monotonic() + PERFIL_CACHE_TTL, perfil)
+        _cache_perfiles.move_to_end(clave)
+        while len(_cache_perfiles) > PERFIL_CACHE_MAX:
+            _cache_perfiles.popitem(last=False)
+
+
+def invalidar_perfil(usuario_id):
+    """Descarta las entradas del usuario en este proceso y cambia la versión de la sesión actual"""
+    with _candado_perfiles:
+        for clave in [c for c in _cache_perfiles if c[0] == usuario_id]:
+            del _cache_perfiles[clave]
+    nueva_version_perfil()
+
+
+def metricas_perfiles():
+    with _candado_perfiles:
+        aciertos, fallos = _metricas_perfiles['aciertos'], _metricas_perfiles['fallos']
+        entradas = len(_cache_perfiles)
+    return {
+        'entradas': entradas,
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': round(aciertos / max(aciertos + fallos, 1), 4),
+    }
+
+# ========== AGREGADOS DEL HISTORIAL ==========
+def obtener_estadisticas(usuario_id):
+    """Resumen O(1) del historial del usuario (una lectura por clave primaria)"""
+    estadisticas = db.session.get(UsuarioEstadisticas, usuario_id)
+    return estadisticas or UsuarioEstadisticas(usuario_id=usuario_id, total=0, suma_precio=0,
+                                               suma_duracion=0, total_escalas=0, rutas={})
+
+def registrar_prediccion(prediccion):
+    """Guarda la predicción y actualiza el resumen del usuario en la misma transacción"""
+    asegurar_particiones_mes_actual()
+    db.session.add(prediccion)
+    db.session.flush()  # Asigna id y fecha_prediccion
+    
+    estadisticas = db.session.get(UsuarioEstadisticas, prediccion.usuario_id, with_for_update=True)
+    if estadisticas is None:
+        # Usuario sin fila de resumen (el registro ya la crea). Sin fila, FOR UPDATE no
+        # bloquea nada: dos primeras predicciones concurrentes chocarían al insertarla.
+        # La fila parte del historial que ya tenga, sin contar la predicción recién guardada.
+        historial = _agregados_por_usuario(Prediccion.usuario_id == prediccion.usuario_id,
+                                           Prediccion.id != prediccion.id)
+        valores = historial.get(prediccion.usuario_id, {'rutas': {}})
+        insertar = postgresql_insert if db.session.get_bind().dialect.name == 'postgresql' else sqlite_insert
+        db.session.execute(insertar(UsuarioEstadisticas.__table__)
+                           .values(usuario_id=prediccion.usuario_id, **valores)
+                           .on_conflict_do_nothing(index_elements=['usuario_id']))
+        estadisticas = db.session.get(UsuarioEstadisticas, prediccion.usuario_id, with_for_update=True)
+    estadisticas.registrar(prediccion)
+    
+    db.session.commit()
+
+def _agregados_por_usuario(*condiciones):
+    """Agregados por (usuario, ruta) calculados desde la tabla predicciones (filtrada por `condiciones`)"""
+    precio = Prediccion.precio_predicho
+    consulta = db.select(
+        Prediccion.usuario_id, Prediccion.origen, Prediccion.destino,
+        db.func.count(Prediccion.id).label('total'),
+        db.func.sum(precio).label('suma_precio'),
+        db.func.min(precio).label('precio_min'),
+        db.func.max(precio).label('precio_max'),
+        db.func.sum(Prediccion.duracion).label('suma_duracion'),
+        db.func.sum(Prediccion.escalas).label('total_escalas'),
+        db.func.max(Prediccion.fecha_prediccion).label('ultima_prediccion'),
+        db.func.max(Prediccion.id).label('ultima_prediccion_id')
+    ).where(*condiciones).group_by(Prediccion.usuario_id, Prediccion.origen, Prediccion.destino)
+    
+    agregados = {}
+    for f in db.session.execute(consulta):
+        a = agregados.setdefault(f.usuario_id, {
+            'total': 0, 'suma_precio': 0.0, 'precio_min': None, 'precio_max': None,
+            'suma_duracion': 0.0, 'total_escalas': 0, 'ultima_prediccion': None,
+            'ultima_prediccion_id': None, 'rutas': {}
+        })
+        a['total'] += f.total
+        a['suma_precio'] += f.suma_precio
+        a['precio_min'] = f.precio_min if a['precio_min'] is None else min(a['precio_min'], f.precio_min)
+        a['precio_max'] = f.precio_max if a['precio_max'] is None else max(a['precio_max'], f.precio_max)
+        a['suma_duracion'] += f.suma_duracion
+        a['total_escalas'] += f.total_escalas
+        a['ultima_prediccion'] = max(filter(None, [a['ultima_prediccion'], f.ultima_prediccion]), default=None)
+        a['ultima_prediccion_id'] = max(filter(None, [a['ultima_prediccion_id'], f.ultima_prediccion_id]), default=None)
+        a['rutas'][f"{f.origen}-{f.destino}"] = f.total
+    return agregados
+
+def reconstruir_estadisticas():
+    """Recalcula desde cero la tabla usuario_estadisticas. Devuelve cuántos usuarios procesó"""
+    agregados = _agregados_por_usuario()
+    usuarios = db.session.execute(db.select(Usuario.id)).scalars().all()
+    
+    db.session.execute(db.delete(UsuarioEstadisticas))
+    vacio = {'total': 0, 'suma_precio': 0, 'suma_duracion': 0, 'total_escalas': 0, 'rutas': {}}
+    db.session.add_all([
+        UsuarioEstadisticas(usuario_id=usuario_id, **agregados.get(usuario_id, vacio))
+        for usuario_id in usuarios
+    ])
+    db.session.commit()
+    return len(usuarios)
+
+def verificar_estadisticas():
+    """Compara usuario_estadisticas con los agregados reales. Devuelve la lista de diferencias"""
+    agregados = _agregados_por_usuario()
+    guardadas = {e.usuario_id: e for e in UsuarioEstadisticas.query.all()}
+    usuarios = db.session.execute(db.select(Usuario.id)).scalars().all()
+    
+    diferencias = []
+    for usuario_id in usuarios:
+        esperado = agregados.get(usuario_id, {'total': 0, 'suma_precio': 0, 'precio_min': None,
+                                              'precio_max': None, 'suma_duracion': 0,
+                                              'total_escalas': 0, 'rutas': {}})
+        actual = guardadas.get(usuario_id)
+        if actual is None:
+            if esperado['total']:
+                diferencias.append((usuario_id, 'fila', None, esperado['total']))
+            continue
+        for campo in ['total', 'total_escalas', 'precio_min', 'precio_max', 'rutas']:
+            if getattr(actual, campo) != esperado[campo]:
+                diferencias.append((usuario_id, campo, getattr(actual, campo), esperado[campo]))
+        for campo in ['suma_precio', 'suma_duracion']:
+            if not np.isclose(getattr(actual, campo) or 0, esperado[campo]):
+                diferencias.append((usuario_id, campo, getattr(actual, campo), esperado[campo]))
+    return diferencias
+
+# ========== PAGINACIÓN DEL HISTORIAL (KEYSET) ==========
+TAMANO_PAGINA_HISTORIAL = 50
+LIMITE_MAXIMO_PAGINA = 200
+
+def codificar_cursor(prediccion):
+    """Cursor opaco con la posición (fecha_prediccion, id) de la última fila de la página"""
+    valor = f"{prediccion.fecha_prediccion.isoformat()}|{prediccion.id}"
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha_prediccion, id); lanza ValueError si el cursor no es válido"""
+    try:
+        fecha, id_prediccion = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(fecha), int(id_prediccion)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+def pagina_predicciones(usuario_id, cursor=None, limite=TAMANO_PAGINA_HISTORIAL):
+    """Una página del historial, de la más reciente a la más antigua
+    
+    Usa paginación por clave (keyset) sobre el índice (usuario_id,
+    fecha_prediccion DESC, id DESC): cada página cuesta lo mismo sin importar
+    cuántas predicciones tenga el usuario. Devuelve (predicciones, siguiente_cursor).
+    """
+    predicciones = db.session.scalars(consulta_pagina(usuario_id, cursor, limite)).all()
+    return partir_pagina(predicciones, limite)
+
+def consulta_pagina(usuario_id, cursor=None, limite=TAMANO_PAGINA_HISTORIAL):
+    """SELECT de una página (pide una fila de más para saber si hay siguiente)"""
+    consulta = db.select(Prediccion).where(Prediccion.usuario_id == usuario_id)
+    if cursor:
+        fecha, id_prediccion = decodificar_cursor(cursor)
+        consulta = consulta.where(
+            db.tuple_(Prediccion.fecha_prediccion, Prediccion.id) < (fecha, id_prediccion),
+            # Redundante, pero permite a Postgres descartar las particiones más nuevas
+            Prediccion.fecha_prediccion <= fecha
+        )
+    return consulta.order_by(Prediccion.fecha_prediccion.desc(), Prediccion.id.desc()).limit(limite + 1)
+
+def partir_pagina(predicciones, limite):
+    siguiente_cursor = None
+    if len(predicciones) > limite:
+        predicciones = predicciones[:limite]
+        siguiente_cursor = codificar_cursor(predicciones[-1])
+    return predicciones, siguiente_cursor
+
+# ========== EXPORTACIÓN DEL HISTORIAL ==========
+TAMANO_LOTE_EXPORTACION = 2000
+
+COLUMNAS_EXPORTACION = (
+    Prediccion.fecha_viaje, Prediccion.aerolinea, Prediccion.origen, Prediccion.destino,
+    Prediccion.duracion, Prediccion.escalas, Prediccion.precio_predicho
+)
+
+
+def filas_historial(usuario_id, lote=TAMANO_LOTE_EXPORTACION):
+    """Historial completo en streaming (cursor de servidor en Postgres), más reciente primero"""
+    return db.session.execute(
+        db.select(*COLUMNAS_EXPORTACION)
+        .where(Prediccion.usuario_id == usuario_id)
+        .order_by(Prediccion.fecha_prediccion.desc(), Prediccion.id.desc())
+        .execution_options(yield_per=lote)
+    )
+
+
+def escribir_excel_historial(usuario_id, nombre_usuario, total, archivo, progreso=None):
+    """Escribe el historial en `archivo` con un workbook write-only (memoria constante)"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Historial de Predicciones")
+    
+    # Estilos con nombre: cada celda solo guarda una referencia
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    centrado = Alignment(horizontal='center', vertical='center')
+    estilos = {
+        'titulo': NamedStyle('titulo', font=Font(bold=True, size=16, color="667EEA"), alignment=centrado),
+        'info': NamedStyle('info', font=Font(size=10, italic=True), alignment=Alignment(horizontal='center')),
+        'encabezado': NamedStyle('encabezado', font=Font(bold=True, color="FFFFFF", size=12),
+                                 fill=PatternFill(start_color="667EEA", end_color="667EEA", fill_type="solid"),
+                                 alignment=centrado, border=border),
+        'celda': NamedStyle('celda', alignment=centrado, border=border),
+        'etiqueta': NamedStyle('etiqueta', font=Font(bold=True)),
+        'valor': NamedStyle('valor', font=Font(bold=True, color="667EEA")),
+    }
+    for estilo in estilos.values():
+        wb.add_named_style(estilo)
+    
+    def celda(valor, estilo):
+        c = WriteOnlyCell(ws, value=valor)
+        c.style = estilo
+        return c
+    
+    # Anchos y celdas combinadas se definen antes de escribir filas
+    column_widths = [5, 15, 20, 10, 10, 12, 10, 12]
+    for i, width in enumerate(column_widths, 1):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = width
+    ws.merged_cells.add('A1:H1')
+    ws.merged_cells.add('A2:H2')
+    
+    ws.append([celda(f"Historial de Predicciones - {nombre_usuario}", 'titulo')])
+    ws.append([celda(f"Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Total: {total} predicciones", 'info')])
+    ws.append([])
+    headers = ['#', 'Fecha Viaje', 'Aerolínea', 'Origen', 'Destino', 'Duración (h)', 'Escalas', 'Precio (S/)']
+    ws.append([celda(h, 'encabezado') for h in headers])
+    
+    # Datos y estadísticas en una sola pasada
+    n, suma, minimo, maximo = 0, 0.0, float('inf'), float('-inf')
+    for fecha_viaje, aerolinea, origen, destino, duracion, escalas, precio in filas_historial(usuario_id):
+        n += 1
+        suma += precio
+        minimo = min(minimo, precio)
+        maximo = max(maximo, precio)
+        ws.append([celda(v, 'celda') for v in (
+            n, fecha_viaje.strftime('%Y-%m-%d'), aerolinea, origen, destino, duracion, escalas, precio
+        )])
+        if progreso and n % TAMANO_LOTE_EXPORTACION == 0:
+            progreso(n)
+    
+    ws.append([])
+    ws.append([celda('ESTADÍSTICAS', 'etiqueta')])
+    if n:
+        for etiqueta, valor in (('Precio Promedio:', suma / n), ('Precio Mínimo:', minimo), ('Precio Máximo:', maximo)):
+            ws.append([celda(etiqueta, 'etiqueta'), '', '', '', '', '', '', celda(f"S/ {valor:.2f}", 'valor')])
+    
+    wb.save(archivo)
+    return n
+
+
+class FlowablesPerezosos:
+    """Lista mínima para `doc.build`: ReportLab consume por el frente y los
+    flowables se generan a demanda, así nunca están todas las tablas en memoria"""
+    
+    def __init__(self, generador):
+        self._pendientes = []
+        self._generador = iter(generador)
+    
+    def _llenar(self, cantidad):
+        while len(self._pendientes) < cantidad:
+            siguiente = next(self._generador, None)
+            if siguiente is None:
+                return
+            self._pendientes.append(siguiente)
+    
+    def __len__(self):
+        self._llenar(2)
+        return len(self._pendientes)
+    
+    def __getitem__(self, indice):
+        if isinstance(indice, int):
+            self._llenar(indice + 1)
+        return self._pendientes[indice]
+    
+    def __setitem__(self, indice, valor):
+        self._pendientes[indice] = valor
+    
+    def __delitem__(self, indice):
+        if isinstance(indice, int):
+            self._llenar(indice + 1)
+        del self._pendientes[indice]
+    
+    def insert(self, indice, valor):
+        self._pendientes.insert(indice, valor)
+
+
+# Filas por tabla: una tabla pequeña por página en vez de una gigante
+FILAS_POR_TABLA_PDF = 22
+
+
+def escribir_pdf_historial(usuario_id, nombre_usuario, total, archivo, progreso=None):
+    """Escribe el historial en PDF con tablas de tamaño fijo generadas mientras se leen las filas"""
+    doc = SimpleDocTemplate(archivo, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    
+    # Estilos
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        textColor=colors.HexColor('#667EEA'),
+        spaceAfter=12,
+        alignment=1  # Centrado
+    )
+    
+    subtitle_style = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=colors.grey,
+        spaceAfter=20,
+        alignment=1
+    )
+    
+    # Estilo compartido por todas las tablas de datos
+    table_style = TableStyle([
+        # Encabezado
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667EEA')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('TOPPADDING', (0, 0), (-1, 0), 12),
+        
+        # Contenido
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F7F7F7')]),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 1), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ])
+    col_widths = [0.5*inch, 1*inch, 1.5*inch, 1*inch, 0.8*inch, 0.7*inch, 1*inch]
+    encabezado = ['#', 'Fecha', 'Aerolínea', 'Ruta', 'Duración', 'Escalas', 'Precio']
+    
+    def tabla(data):
+        table = Table(data, colWidths=col_widths, repeatRows=1)
+        table.setStyle(table_style)
+        return table
+    
+    n = 0
+    
+    def elementos():
+        nonlocal n
+        
+        # Título
+        yield Paragraph(f"<b>Historial de Predicciones</b><br/>{nombre_usuario}", title_style)
+        
+        # Información
+        info_text = f"Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Total: {total} predicciones"
+        yield Paragraph(info_text, subtitle_style)
+        yield Spacer(1, 0.2*inch)
+        
+        # Tablas de datos y estadísticas en una sola pasada
+        suma_precio, suma_duracion, total_escalas = 0.0, 0.0, 0
+        precio_min, precio_max = float('inf'), float('-inf')
+        data = [encabezado]
+        for fecha_viaje, aerolinea, origen, destino, duracion, escalas, precio in filas_historial(usuario_id):
+            n += 1
+            suma_precio += precio
+            suma_duracion += duracion
+            total_escalas += escalas
+            precio_min = min(precio_min, precio)
+            precio_max = max(precio_max, precio)
+            data.append([
+                str(n),
+                fecha_viaje.strftime('%Y-%m-%d'),
+                aerolinea[:15],  # Truncar si es muy largo
+                f"{origen}-{destino}",
+                f"{duracion}h",
+                str(escalas),
+                f"S/ {precio:.2f}"
+            ])
+            if len(data) > FILAS_POR_TABLA_PDF:
+                yield tabla(data)
+                data = [encabezado]
+            if progreso and n % TAMANO_LOTE_EXPORTACION == 0:
+                progreso(n)
+        if len(data) > 1:
+            yield tabla(data)
+        yield Spacer(1, 0.3*inch)
+        
+        # Estadísticas
+        if n:
+            stats_data = [
+                ['ESTADÍSTICAS', ''],
+                ['Precio Promedio:', f"S/ {suma_precio / n:.2f}"],
+                ['Precio Mínimo:', f"S/ {precio_min:.2f}"],
+                ['Precio Máximo:', f"S/ {precio_max:.2f}"],
+                ['Duración Promedio:', f"{suma_duracion / n:.1f}h"],
+                ['Total de Escalas:', f"{total_escalas}"]
+            ]
+            
+            stats_table = Table(stats_data, colWidths=[2.5*inch, 1.5*inch])
+            stats_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667EEA')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+                ('FONTNAME', (1, 1), (1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                ('LEFTPADDING', (0, 0), (-1, -1), 10),
+                ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+                ('TOPPADDING', (0, 0), (-1, -1), 8),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ]))
+            yield stats_table
+        
+        # Pie de página
+        yield Spacer(1, 0.3*inch)
+        yield Paragraph(
+            f"<i>Documento generado por AeroPredict © {datetime.now().year}</i>",
+            ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.grey, alignment=1)
+        )
+    
+    # Construir PDF
+    doc.build(FlowablesPerezosos(elementos()))
+    return n
+
+
+def escribir_csv_historial(usuario_id, nombre_usuario, total, archivo, progreso=None):
+    """Escribe el historial en CSV (UTF-8)"""
+    texto = io.TextIOWrapper(archivo, encoding='utf-8', newline='')
+    escritor = csv.writer(texto)
+    escritor.writerow(['fecha_viaje', 'aerolinea', 'origen', 'destino', 'duracion', 'escalas', 'precio'])
+    n = 0
+    for n, fila in enumerate(filas_historial(usuario_id), 1):
+        escritor.writerow(fila)
+        if progreso and n % TAMANO_LOTE_EXPORTACION == 0:
+            progreso(n)
+    texto.flush()
+    texto.detach()
+    return n
+
+
+# ========== EXPORTACIÓN DE FILAS EN CRUDO ==========
+# Para analítica: filas tal cual, ordenadas por id, en streaming y sin ORM.
+# El formato de cada fila lo produce la base siempre que puede (COPY en
+# Postgres para CSV, json_build_object/json_object para NDJSON).
+COLUMNAS_CRUDAS = [c for c in Prediccion.__table__.columns if c.name != 'usuario_id']
+TAMANO_LOTE_CRUDO = 10_000
+TAMANO_BLOQUE_COPY = 256 * 1024
+
+
+def consulta_cruda(usuario_id, columnas, desde=None, cursor=None):
+    """Filas del usuario con id > cursor y fecha_prediccion > desde, por id ascendente"""
+    consulta = db.select(*columnas).where(Prediccion.usuario_id == usuario_id)
+    if desde is not None:
+        consulta = consulta.where(Prediccion.fecha_prediccion > desde)
+    if cursor is not None:
+        consulta = consulta.where(Prediccion.id > cursor)
+    return consulta.order_by(Prediccion.id)
+
+
+def lotes_crudos(consulta, lote=TAMANO_LOTE_CRUDO):
+    """Ejecuta con cursor de servidor y entrega listas de filas (Core, sin ORM)"""
+    resultado = db.session.connection().execution_options(stream_results=True).execute(consulta)
+    yield from resultado.partitions(lote)
+
+
+def copiar_postgres(engine, consulta, opciones='CSV HEADER'):
+    """Streaming de COPY ... TO STDOUT: un hilo vuelca en una cola que consume la respuesta"""
+    sql = str(consulta.compile(engine, compile_kwargs={'literal_binds': True}))
+    cola = queue.Queue(maxsize=8)
+    cancelado = threading.Event()
+    
+    class Destino:
+        def __init__(self):
+            self.pendiente = []
+            self.tamano = 0
+        
+        def write(self, datos):
+            if cancelado.is_set():
+                raise IOError('Descarga cancelada por el cliente')
+            self.pendiente.append(datos)
+            self.tamano += len(datos)
+            if self.tamano >= TAMANO_BLOQUE_COPY:
+                self.vaciar()
+        
+        def vaciar(self):
+            if self.pendiente:
+                cola.put(b''.join(self.pendiente))
+                self.pendiente, self.tamano = [], 0
+    
+    def copiar():
+        conexion = engine.raw_connection()
+        try:
+            destino = Destino()
+            conexion.cursor().copy_expert(f"COPY ({sql}) TO STDOUT WITH {opciones}", destino)
+            destino.vaciar()
+            cola.put(None)
+        except Exception as e:
+            cola.put(e)
+        finally:
+            conexion.rollback()
+            conexion.close()
+    
+    hilo = threading.Thread(target=copiar, daemon=True, name='copy-export')
+    hilo.start()
+    try:
+        while True:
+            parte = cola.get()
+            if parte is None:
+                return
+            if isinstance(parte, Exception):
+                raise parte
+            yield parte
+    finally:
+        # Si el cliente corta la descarga, detener el COPY y liberar la conexión
+        cancelado.set()
+        while hilo.is_alive():
+            try:
+                cola.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def columnas_csv_crudas():
+    # Fechas sin conversión de tipos: se escriben tal como las entrega el driver
+    return [db.type_coerce(c, db.String).label(c.name) if isinstance(c.type, (db.Date, db.DateTime)) else c
+            for c in COLUMNAS_CRUDAS]
+
+
+def objeto_json_crudo(dialecto):
+    """Expresión que serializa la fila como texto JSON en la base"""
+    funcion = db.func.json_build_object if dialecto == 'postgresql' else db.func.json_object
+    return db.cast(funcion(*[x for c in COLUMNAS_CRUDAS for x in (c.name, c)]), db.Text)
+
+
+# CSV de una columna con comilla y separador que el JSON nunca contiene
+# (los caracteres de control van escapados): cada línea sale tal cual
+OPCIONES_COPY_NDJSON = "(FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"
+
+
+def generar_csv_crudo(usuario_id, desde=None, cursor=None):
+    consulta = consulta_cruda(usuario_id, columnas_csv_crudas(), desde, cursor)
+    engine = db.session.get_bind()
+    if engine.dialect.name == 'postgresql':
+        yield from copiar_postgres(engine, consulta)
+        return
+    
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow([c.name for c in COLUMNAS_CRUDAS])
+    for filas in lotes_crudos(consulta):
+        escritor.writerows(filas)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def generar_ndjson_crudo(usuario_id, desde=None, cursor=None):
+    # Cada fila llega ya serializada como JSON desde la base
+    engine = db.session.get_bind()
+    consulta = consulta_cruda(usuario_id, [objeto_json_crudo(engine.dialect.name)], desde, cursor)
+    if engine.dialect.name == 'postgresql':
+        yield from copiar_postgres(engine, consulta, OPCIONES_COPY_NDJSON)
+        return
+    
+    for filas in lotes_crudos(consulta):
+        yield ('\n'.join(f[0] for f in filas) + '\n').encode('utf-8')
+
+
+def comprimir_gzip(partes, nivel=5):
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31 = cabecera gzip
+    for parte in partes:
+        comprimido = compresor.compress(parte)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+def cabeceras_descarga(nombre_archivo):
+    return {
+        'Content-Disposition': f'attachment; filename={nombre_archivo}',
+        'Vary': 'Accept-Encoding',
+        'X-Accel-Buffering': 'no',
+    }
+
+
+def respuesta_streaming(partes, mimetype, nombre_archivo):
+    """Respuesta por partes; gzip si el cliente lo acepta"""
+    cabeceras = cabeceras_descarga(nombre_archivo)
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        partes = comprimir_gzip(partes)
+        cabeceras['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(partes), mimetype=mimetype, headers=cabeceras)
+
+
+def parametros_incrementales(argumentos=None):
+    """?since=<fecha ISO> y ?cursor=<último id recibido>; ValueError si no son válidos"""
+    argumentos = request.args if argumentos is None else argumentos
+    desde = argumentos.get('since')
+    cursor = argumentos.get('cursor')
+    return (datetime.fromisoformat(desde) if desde else None,
+            int(cursor) if cursor else None)
+
+
+# ========== TRABAJOS DE EXPORTACIÓN ==========
+# Estado y archivos viven en disco para que cualquier worker pueda responder.
+# El id del trabajo es usuario + última predicción + formato: si el historial
+# no cambió, el archivo ya generado se reutiliza.
+EXPORTACIONES_DIR = os.environ.get('EXPORTACIONES_DIR',
+                                   os.path.join(tempfile.gettempdir(), 'aeropredict_exportaciones'))
+EXPORTACIONES_TTL = float(os.environ.get('EXPORTACIONES_TTL', 3600))
+EXPORTACIONES_TRABAJADORES = int(os.environ.get('EXPORTACIONES_TRABAJADORES', 2))
+# Un trabajo en curso que no avanza en este tiempo se da por abandonado (worker reiniciado)
+EXPORTACIONES_ABANDONO = 600
+
+FORMATOS_EXPORTACION = {
+    'pdf': (escribir_pdf_historial, 'application/pdf'),
+    'xlsx': (escribir_excel_historial, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': (escribir_csv_historial, 'text/csv'),
+}
+PATRON_TRABAJO = re.compile(r'^\d+-\d+-(pdf|xlsx|csv)$')
+
+_ejecutor_exportaciones = ThreadPoolExecutor(max_workers=EXPORTACIONES_TRABAJADORES,
+                                             thread_name_prefix='exportacion')
+_trabajos_en_curso = set()
+_candado_trabajos = threading.Lock()
+_ultima_limpieza = 0.0
+
+
+def _reiniciar_ejecutor_exportaciones():
+    global _ejecutor_exportaciones, _candado_trabajos
+    _ejecutor_exportaciones = ThreadPoolExecutor(max_workers=EXPORTACIONES_TRABAJADORES,
+                                                 thread_name_prefix='exportacion')
+    _candado_trabajos = threading.Lock()
+    _trabajos_en_curso.clear()
+
+
+os.register_at_fork(after_in_child=_reiniciar_ejecutor_exportaciones)
+
+
+def ruta_exportacion(trabajo_id, extension):
+    return os.path.join(EXPORTACIONES_DIR, f"{trabajo_id}.{extension}")
+
+
+def leer_trabajo(trabajo_id):
+    try:
+        with open(ruta_exportacion(trabajo_id, 'json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def guardar_trabajo(trabajo_id, **campos):
+    """Actualiza el estado en disco de forma atómica (escritura + rename)"""
+    trabajo = leer_trabajo(trabajo_id) or {'id': trabajo_id}
+    trabajo.update(campos, actualizado=time.time())
+    destino = ruta_exportacion(trabajo_id, 'json')
+    temporal = f"{destino}.{os.getpid()}.{threading.get_ident()}"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(trabajo, f)
+    os.replace(temporal, destino)
+    return trabajo
+
+
+def limpiar_exportaciones():
+    """Borra estados y archivos más antiguos que EXPORTACIONES_TTL (como mucho una vez por minuto)"""
+    global _ultima_limpieza
+    ahora = time.time()
+    if ahora - _ultima_limpieza < 60:
+        return
+    _ultima_limpieza = ahora
+    for nombre in os.listdir(EXPORTACIONES_DIR):
+        ruta = os.path.join(EXPORTACIONES_DIR, nombre)
+        try:
+            if ahora - os.path.getmtime(ruta) > EXPORTACIONES_TTL:
+                os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+def generar_exportacion(trabajo_id, usuario_id, nombre_usuario, formato, total):
+    """Se ejecuta en el pool de exportaciones"""
+    escritor, _ = FORMATOS_EXPORTACION[formato]
+    temporal = f"{ruta_exportacion(trabajo_id, formato)}.{os.getpid()}.parcial"
+    
+    def progreso(filas):
+        guardar_trabajo(trabajo_id, filas=filas, progreso=round(min(filas / max(total, 1), 0.99), 3))
+    
+    inicio = time.perf_counter()
+    estado = 'error'
+    with app.app_context():
+        try:
+            guardar_trabajo(trabajo_id, estado='procesando')
+            with open(temporal, 'wb') as archivo:
+                filas = escritor(usuario_id, nombre_usuario, total, archivo, progreso)
+            os.replace(temporal, ruta_exportacion(trabajo_id, formato))
+            guardar_trabajo(trabajo_id, estado='listo', progreso=1.0, filas=filas)
+            estado = 'listo'
+        except Exception as e:
+            print(f"❌ Error en exportación {trabajo_id}: {e}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            guardar_trabajo(trabajo_id, estado='error', error=str(e))
+        finally:
+            DURACION_EXPORTACIONES.labels(formato, estado).observe(time.perf_counter() - inicio)
+            db.session.remove()
+            with _candado_trabajos:
+                _trabajos_en_curso.discard(trabajo_id)
+
+
+def encolar_exportacion(usuario_id, nombre_usuario, formato):
+    """Devuelve el trabajo existente para el historial actual o encola uno nuevo"""
+    estadisticas = obtener_estadisticas(usuario_id)
+    if not estadisticas.total:
+        return None
+    
+    trabajo_id = f"{usuario_id}-{estadisticas.ultima_prediccion_id}-{formato}"
+    os.makedirs(EXPORTACIONES_DIR, exist_ok=True)
+    limpiar_exportaciones()
+    
+    with _candado_trabajos:
+        trabajo = leer_trabajo(trabajo_id)
+        if trabajo_id in _trabajos_en_curso:
+            return trabajo
+        if trabajo and trabajo['estado'] == 'listo' and os.path.exists(ruta_exportacion(trabajo_id, formato)):
+            return trabajo
+        if (trabajo and trabajo['estado'] in ('pendiente', 'procesando')
+                and time.time() - trabajo['actualizado'] < EXPORTACIONES_ABANDONO):
+            return trabajo  # en curso en otro worker
+        
+        _trabajos_en_curso.add(trabajo_id)
+        trabajo = guardar_trabajo(trabajo_id, usuario_id=usuario_id, formato=formato, estado='pendiente',
+                                  progreso=0.0, filas=0, total=estadisticas.total,
+                                  creado=time.time(), error=None)
+    _ejecutor_exportaciones.submit(generar_exportacion, trabajo_id, usuario_id, nombre_usuario,
+                                   formato, estadisticas.total)
+    return trabajo
+
+
+def respuesta_trabajo(trabajo):
+    respuesta = {k: trabajo.get(k) for k in ('id', 'formato', 'estado', 'progreso', 'filas', 'total', 'error')}
+    respuesta['url_estado'] = url_for('estado_exportacion', trabajo_id=trabajo['id'])
+    if trabajo['estado'] == 'listo':
+        respuesta['url_descarga'] = url_for('descargar_exportacion', trabajo_id=trabajo['id'])
+    return respuesta
+
+
 # ========== CARGA DE MODELO 1==========
 #def cargar_modelo():
 #    """Carga el modelo entrenado"""
@@ -219,14 +1722,161 @@ def cargar_modelo():
     
     return False
 
+# ========== ÍNDICE DE PRECIOS ==========
+# Percentiles de precio precalculados desde datos_cache al cargarlo, para que
+# el chat bot compare una predicción con vuelos parecidos sin recorrer el
+# DataFrame en cada mensaje. Cada grupo con suficientes muestras guarda una fila
+# de percentiles en una matriz NumPy; la búsqueda va del grupo más específico
+# al más general.
+PERCENTILES_INDICE = np.arange(0, 101, 5)
+MIN_MUESTRAS_INDICE = int(os.environ.get('MIN_MUESTRAS_INDICE', 30))
+NIVELES_INDICE = (
+    ('ruta', 'aerolinea', 'mes', 'dia'),
+    ('ruta', 'aerolinea', 'mes'),
+    ('ruta', 'mes', 'dia'),
+    ('ruta', 'mes'),
+    ('ruta', 'dia'),
+    ('ruta',),
+    (),
+)
+# Diferencia de la mediana del mes contra la mediana típica de los meses
+UMBRAL_TEMPORADA_ALTA = 0.05
+UMBRAL_TEMPORADA_BAJA = -0.02
+
+NOMBRES_MESES = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio',
+                 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+NOMBRES_DIAS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+IndicePrecios = namedtuple('IndicePrecios', 'filas percentiles muestras medianas_dia medianas_mes')
+
+
+def construir_indice_precios(datos):
+    """Agrega el dataset en percentiles por (ruta, aerolínea, mes, día) y medianas por día y mes"""
+    fechas = pd.to_datetime(datos['Fecha_del_viaje'])
+    marco = pd.DataFrame({
+        'ruta': datos['Origen'] + '-' + datos['Destino'],
+        'aerolinea': datos['Aerolínea'],
+        'mes': fechas.dt.month,
+        'dia': fechas.dt.weekday,
+        'precio': datos['Precio (S/)'].astype(float),
+    })
+    
+    filas, matrices, muestras = {}, [], []
+    for nivel in NIVELES_INDICE:
+        if not nivel:
+            filas[(nivel, ())] = sum(len(m) for m in matrices)
+            matrices.append(np.percentile(marco['precio'].to_numpy(), PERCENTILES_INDICE)[np.newaxis])
+            muestras.append(np.array([len(marco)]))
+            continue
+        grupos = marco.groupby(list(nivel))['precio']
+        conteos = grupos.size()
+        conteos = conteos[conteos >= MIN_MUESTRAS_INDICE]
+        if conteos.empty:
+            continue
+        cuantiles = grupos.quantile(PERCENTILES_INDICE / 100).unstack().loc[conteos.index]
+        inicio = sum(len(m) for m in matrices)
+        for i, clave in enumerate(conteos.index):
+            filas[(nivel, clave if isinstance(clave, tuple) else (clave,))] = inicio + i
+        matrices.append(cuantiles.to_numpy())
+        muestras.append(conteos.to_numpy())
+    
+    def medianas(columna, posibles):
+        """Mediana por ruta (None = todas las rutas), un valor por elemento de `posibles`; NaN si faltan muestras"""
+        resultado = {}
+        for ruta, grupo in [(None, marco)] + list(marco.groupby('ruta')):
+            por_valor = grupo.groupby(columna)['precio'].agg(['median', 'size'])
+            por_valor.loc[por_valor['size'] < MIN_MUESTRAS_INDICE, 'median'] = np.nan
+            resultado[ruta] = por_valor['median'].reindex(posibles).to_numpy()
+        return resultado
+    
+    return IndicePrecios(
+        filas=filas,
+        percentiles=np.vstack(matrices),
+        muestras=np.concatenate(muestras),
+        medianas_dia=medianas('dia', range(7)),
+        medianas_mes=medianas('mes', range(1, 13)),
+    )
+
+
+def percentil_precio(ruta, aerolinea, fecha, precio):
+    """(percentil 0-100, muestras, nivel) del precio entre los vuelos más parecidos del índice"""
+    if indice_precios is None:
+        return None
+    valores = {'ruta': ruta, 'aerolinea': aerolinea, 'mes': fecha.month, 'dia': fecha.weekday()}
+    for nivel in NIVELES_INDICE:
+        fila = indice_precios.filas.get((nivel, tuple(valores[c] for c in nivel)))
+        if fila is not None:
+            percentil = float(np.interp(precio, indice_precios.percentiles[fila], PERCENTILES_INDICE))
+            return percentil, int(indice_precios.muestras[fila]), nivel
+    return None
+
+
+def _medianas_ruta(medianas, ruta):
+    """Medianas de la ruta; los huecos sin muestras suficientes se completan con las globales"""
+    valores = medianas.get(ruta)
+    if valores is None:
+        return medianas[None]
+    return np.where(np.isnan(valores), medianas[None], valores)
+
+
+def dia_mas_barato(ruta=None):
+    """(índice del día 0=lunes, mediana) con la mediana más baja en la ruta; None si no hay muestras suficientes"""
+    valores = _medianas_ruta(indice_precios.medianas_dia, ruta)
+    if np.isnan(valores).all():
+        return None
+    dia = int(np.nanargmin(valores))
+    return dia, float(valores[dia])
+
+
+def mes_mas_barato(ruta=None):
+    """(mes 1-12, mediana) con la mediana más baja en la ruta; None si no hay muestras suficientes"""
+    valores = _medianas_ruta(indice_precios.medianas_mes, ruta)
+    if np.isnan(valores).all():
+        return None
+    mes = int(np.nanargmin(valores))
+    return mes + 1, float(valores[mes])
+
+
+def temporadas(ruta=None):
+    """Por mes: (nombre de temporada, diferencia relativa contra el mes típico), según los datos"""
+    valores = _medianas_ruta(indice_precios.medianas_mes, ruta)
+    if np.isnan(valores).all():
+        return {}
+    tipico = np.nanmedian(valores)
+    resultado = {}
+    for mes, mediana in enumerate(valores, start=1):
+        if np.isnan(mediana):
+            continue
+        diferencia = mediana / tipico - 1
+        if diferencia >= UMBRAL_TEMPORADA_ALTA:
+            nombre = 'ALTA'
+        elif diferencia <= UMBRAL_TEMPORADA_BAJA:
+            nombre = 'BAJA'
+        else:
+            nombre = 'MEDIA'
+        resultado[mes] = (nombre, float(diferencia))
+    return resultado
+
+def publicar_datos(datos):
+    """Reemplaza datos_cache y reconstruye el índice de precios"""
+    global datos_cache, indice_precios
+    try:
+        indice = construir_indice_precios(datos)
+        print(f"✓ Índice de precios: {len(indice.filas)} grupos")
+    except Exception as e:
+        print(f"⚠️ Error construyendo índice de precios: {e}")
+        indice = None
+    datos_cache, indice_precios = datos, indice
+    FILAS_DATASET.set(len(datos))
+
+
 def cargar_datos_cache():
     """Carga los datos en caché"""
-    global datos_cache
     
     # Intentar cargar datos existentes
     if os.path.exists('datos_vuelos.xlsx'):
         try:
-            datos_cache = pd.read_excel('datos_vuelos.xlsx')
+            publicar_datos(pd.read_excel('datos_vuelos.xlsx'))
             print(f"✓ Datos cargados: {len(datos_cache)} registros")
             return True
         except Exception as e:
@@ -240,7 +1890,7 @@ def cargar_datos_cache():
         
         # Intentar cargar nuevamente
         if os.path.exists('datos_vuelos.xlsx'):
-            datos_cache = pd.read_excel('datos_vuelos.xlsx')
+            publicar_datos(pd.read_excel('datos_vuelos.xlsx'))
             print(f"✓ Datos generados y cargados: {len(datos_cache)} registros")
             return True
     except Exception as e:
@@ -250,6 +1900,135 @@ def cargar_datos_cache():
     
     return False    
 
+# ========== COMPRESIÓN Y CACHÉ HTTP ==========
+# Respuestas dinámicas: gzip/brotli al vuelo por encima de un umbral.
+# Estáticos: variantes comprimidas una sola vez en memoria y URLs con el hash
+# del contenido (?v=...), que el navegador puede cachear para siempre.
+COMPRESION_MIN_BYTES = int(os.environ.get('COMPRESION_MIN_BYTES', 1024))
+TIPOS_COMPRIMIBLES = ('text/', 'application/json', 'application/javascript',
+                      'application/x-ndjson', 'image/svg+xml')
+CODIFICACIONES_DINAMICAS = ('br', 'gzip') if brotli else ('gzip',)
+ESTATICOS_MAX_BYTES = 1024 * 1024
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+ArchivoEstatico = namedtuple('ArchivoEstatico', 'firma version mimetype variantes')
+_estaticos = {}
+
+
+def elegir_codificacion(disponibles):
+    """Mejor codificación aceptada por el cliente (respeta los q=) o 'identity'"""
+    return request.accept_encodings.best_match([c for c in ('br', 'gzip') if c in disponibles]) or 'identity'
+
+
+def comprimir(cuerpo, codificacion, maxima=False):
+    if codificacion == 'br':
+        return brotli.compress(cuerpo, quality=11 if maxima else 5)
+    return gzip.compress(cuerpo, 9 if maxima else 6, mtime=0)
+
+
+@app.after_request
+def comprimir_respuesta(respuesta):
+    """Comprime respuestas grandes; no toca streaming, archivos ni lo ya comprimido"""
+    if (respuesta.status_code != 200 or respuesta.direct_passthrough or respuesta.is_streamed
+            or 'Content-Encoding' in respuesta.headers
+            or not (respuesta.mimetype or '').startswith(TIPOS_COMPRIMIBLES)):
+        return respuesta
+    
+    cuerpo = respuesta.get_data()
+    if len(cuerpo) < COMPRESION_MIN_BYTES:
+        return respuesta
+    respuesta.vary.add('Accept-Encoding')
+    codificacion = elegir_codificacion(CODIFICACIONES_DINAMICAS)
+    if codificacion == 'identity':
+        return respuesta
+    
+    respuesta.set_data(comprimir(cuerpo, codificacion))
+    respuesta.headers['Content-Encoding'] = codificacion
+    # El ETag se calculó sobre el cuerpo sin comprimir: pasa a ser débil
+    etag, debil = respuesta.get_etag()
+    if etag and not debil:
+        respuesta.set_etag(etag, weak=True)
+    return respuesta
+
+
+def respuesta_condicional(f):
+    """ETag del cuerpo e If-None-Match: si el cliente ya lo tiene, 304 sin cuerpo"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        respuesta = app.make_response(f(*args, **kwargs))
+        if respuesta.status_code == 200:
+            respuesta.add_etag()
+            respuesta.headers['Cache-Control'] = 'private, no-cache'
+            respuesta.make_conditional(request)
+        return respuesta
+    return decorated_function
+
+
+def archivo_estatico(nombre):
+    """Contenido, hash y variantes comprimidas de un archivo de static/ (None si no aplica)"""
+    ruta = safe_join(app.static_folder, nombre)
+    if ruta is None:
+        return None
+    try:
+        info = os.stat(ruta)
+    except OSError:
+        return None
+    if not stat.S_ISREG(info.st_mode) or info.st_size > ESTATICOS_MAX_BYTES:
+        return None
+    
+    # La firma detecta archivos editados (modo desarrollo) sin releerlos
+    firma = (info.st_mtime_ns, info.st_size)
+    archivo = _estaticos.get(nombre)
+    if archivo is None or archivo.firma != firma:
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+        variantes = {'identity': contenido}
+        for codificacion in CODIFICACIONES_DINAMICAS:
+            comprimido = comprimir(contenido, codificacion, maxima=True)
+            if len(comprimido) < len(contenido):
+                variantes[codificacion] = comprimido
+        archivo = ArchivoEstatico(firma, hashlib.sha256(contenido).hexdigest()[:12],
+                                  mimetypes.guess_type(nombre)[0] or 'application/octet-stream', variantes)
+        _estaticos[nombre] = archivo
+    return archivo
+
+
+def precargar_estaticos():
+    """Comprime todos los estáticos antes de atender (y antes del fork con --preload)"""
+    for raiz, _, archivos in os.walk(app.static_folder):
+        for nombre in archivos:
+            archivo_estatico(os.path.relpath(os.path.join(raiz, nombre), app.static_folder).replace(os.sep, '/'))
+
+
+def servir_estatico(filename):
+    archivo = archivo_estatico(filename)
+    if archivo is None:
+        # No existe o es demasiado grande para tenerlo en memoria
+        return app.send_static_file(filename)
+    
+    codificacion = elegir_codificacion(archivo.variantes)
+    respuesta = Response(archivo.variantes[codificacion], mimetype=archivo.mimetype)
+    if codificacion != 'identity':
+        respuesta.headers['Content-Encoding'] = codificacion
+    respuesta.vary.add('Accept-Encoding')
+    respuesta.set_etag(f"{archivo.version}-{codificacion}")
+    # Solo la URL con el hash vigente es inmutable; sin él, revalidar siempre
+    respuesta.headers['Cache-Control'] = CACHE_INMUTABLE if request.args.get('v') == archivo.version else 'no-cache'
+    return respuesta.make_conditional(request)
+
+
+app.view_functions['static'] = servir_estatico
+
+
+@app.url_defaults
+def version_estatico(endpoint, values):
+    """url_for('static', ...) añade ?v=<hash del contenido>"""
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        archivo = archivo_estatico(values['filename'])
+        if archivo is not None:
+            values['v'] = archivo.version
+
+
 # ========== RUTAS DE AUTENTICACIÓN ==========
 @app.route('/registro', methods=['GET', 'POST'])
 def registro():
@@ -284,6 +2063,7 @@ def registro():
         # Crear nuevo usuario
         nuevo_usuario = Usuario(usuario=usuario, email=email)
         nuevo_usuario.set_password(contrasena)
+        nuevo_usuario.estadisticas = UsuarioEstadisticas()
         
         db.session.add(nuevo_usuario)
         db.session.commit()
@@ -302,9 +2082,14 @@ def login():
         usuario_obj = Usuario.query.filter_by(usuario=usuario).first()
         
         if usuario_obj and usuario_obj.check_password(contrasena) and usuario_obj.activo:
+            # Rehash transparente si el hash usa parámetros antiguos
+            if hash_obsoleto(usuario_obj.contrasena):
+                usuario_obj.set_password(contrasena)
+                db.session.commit()
             session['usuario_id'] = usuario_obj.id
             session['usuario'] = usuario_obj.usuario
             session['email'] = usuario_obj.email
+            nueva_version_perfil()
             flash(f'¡Bienvenido {usuario}!', 'success')
             return redirect(url_for('index'))
         else:
@@ -342,48 +2127,34 @@ def index():
 
 @app.route('/dashboard')
 @login_requerido
+@solo_lectura
 def dashboard():
-    usuario_id = session.get('usuario_id')
-    predicciones = Prediccion.query.filter_by(usuario_id=usuario_id).all()
-    
-    # Estadísticas
-    total_predicciones = len(predicciones)
-    if predicciones:
-        precios = [p.precio_predicho for p in predicciones]
-        precio_promedio = np.mean(precios)
-        precio_min = min(precios)
-        precio_max = max(precios)
-        
-        # Rutas más consultadas
-        rutas = {}
-        for p in predicciones:
-            ruta = f"{p.origen}-{p.destino}"
-            rutas[ruta] = rutas.get(ruta, 0) + 1
-    else:
-        precio_promedio = precio_min = precio_max = 0
-        rutas = {}
+    estadisticas = obtener_estadisticas(session.get('usuario_id'))
     
     return render_template('dashboard.html',
-                         total_predicciones=total_predicciones,
-                         precio_promedio=precio_promedio,
-                         precio_min=precio_min,
-                         precio_max=precio_max,
-                         rutas_top=dict(sorted(rutas.items(), 
-                                             key=lambda x: x[1], 
-                                             reverse=True)[:5]))
+                         total_predicciones=estadisticas.total,
+                         precio_promedio=estadisticas.precio_promedio,
+                         precio_min=estadisticas.precio_min or 0,
+                         precio_max=estadisticas.precio_max or 0,
+                         rutas_top=estadisticas.rutas_top())
 
 @app.route('/historial')
 @login_requerido
+@solo_lectura
 def historial():
     usuario_id = session.get('usuario_id')
-    predicciones = Prediccion.query.filter_by(usuario_id=usuario_id)\
-                                   .order_by(Prediccion.fecha_prediccion.desc())\
-                                   .all()
-    return render_template('historial.html', predicciones=predicciones)
+    try:
+        predicciones, siguiente_cursor = pagina_predicciones(usuario_id, request.args.get('cursor'))
+    except ValueError:
+        return redirect(url_for('historial'))
+    return render_template('historial.html',
+                         predicciones=predicciones,
+                         siguiente_cursor=siguiente_cursor)
 
 # ========== RUTAS DE API ==========
 @app.route('/api/datos', methods=['GET'])
 @login_requerido
+@respuesta_condicional
 def obtener_datos():
     if datos_cache is None:
         return jsonify({'error': 'Datos no disponibles'}), 500
@@ -418,6 +2189,7 @@ def predecir():
             }), 400
         
         # Procesar fecha
+        inicio = time.perf_counter()
         fecha = pd.to_datetime(datos['fecha'])
         fecha_min = pd.to_datetime(datos_cache['Fecha_del_viaje'].min())
         dias_desde_inicio = (fecha - fecha_min).days
@@ -439,10 +2211,13 @@ def predecir():
             'Días_desde_inicio': [dias_desde_inicio],
             'Longitud_ruta': [len(f"{datos['origen']}-{datos['destino']}")]
         })
+        marca = registrar_etapa('codificacion', inicio)
         
         # Predicción
         entrada_scaled = scaler.transform(entrada[features])
+        marca = registrar_etapa('escalado', marca)
         precio_predicho = float(modelo.predict(entrada_scaled)[0])
+        marca = registrar_etapa('modelo', marca)
         precio_predicho = max(150, round(precio_predicho, 2))
         
         # Guardar en base de datos
@@ -459,8 +2234,8 @@ def predecir():
             precio_predicho=precio_predicho
         )
         
-        db.session.add(prediccion)
-        db.session.commit()
+        registrar_prediccion(prediccion)
+        registrar_etapa('guardado', marca)
         
         return jsonify({
             'exito': True,
@@ -470,28 +2245,59 @@ def predecir():
             'ruta': f"{datos['origen']} → {datos['destino']}"
         })
     
+    except exc.TimeoutError:
+        raise
     except Exception as e:
         return jsonify({'exito': False, 'error': str(e)}), 400
 
-@app.route('/api/historial-json', methods=['GET'])
-@login_requerido
-def historial_json():
-    usuario_id = session.get('usuario_id')
-    predicciones = Prediccion.query.filter_by(usuario_id=usuario_id)\
-                                   .order_by(Prediccion.fecha_prediccion.desc())\
-                                   .limit(10).all()
-    
-    return jsonify([{
+def prediccion_json(p):
+    return {
         'id': p.id,
         'aerolinea': p.aerolinea,
         'ruta': f"{p.origen}-{p.destino}",
         'fecha': p.fecha_viaje.strftime('%Y-%m-%d'),
         'precio': p.precio_predicho,
         'hora': p.fecha_prediccion.strftime('%H:%M:%S')
-    } for p in predicciones])
+    }
+
+@app.route('/api/historial-json', methods=['GET'])
+@login_requerido
+@solo_lectura
+def historial_json():
+    """Últimas predicciones; ?cursor= pide la página siguiente (X-Siguiente-Cursor)"""
+    usuario_id = session.get('usuario_id')
+    limite = min(request.args.get('limite', 10, type=int), LIMITE_MAXIMO_PAGINA)
+    try:
+        predicciones, siguiente_cursor = pagina_predicciones(usuario_id, request.args.get('cursor'),
+                                                             max(limite, 1))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    respuesta = jsonify([prediccion_json(p) for p in predicciones])
+    if siguiente_cursor:
+        respuesta.headers['X-Siguiente-Cursor'] = siguiente_cursor
+    return respuesta
+
+@app.route('/api/metricas', methods=['GET'])
+@metricas_protegidas
+def metricas():
+    """Métricas operativas del proceso que atiende la petición"""
+    return jsonify({
+        'pool': metricas_pool(),
+        'hash': metricas_hash(),
+        'perfiles': metricas_perfiles(),
+        'chat': metricas_conversaciones(),
+    })
+
+@app.route('/metrics', methods=['GET'])
+@metricas_protegidas
+def metrics_prometheus():
+    """Métricas en formato texto de Prometheus, sumadas entre workers"""
+    return Response(generate_latest(registro_metricas()), content_type=CONTENT_TYPE_LATEST)
 
 @app.route('/api/estadisticas', methods=['GET'])
 @login_requerido
+@respuesta_condicional
 def estadisticas():
     if datos_cache is None:
         return jsonify({'error': 'Datos no disponibles'}), 500
@@ -512,16 +2318,16 @@ def estadisticas():
 
 @app.route('/api/perfil', methods=['GET'])
 @login_requerido
+@solo_lectura
 def perfil():
     usuario_id = session.get('usuario_id')
-    usuario = Usuario.query.get(usuario_id)
-    predicciones = Prediccion.query.filter_by(usuario_id=usuario_id).count()
+    usuario = obtener_perfil(usuario_id)
     
     return jsonify({
         'usuario': usuario.usuario,
         'email': usuario.email,
         'fecha_creacion': usuario.fecha_creacion.strftime('%Y-%m-%d'),
-        'total_predicciones': predicciones
+        'total_predicciones': obtener_estadisticas(usuario_id).total
     })
 
 
@@ -563,6 +2369,7 @@ def actualizar_perfil():
         # Actualizar sesión
         session['usuario'] = nuevo_usuario
         session['email'] = nuevo_email
+        invalidar_perfil(usuario_id)
         
         return jsonify({
             'exito': True,
@@ -608,12 +2415,15 @@ def cambiar_contrasena():
         # Actualizar contraseña
         usuario.set_password(nueva_contrasena)
         db.session.commit()
+        invalidar_perfil(usuario_id)
         
         return jsonify({
             'exito': True,
             'mensaje': 'Contraseña cambiada exitosamente'
         })
     
+    except HashSaturado:
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'exito': False, 'error': str(e)}), 500
@@ -621,100 +2431,20 @@ def cambiar_contrasena():
 
 @app.route('/api/historial/exportar-excel', methods=['GET'])
 @login_requerido
+@solo_lectura
 def exportar_excel():
     """Exporta el historial de predicciones a Excel"""
     usuario_id = session.get('usuario_id')
-    usuario = Usuario.query.get(usuario_id)
-    predicciones = Prediccion.query.filter_by(usuario_id=usuario_id)\
-                                   .order_by(Prediccion.fecha_prediccion.desc())\
-                                   .all()
+    usuario = obtener_perfil(usuario_id)
+    total = obtener_estadisticas(usuario_id).total
     
-    if not predicciones:
+    if not total:
         return jsonify({'error': 'No hay predicciones para exportar'}), 404
     
     try:
-        # Crear workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Historial de Predicciones"
-        
-        # Estilos
-        header_fill = PatternFill(start_color="667EEA", end_color="667EEA", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=12)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Título
-        ws.merge_cells('A1:H1')
-        titulo = ws['A1']
-        titulo.value = f"Historial de Predicciones - {usuario.usuario}"
-        titulo.font = Font(bold=True, size=16, color="667EEA")
-        titulo.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Información del usuario
-        ws.merge_cells('A2:H2')
-        info = ws['A2']
-        info.value = f"Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Total: {len(predicciones)} predicciones"
-        info.font = Font(size=10, italic=True)
-        info.alignment = Alignment(horizontal='center')
-        
-        # Espacio
-        ws.append([])
-        
-        # Encabezados
-        headers = ['#', 'Fecha Viaje', 'Aerolínea', 'Origen', 'Destino', 'Duración (h)', 'Escalas', 'Precio (S/)']
-        ws.append(headers)
-        
-        # Aplicar estilo a encabezados
-        for cell in ws[4]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-        
-        # Datos
-        for idx, pred in enumerate(predicciones, 1):
-            ws.append([
-                idx,
-                pred.fecha_viaje.strftime('%Y-%m-%d'),
-                pred.aerolinea,
-                pred.origen,
-                pred.destino,
-                pred.duracion,
-                pred.escalas,
-                pred.precio_predicho
-            ])
-            
-            # Aplicar bordes a todas las celdas
-            for cell in ws[ws.max_row]:
-                cell.border = border
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Ajustar anchos de columna
-        column_widths = [5, 15, 20, 10, 10, 12, 10, 12]
-        for i, width in enumerate(column_widths, 1):
-            ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = width
-        
-        # Estadísticas al final
-        ws.append([])
-        precios = [p.precio_predicho for p in predicciones]
-        ws.append(['ESTADÍSTICAS', '', '', '', '', '', '', ''])
-        ws.append(['Precio Promedio:', '', '', '', '', '', '', f"S/ {sum(precios)/len(precios):.2f}"])
-        ws.append(['Precio Mínimo:', '', '', '', '', '', '', f"S/ {min(precios):.2f}"])
-        ws.append(['Precio Máximo:', '', '', '', '', '', '', f"S/ {max(precios):.2f}"])
-        
-        # Estilo para estadísticas
-        for row in range(ws.max_row - 3, ws.max_row + 1):
-            ws[f'A{row}'].font = Font(bold=True)
-            ws[f'H{row}'].font = Font(bold=True, color="667EEA")
-        
-        # Guardar en memoria
-        output = BytesIO()
-        wb.save(output)
+        # Archivo temporal en disco: se envía por partes y se borra al cerrarse
+        output = tempfile.TemporaryFile()
+        escribir_excel_historial(usuario_id, usuario.usuario, total, output)
         output.seek(0)
         
         # Nombre del archivo
@@ -733,135 +2463,20 @@ def exportar_excel():
 
 @app.route('/api/historial/exportar-pdf', methods=['GET'])
 @login_requerido
+@solo_lectura
 def exportar_pdf():
     """Exporta el historial de predicciones a PDF"""
     usuario_id = session.get('usuario_id')
-    usuario = Usuario.query.get(usuario_id)
-    predicciones = Prediccion.query.filter_by(usuario_id=usuario_id)\
-                                   .order_by(Prediccion.fecha_prediccion.desc())\
-                                   .all()
+    usuario = obtener_perfil(usuario_id)
+    total = obtener_estadisticas(usuario_id).total
     
-    if not predicciones:
+    if not total:
         return jsonify({'error': 'No hay predicciones para exportar'}), 404
     
     try:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
-        elements = []
-        
-        # Estilos
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            textColor=colors.HexColor('#667EEA'),
-            spaceAfter=12,
-            alignment=1  # Centrado
-        )
-        
-        subtitle_style = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.grey,
-            spaceAfter=20,
-            alignment=1
-        )
-        
-        # Título
-        titulo = Paragraph(f"<b>Historial de Predicciones</b><br/>{usuario.usuario}", title_style)
-        elements.append(titulo)
-        
-        # Información
-        info_text = f"Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Total: {len(predicciones)} predicciones"
-        info = Paragraph(info_text, subtitle_style)
-        elements.append(info)
-        elements.append(Spacer(1, 0.2*inch))
-        
-        # Tabla de datos
-        data = [['#', 'Fecha', 'Aerolínea', 'Ruta', 'Duración', 'Escalas', 'Precio']]
-        
-        for idx, pred in enumerate(predicciones, 1):
-            data.append([
-                str(idx),
-                pred.fecha_viaje.strftime('%Y-%m-%d'),
-                pred.aerolinea[:15],  # Truncar si es muy largo
-                f"{pred.origen}-{pred.destino}",
-                f"{pred.duracion}h",
-                str(pred.escalas),
-                f"S/ {pred.precio_predicho:.2f}"
-            ])
-        
-        # Crear tabla
-        table = Table(data, colWidths=[0.5*inch, 1*inch, 1.5*inch, 1*inch, 0.8*inch, 0.7*inch, 1*inch])
-        
-        # Estilo de tabla
-        table.setStyle(TableStyle([
-            # Encabezado
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667EEA')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('TOPPADDING', (0, 0), (-1, 0), 12),
-            
-            # Contenido
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F7F7F7')]),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 6),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 1), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-        ]))
-        
-        elements.append(table)
-        elements.append(Spacer(1, 0.3*inch))
-        
-        # Estadísticas
-        precios = [p.precio_predicho for p in predicciones]
-        stats_data = [
-            ['ESTADÍSTICAS', ''],
-            ['Precio Promedio:', f"S/ {sum(precios)/len(precios):.2f}"],
-            ['Precio Mínimo:', f"S/ {min(precios):.2f}"],
-            ['Precio Máximo:', f"S/ {max(precios):.2f}"],
-            ['Duración Promedio:', f"{sum(p.duracion for p in predicciones)/len(predicciones):.1f}h"],
-            ['Total de Escalas:', f"{sum(p.escalas for p in predicciones)}"]
-        ]
-        
-        stats_table = Table(stats_data, colWidths=[2.5*inch, 1.5*inch])
-        stats_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667EEA')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 1), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 10),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        
-        elements.append(stats_table)
-        
-        # Pie de página
-        elements.append(Spacer(1, 0.3*inch))
-        footer = Paragraph(
-            f"<i>Documento generado por AeroPredict © {datetime.now().year}</i>",
-            ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.grey, alignment=1)
-        )
-        elements.append(footer)
-        
-        # Construir PDF
-        doc.build(elements)
+        # En memoria hasta 8 MB, luego a disco; se envía por partes
+        buffer = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        escribir_pdf_historial(usuario_id, usuario.usuario, total, buffer)
         buffer.seek(0)
         
         # Nombre del archivo
@@ -878,28 +2493,186 @@ def exportar_pdf():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/historial/exportar-csv', methods=['GET'])
+@login_requerido
+@solo_lectura
+def exportar_csv():
+    """Filas crudas del historial en CSV; ?since= y ?cursor= para cargas incrementales"""
+    try:
+        desde, cursor = parametros_incrementales()
+    except ValueError:
+        return jsonify({'error': 'Parámetros since/cursor inválidos'}), 400
+    partes = medir_exportacion(generar_csv_crudo(session.get('usuario_id'), desde, cursor), 'csv_crudo')
+    return respuesta_streaming(partes, 'text/csv',
+                               f"historial_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+
+@app.route('/api/historial/exportar-ndjson', methods=['GET'])
+@login_requerido
+@solo_lectura
+def exportar_ndjson():
+    """Filas crudas del historial en NDJSON (un objeto por línea)"""
+    try:
+        desde, cursor = parametros_incrementales()
+    except ValueError:
+        return jsonify({'error': 'Parámetros since/cursor inválidos'}), 400
+    partes = medir_exportacion(generar_ndjson_crudo(session.get('usuario_id'), desde, cursor), 'ndjson')
+    return respuesta_streaming(partes, 'application/x-ndjson',
+                               f"historial_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson")
+
+@app.route('/api/exportaciones', methods=['POST'])
+@login_requerido
+def crear_exportacion():
+    """Encola la exportación del historial (pdf, xlsx o csv)"""
+    usuario_id = session.get('usuario_id')
+    formato = str((request.get_json(silent=True) or {}).get('formato', '')).lower()
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({'error': f"Formato no soportado. Usa: {', '.join(FORMATOS_EXPORTACION)}"}), 400
+    
+    trabajo = encolar_exportacion(usuario_id, obtener_perfil(usuario_id).usuario, formato)
+    if trabajo is None:
+        return jsonify({'error': 'No hay predicciones para exportar'}), 404
+    return jsonify(respuesta_trabajo(trabajo)), 200 if trabajo['estado'] == 'listo' else 202
+
+def _trabajo_del_usuario(trabajo_id):
+    if not PATRON_TRABAJO.match(trabajo_id):
+        return None
+    trabajo = leer_trabajo(trabajo_id)
+    if not trabajo or trabajo.get('usuario_id') != session.get('usuario_id'):
+        return None
+    return trabajo
+
+@app.route('/api/exportaciones/<trabajo_id>', methods=['GET'])
+@login_requerido
+def estado_exportacion(trabajo_id):
+    trabajo = _trabajo_del_usuario(trabajo_id)
+    if not trabajo:
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    return jsonify(respuesta_trabajo(trabajo))
+
+@app.route('/api/exportaciones/<trabajo_id>/descargar', methods=['GET'])
+@login_requerido
+def descargar_exportacion(trabajo_id):
+    trabajo = _trabajo_del_usuario(trabajo_id)
+    if not trabajo:
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    ruta = ruta_exportacion(trabajo_id, trabajo['formato'])
+    if trabajo['estado'] != 'listo' or not os.path.exists(ruta):
+        return jsonify(respuesta_trabajo(trabajo)), 409
+    
+    _, mimetype = FORMATOS_EXPORTACION[trabajo['formato']]
+    filename = f"historial_{obtener_perfil(trabajo['usuario_id']).usuario}_" \
+               f"{datetime.fromtimestamp(trabajo['actualizado']).strftime('%Y%m%d_%H%M%S')}.{trabajo['formato']}"
+    return send_file(ruta, mimetype=mimetype, as_attachment=True, download_name=filename)
+
+
+# ========== CONVERSACIONES DEL CHAT BOT ==========
+# Estado del chat por usuario en memoria del proceso (LRU + TTL). El cliente
+# envía solo el mensaje nuevo; la última predicción y las estadísticas se
+# resuelven aquí. De las respuestas del bot se guarda la plantilla, no el HTML:
+# un mensaje sin palabras clave ("¿y para julio?") sigue el tema de la última.
+CHAT_MAX_CONVERSACIONES = int(os.environ.get('CHAT_MAX_CONVERSACIONES', 1024))
+CHAT_TTL_SEGUNDOS = float(os.environ.get('CHAT_TTL_SEGUNDOS', 1800))
+CHAT_MAX_TURNOS = int(os.environ.get('CHAT_MAX_TURNOS', 6))
+
+_conversaciones = OrderedDict()  # usuario_id -> (expira, deque de turnos)
+_candado_conversaciones = threading.Lock()
+
+
+def registrar_turnos(usuario_id, *turnos):
+    """Añade turnos a la conversación del usuario; la crea si no existe o expiró"""
+    ahora = time.monotonic()
+    with _candado_conversaciones:
+        entrada = _conversaciones.get(usuario_id)
+        historial = entrada[1] if entrada and entrada[0] > ahora else deque(maxlen=CHAT_MAX_TURNOS)
+        historial.extend(turnos)
+        _conversaciones[usuario_id] = (ahora + CHAT_TTL_SEGUNDOS, historial)
+        _conversaciones.move_to_end(usuario_id)
+        while len(_conversaciones) > CHAT_MAX_CONVERSACIONES:
+            _conversaciones.popitem(last=False)
+        return list(historial)
+
+
+def ultima_plantilla(usuario_id):
+    """Plantilla de la última respuesta del bot en la conversación vigente (o None)"""
+    with _candado_conversaciones:
+        entrada = _conversaciones.get(usuario_id)
+        if not entrada or entrada[0] <= time.monotonic():
+            return None
+        for turno in reversed(entrada[1]):
+            if turno['role'] == 'assistant':
+                return turno['plantilla']
+    return None
+
+
+def terminar_conversacion(usuario_id):
+    with _candado_conversaciones:
+        _conversaciones.pop(usuario_id, None)
+
+
+def contexto_chat(usuario_id):
+    """Última predicción del usuario y estadísticas del dataset, sin pedirlas al cliente"""
+    predicciones, _ = pagina_predicciones(usuario_id, limite=1)
+    return armar_contexto_chat(predicciones[0] if predicciones else None)
+
+
+def armar_contexto_chat(p):
+    """Contexto del bot a partir de la última predicción (o None)"""
+    ultima_pred = None
+    if p is not None:
+        ultima_pred = {
+            'aerolinea': p.aerolinea,
+            'ruta': f"{p.origen}-{p.destino}",
+            'fecha': p.fecha_viaje.strftime('%Y-%m-%d'),
+            'precio': p.precio_predicho
+        }
+    estadisticas = None
+    if indice_precios is None and datos_cache is not None:
+        # Sin índice el análisis compara contra el promedio global
+        estadisticas = {'precio_promedio': float(datos_cache['Precio (S/)'].mean())}
+    return {'ultimaPrediccion': ultima_pred, 'estadisticas': estadisticas}
+
+
+def metricas_conversaciones():
+    with _candado_conversaciones:
+        return {'conversaciones': len(_conversaciones), 'maximo': CHAT_MAX_CONVERSACIONES}
+
+
+def cuerpo_respuesta_chat(usuario_id, mensaje, contexto):
+    """JSON (bytes) de la respuesta del bot; registra los turnos de la conversación"""
+    # Generar respuesta inteligente con contexto conversacional
+    plantilla, variables = elegir_respuesta_bot(mensaje, contexto, ultima_plantilla(usuario_id))
+    registrar_turnos(usuario_id,
+                     {'role': 'user', 'content': mensaje},
+                     {'role': 'assistant', 'plantilla': plantilla})
+    if variables is None:
+        if RESPUESTAS_ESTATICAS_BOT[plantilla]:
+            # El chat se cierra: la próxima vez empieza una conversación nueva
+            terminar_conversacion(usuario_id)
+        # Sin contexto personal: el JSON ya está serializado
+        return respuesta_estatica_bot(plantilla)
+    return app.json.response({
+        'exito': True,
+        'respuesta': renderizar_respuesta_bot(plantilla, variables),
+        'cerrar_chat': False  # Las respuestas personalizadas no cierran el chat
+    }).get_data()
+
+
 # ========== RUTA DEL CHAT BOT  ==========
 @app.route('/api/chat-bot', methods=['POST'])
 @login_requerido
+@solo_lectura
 def chat_bot():
     """Procesa mensajes del chat bot con IA conversacional mejorada"""
     try:
         data = request.json
         mensaje_usuario = data.get('mensaje', '')
-        contexto = data.get('contexto', {})
-        conversacion = data.get('conversacion', [])
         
         if not mensaje_usuario:
             return jsonify({'exito': False, 'error': 'Mensaje vacío'}), 400
         
-        # Generar respuesta inteligente con contexto conversacional
-        respuesta, cerrar_chat = generar_respuesta_bot_mejorada(mensaje_usuario, contexto, conversacion)
-        
-        return jsonify({
-            'exito': True,
-            'respuesta': respuesta,
-            'cerrar_chat': cerrar_chat  # Nuevo: indica si debe cerrarse automáticamente
-        })
+        usuario_id = session['usuario_id']
+        cuerpo = cuerpo_respuesta_chat(usuario_id, mensaje_usuario, contexto_chat(usuario_id))
+        return app.response_class(cuerpo, mimetype='application/json')
     
     except Exception as e:
         print(f"Error en chat_bot: {str(e)}")
@@ -909,713 +2682,413 @@ def chat_bot():
         }), 500
 
 
+# ========== DETECCIÓN DE INTENCIONES ==========
+# Palabras clave sin tildes: el mensaje se normaliza antes de buscar.
+# Se busca como subcadena, igual que antes ('ok' también coincide en 'tokio').
+PALABRAS_INTENCION = {
+    'saludo': ['hola', 'hey', 'buenos dias', 'buenas tardes', 'buenas noches', 'que tal', 'como estas', 'saludos'],
+    'despedida': ['gracias', 'muchas gracias', 'perfecto', 'excelente', 'ok', 'vale', 'adios', 'chao', 'bye',
+                  'hasta luego', 'nos vemos', 'listo', 'entendido', 'ya esta'],
+    'analizar': ['analiza', 'analizar', 'ultima', 'prediccion', 'resultado', 'mi vuelo', 'mi precio'],
+    'pedir_ayuda': ['ayuda', 'ayudar', 'ayudame', 'necesito', 'quiero', 'puedes'],
+    'tema_prediccion': ['prediccion', 'precio', 'vuelo', 'viajar', 'comprar'],
+    'temporada': ['temporada'],
+    'comparar': ['compar'],
+    'aerolinea': ['aerolinea'],
+    'cuando': ['cuando', 'mejor momento', 'cuando comprar'],
+    'escalas': ['escala'],
+    'dias': ['dia', 'mejor dia'],
+    'consejos': ['consejo', 'tip', 'recomendacion', 'sugerencia'],
+}
+
+# Un bit por grupo; cada palabra activa los grupos donde aparece
+BITS_INTENCION = {grupo: 1 << i for i, grupo in enumerate(PALABRAS_INTENCION)}
+
+# Orden de prioridad: (intención, grupos que deben aparecer todos)
+REGLAS_INTENCION = [
+    ('saludo', ['saludo']),
+    ('despedida', ['despedida']),
+    ('analizar_prediccion', ['analizar']),
+    ('ayuda_prediccion', ['pedir_ayuda', 'tema_prediccion']),
+    ('temporada', ['temporada']),
+    ('comparar_aerolineas', ['comparar', 'aerolinea']),
+    ('cuando_comprar', ['cuando']),
+    ('escalas', ['escalas']),
+    ('dias_semana', ['dias']),
+    ('consejos', ['consejos']),
+]
+REGLAS_INTENCION = [(intencion, sum(BITS_INTENCION[g] for g in grupos)) for intencion, grupos in REGLAS_INTENCION]
+
+
+def normalizar_texto(texto):
+    """Minúsculas y sin tildes ('Día' -> 'dia')"""
+    texto = texto.lower()
+    if texto.isascii():
+        return texto
+    return unicodedata.normalize('NFD', texto).encode('ascii', 'ignore').decode('ascii')
+
+
+def _trie_regex(nodo):
+    """Convierte un trie de palabras en una expresión con prefijos comunes factorizados"""
+    ramas = [re.escape(letra) + _trie_regex(hijo) for letra, hijo in sorted(nodo.items()) if letra]
+    if not ramas:
+        return ''
+    cuerpo = ramas[0] if len(ramas) == 1 else '(?:' + '|'.join(ramas) + ')'
+    # Cuantificador codicioso: en cada posición gana la palabra más larga
+    return f'(?:{cuerpo})?' if '' in nodo else cuerpo
+
+
+def _compilar_intenciones():
+    mascaras = {}
+    for grupo, palabras in PALABRAS_INTENCION.items():
+        for palabra in palabras:
+            mascaras[palabra] = mascaras.get(palabra, 0) | BITS_INTENCION[grupo]
+    # La búsqueda devuelve la palabra más larga en cada posición: hereda los
+    # grupos de las palabras que son prefijo suyo ('cuando comprar' -> 'cuando')
+    cerradas = {palabra: mascara for palabra, mascara in mascaras.items()}
+    for palabra in mascaras:
+        for otra, mascara in mascaras.items():
+            if palabra != otra and palabra.startswith(otra):
+                cerradas[palabra] |= mascara
+    trie = {}
+    for palabra in mascaras:
+        nodo = trie
+        for letra in palabra:
+            nodo = nodo.setdefault(letra, {})
+        nodo[''] = True
+    # Lookahead: coincidencias solapadas en una sola pasada
+    return re.compile(f'(?=({_trie_regex(trie)}))'), cerradas
+
+
+PATRON_INTENCIONES, MASCARAS_INTENCIONES = _compilar_intenciones()
+
+
 def detectar_intencion(mensaje):
-    """Detecta la intención del usuario usando IA"""
-    mensaje_lower = mensaje.lower()
-    
-    # Saludos
-    saludos = ['hola', 'hey', 'buenos dias', 'buenas tardes', 'buenas noches', 'que tal', 'como estas', 'como estás', 'saludos']
-    if any(saludo in mensaje_lower for saludo in saludos):
-        return 'saludo'
-    
-    # Despedidas y agradecimientos
-    despedidas = ['gracias', 'muchas gracias', 'perfecto', 'excelente', 'ok', 'vale', 'adios', 'adiós', 'chao', 'bye', 'hasta luego', 'nos vemos', 'listo', 'entendido', 'ya esta', 'ya está']
-    if any(despedida in mensaje_lower for despedida in despedidas):
-        return 'despedida'
+    """Detecta la intención del mensaje con una sola pasada del patrón compilado"""
+    encontrados = 0
+    for palabra in PATRON_INTENCIONES.findall(normalizar_texto(mensaje)):
+        encontrados |= MASCARAS_INTENCIONES[palabra]
     
-    # Análisis de predicción
-    if any(palabra in mensaje_lower for palabra in ['analiza', 'analizar', 'última', 'ultima', 'predicción', 'prediccion', 'resultado', 'mi vuelo', 'mi precio']):
-        return 'analizar_prediccion'
-    
-    # Ayuda con predicción
-    if any(palabra in mensaje_lower for palabra in ['ayuda', 'ayudar', 'ayudame', 'ayúdame', 'necesito', 'quiero', 'puedes']):
-        if any(palabra in mensaje_lower for palabra in ['predicción', 'prediccion', 'precio', 'vuelo', 'viajar', 'comprar']):
-            return 'ayuda_prediccion'
-    
-    # Temporada
-    if 'temporada' in mensaje_lower:
-        return 'temporada'
-    
-    # Comparar aerolíneas
-    if 'compar' in mensaje_lower and ('aerolínea' in mensaje_lower or 'aerolinea' in mensaje_lower):
-        return 'comparar_aerolineas'
-    
-    # Cuándo comprar
-    if any(palabra in mensaje_lower for palabra in ['cuándo', 'cuando', 'mejor momento', 'cuando comprar', 'cuándo comprar']):
-        return 'cuando_comprar'
-    
-    # Escalas
-    if 'escala' in mensaje_lower:
-        return 'escalas'
-    
-    # Días
-    if any(palabra in mensaje_lower for palabra in ['día', 'dia', 'mejor dia', 'mejor día']):
-        return 'dias_semana'
-    
-    # Consejos
-    if any(palabra in mensaje_lower for palabra in ['consejo', 'tip', 'recomendación', 'recomendacion', 'sugerencia']):
-        return 'consejos'
+    for intencion, requeridos in REGLAS_INTENCION:
+        if encontrados & requeridos == requeridos:
+            return intencion
     
     # Pregunta genérica
     return 'generico'
 
 
-def generar_respuesta_bot_mejorada(mensaje, contexto, conversacion):
-    """Genera respuestas inteligentes con IA conversacional mejorada"""
-    
-    intencion = detectar_intencion(mensaje)
-    cerrar_chat = False  # Por defecto no se cierra
-    
-    ultima_pred = contexto.get('ultimaPrediccion') if contexto else None
-    stats = contexto.get('estadisticas') if contexto else None
-    
-    # ==================== SALUDOS ====================
-    if intencion == 'saludo':
-        if ultima_pred:
-            return f"""👋 <strong>¡Hola! Encantado de ayudarte</strong><br><br>
-Veo que acabas de hacer una predicción para <strong>{ultima_pred.get('ruta', '')}</strong> con un precio de <strong>S/ {ultima_pred.get('precio', 0):.2f}</strong>.<br><br>
+# ========== RESPUESTAS DEL CHAT BOT ==========
+# Las respuestas viven en templates/bot/. Las que no dependen del usuario se
+# renderizan una sola vez y se guardan ya serializadas como JSON; las
+# personalizadas se renderizan con la plantilla compilada (Jinja la cachea).
+RESPUESTAS_ESTATICAS_BOT = {
+    # plantilla: cerrar_chat
+    'saludo': False,
+    'agradecimiento': True,
+    'despedida': True,
+    'ayuda_sin_prediccion': False,
+    'sin_prediccion': False,
+    'temporada': False,
+    'comparar_aerolineas': False,
+    'cuando_comprar': False,
+    'escalas': False,
+    'dias_semana': False,
+    'consejos': False,
+    'generico': False,
+}
+
+# Plantilla estática de cada intención cuando no hay contexto personal
+PLANTILLA_POR_INTENCION = {
+    'saludo': 'saludo',
+    'ayuda_prediccion': 'ayuda_sin_prediccion',
+    'analizar_prediccion': 'sin_prediccion',
+    'temporada': 'temporada',
+    'comparar_aerolineas': 'comparar_aerolineas',
+    'cuando_comprar': 'cuando_comprar',
+    'escalas': 'escalas',
+    'dias_semana': 'dias_semana',
+    'consejos': 'consejos',
+    'generico': 'generico',
+}
+
+# Plantillas de un tema concreto: un mensaje sin palabras clave que llega
+# después de una de ellas se responde como continuación de ese tema
+INTENCION_POR_PLANTILLA = {
+    'temporada': 'temporada',
+    'temporada_datos': 'temporada',
+    'comparar_aerolineas': 'comparar_aerolineas',
+    'cuando_comprar': 'cuando_comprar',
+    'escalas': 'escalas',
+    'dias_semana': 'dias_semana',
+    'consejos': 'consejos',
+    'analisis': 'analizar_prediccion',
+    'ayuda_prediccion': 'ayuda_prediccion',
+}
+
+_respuestas_bot = {}
+
+
+def respuesta_estatica_bot(plantilla):
+    """Cuerpo JSON (bytes) de una respuesta fija, renderizada una sola vez por proceso"""
+    cuerpo = _respuestas_bot.get(plantilla)
+    if cuerpo is None:
+        cuerpo = _respuestas_bot[plantilla] = app.json.response({
+            'exito': True,
+            'respuesta': app.jinja_env.get_template(f'bot/{plantilla}.html').render(),
+            'cerrar_chat': RESPUESTAS_ESTATICAS_BOT[plantilla]
+        }).get_data()
+    return cuerpo
 
-¿Quieres que te ayude con alguna de estas cosas?<br><br>
 
-<div style="background: #f0f7ff; padding: 12px; border-radius: 8px; margin: 10px 0;">
-📊 <strong>"Analiza mi predicción"</strong> - Te doy un análisis completo<br><br>
-🏖️ <strong>"¿Es temporada alta?"</strong> - Te digo si es buen momento<br><br>
-💡 <strong>"Dame consejos"</strong> - Tips para ahorrar más<br><br>
-✈️ <strong>"Compara aerolíneas"</strong> - Veo si hay mejores opciones
-</div>
+def precargar_respuestas_bot():
+    """Compila y renderiza por adelantado todas las respuestas fijas"""
+    for plantilla in RESPUESTAS_ESTATICAS_BOT:
+        respuesta_estatica_bot(plantilla)
+    return len(_respuestas_bot)
 
-¿En qué te ayudo? 😊""", False
-        else:
-            return """👋 <strong>¡Hola! ¿Cómo estás?</strong><br><br>
-Soy tu asistente inteligente de vuelos. Puedo ayudarte a:<br><br>
 
-✅ Analizar precios de vuelos<br>
-✅ Identificar la mejor temporada para viajar<br>
-✅ Comparar aerolíneas<br>
-✅ Darte consejos para ahorrar<br><br>
+def renderizar_respuesta_bot(plantilla, variables):
+    return app.jinja_env.get_template(f'bot/{plantilla}.html').render(**variables)
 
-<div style="background: #fff3cd; padding: 12px; border-radius: 8px; border-left: 4px solid #ffc107;">
-💡 <strong>Tip:</strong> Primero haz una predicción arriba, y luego puedo darte un análisis completo personalizado.
-</div>
 
-¿En qué te puedo ayudar? 😊""", False
-    
-    # ==================== DESPEDIDAS Y AGRADECIMIENTOS ====================
-    elif intencion == 'despedida':
-        mensaje_lower = mensaje.lower()
-        
-        # Detectar si es agradecimiento
-        if any(palabra in mensaje_lower for palabra in ['gracias', 'thank', 'excelente', 'perfecto', 'genial']):
-            cerrar_chat = True  # Se cerrará automáticamente
-            return """😊 <strong>¡De nada! Ha sido un placer ayudarte</strong><br><br>
-
-Recuerda:<br>
-✅ Compra con 30-45 días de anticipación<br>
-✅ Los martes son los mejores días<br>
-✅ Usa modo incógnito siempre<br><br>
+COLORES_TEMPORADA = {'ALTA': ('🏖️', '#ff4757'), 'MEDIA': ('📊', '#ffa502'), 'BAJA': ('✨', '#26de81')}
 
-<div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 12px; border-radius: 8px;">
-💡 Vuelve cuando quieras, ¡estoy aquí para ayudarte! ✈️
-</div>
-
-<em style="font-size: 11px; color: #999;">Este chat se cerrará en 2 segundos...</em>""", True
-        
-        # Despedida normal
-        else:
-            cerrar_chat = True
-            return """👋 <strong>¡Hasta luego!</strong><br><br>
 
-Fue un gusto ayudarte. Recuerda que puedes volver cuando quieras.<br><br>
+def describir_grupo(nivel, ruta, aerolinea, fecha):
+    """Texto del grupo de comparación del índice ('vuelos LIM-CUZ en marzo')"""
+    dia = NOMBRES_DIAS[fecha.weekday()].lower()
+    partes = {
+        'ruta': ruta,
+        'aerolinea': f"de {aerolinea}",
+        'mes': f"en {NOMBRES_MESES[fecha.month - 1].lower()}",
+        'dia': f"los {dia}s" if dia.endswith('o') else f"los {dia}",
+    }
+    return ' '.join(['vuelos'] + [partes[c] for c in nivel]) if nivel else 'vuelos del dataset'
 
-<strong>¡Buen viaje! ✈️</strong><br><br>
 
-<em style="font-size: 11px; color: #999;">Este chat se cerrará en 2 segundos...</em>""", True
+def datos_analisis(ultima_pred, stats):
+    """Variables de la plantilla de análisis: nivel de precio, temporada, anticipación y día
     
-    # ==================== AYUDA CON PREDICCIÓN ====================
-    elif intencion == 'ayuda_prediccion':
-        if ultima_pred:
-            # Ya tiene una predicción, ofrecer análisis
-            return f"""🤝 <strong>¡Claro que sí! Te ayudo con tu predicción</strong><br><br>
-
-Veo que buscas viajar de <strong>{ultima_pred.get('ruta', '')}</strong> con <strong>{ultima_pred.get('aerolinea', '')}</strong>.<br><br>
-
-Te voy a dar un análisis completo ahora mismo...<br><br>
-
-<em style="font-size: 11px; color: #999;">Analizando datos...</em>""", False
-            # Luego automáticamente seguirá con el análisis
+    Con el índice de precios la predicción se ubica en su percentil entre vuelos
+    parecidos y la temporada y el día más barato salen de los datos; sin índice
+    se usa el promedio global y las reglas fijas.
+    """
+    precio = ultima_pred.get('precio', 0)
+    ruta = ultima_pred.get('ruta', '')
+    aerolinea = ultima_pred.get('aerolinea', '')
+    fecha = ultima_pred.get('fecha', '')
+    try:
+        fecha_obj = datetime.strptime(fecha, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        fecha_obj = None
+    
+    # Análisis de precio
+    nivel_precio = "NORMAL"
+    emoji_precio = "💰"
+    comparacion = ""
+    recomendacion_precio = ""
+    
+    posicion = percentil_precio(ruta, aerolinea, fecha_obj, precio) if fecha_obj else None
+    if posicion:
+        percentil, muestras, nivel = posicion
+        grupo = describir_grupo(nivel, ruta, aerolinea, fecha_obj)
+        if percentil <= 25:
+            nivel_precio = "EXCELENTE"
+            emoji_precio = "✅"
+            comparacion = f"Más barato que el {100 - percentil:.0f}% de {muestras} {grupo}"
+            recomendacion_precio = "¡Este es un precio excelente! Te recomiendo comprar pronto antes de que suba."
+        elif percentil >= 75:
+            nivel_precio = "ELEVADO"
+            emoji_precio = "⚠️"
+            comparacion = f"Más caro que el {percentil:.0f}% de {muestras} {grupo}"
+            recomendacion_precio = "El precio está alto. Considera buscar otras fechas u aerolíneas."
         else:
-            return """🤝 <strong>¡Por supuesto! Te ayudo con tu predicción</strong><br><br>
-
-Para poder ayudarte mejor, primero necesito que hagas una predicción:<br><br>
-
-<div style="background: #f0f7ff; padding: 12px; border-radius: 8px; border-left: 4px solid #667eea;">
-<strong>Pasos:</strong><br>
-1️⃣ Usa el formulario de arriba<br>
-2️⃣ Selecciona tu ruta y fecha<br>
-3️⃣ Haz clic en "Calcular Precio"<br>
-4️⃣ Vuelve aquí y te doy un análisis completo 📊
-</div>
-
-Una vez tengas tu predicción, puedo decirte:<br>
-• Si el precio está alto o bajo<br>
-• Si es buen momento para comprar<br>
-• Qué aerolínea conviene más<br>
-• Tips para ahorrar más dinero<br><br>
-
-¿Quieres que te explique algo más mientras tanto? 😊""", False
-    
-    # ==================== ANÁLISIS DE PREDICCIÓN ====================
-    elif intencion == 'analizar_prediccion':
-        if not ultima_pred:
-            return """❌ <strong>Aún no tienes predicciones</strong><br><br>
+            comparacion = f"Percentil {percentil:.0f} entre {muestras} {grupo}"
+            recomendacion_precio = "El precio está en el rango esperado. Es una opción razonable."
+    elif stats:
+        promedio = stats.get('precio_promedio', 0)
+        if promedio > 0:
+            diferencia_pct = ((precio / promedio) - 1) * 100
             
-Para que pueda analizar tu vuelo, primero necesitas hacer una predicción usando el formulario de arriba.<br><br>
-
-<div style="background: #fff3cd; padding: 12px; border-radius: 8px; border-left: 4px solid #ffc107;">
-<strong>💡 Cómo hacerlo:</strong><br>
-1. Completa el formulario de "Predicción de Precios"<br>
-2. Haz clic en "Calcular Precio"<br>
-3. Vuelve aquí y pídeme el análisis
-</div>
-
-¿Necesitas ayuda con algo más? 😊""", False
-        
-        precio = ultima_pred.get('precio', 0)
-        ruta = ultima_pred.get('ruta', '')
-        aerolinea = ultima_pred.get('aerolinea', '')
-        fecha = ultima_pred.get('fecha', '')
-        
-        # Análisis de precio
-        nivel_precio = "NORMAL"
-        emoji_precio = "💰"
-        comparacion = ""
-        recomendacion_precio = ""
-        
-        if stats:
-            promedio = stats.get('precio_promedio', 0)
-            if promedio > 0:
-                diferencia_pct = ((precio / promedio) - 1) * 100
-                
-                if diferencia_pct < -15:
-                    nivel_precio = "EXCELENTE"
-                    emoji_precio = "✅"
-                    comparacion = f"{abs(diferencia_pct):.1f}% más barato que el promedio"
-                    recomendacion_precio = "¡Este es un precio excelente! Te recomiendo comprar pronto antes de que suba."
-                elif diferencia_pct > 15:
-                    nivel_precio = "ELEVADO"
-                    emoji_precio = "⚠️"
-                    comparacion = f"{diferencia_pct:.1f}% más caro que el promedio"
-                    recomendacion_precio = "El precio está alto. Considera buscar otras fechas u aerolíneas."
-                else:
-                    comparacion = f"Diferencia: {diferencia_pct:+.1f}% vs promedio"
-                    recomendacion_precio = "El precio está en el rango esperado. Es una opción razonable."
-        
-        # Análisis de temporada y anticipación
-        try:
-            fecha_obj = datetime.strptime(fecha, '%Y-%m-%d')
-            mes_viaje = fecha_obj.month
-            dia_semana = fecha_obj.strftime('%A')
-            
-            # Traducir día
-            dias_es = {'Monday': 'Lunes', 'Tuesday': 'Martes', 'Wednesday': 'Miércoles', 
-                      'Thursday': 'Jueves', 'Friday': 'Viernes', 'Saturday': 'Sábado', 'Sunday': 'Domingo'}
-            dia_viaje = dias_es.get(dia_semana, dia_semana)
-            
-            # Temporada
-            if mes_viaje in [12, 1, 2, 7, 8]:
-                temporada = "ALTA"
-                emoji_temp = "🏖️"
-                msg_temporada = "Estás viajando en temporada alta. Los precios suelen ser 30-50% más altos."
-                color_temp = "#ff4757"
-            elif mes_viaje in [6, 9, 10, 11]:
-                temporada = "MEDIA"
-                emoji_temp = "📊"
-                msg_temporada = "Temporada media. Los precios son moderados."
-                color_temp = "#ffa502"
-            else:
-                temporada = "BAJA"
-                emoji_temp = "✨"
-                msg_temporada = "¡Excelente elección! Temporada baja significa mejores precios."
-                color_temp = "#26de81"
-            
-            # Anticipación
-            dias_anticipacion = (fecha_obj - datetime.now()).days
-            
-            if dias_anticipacion < 0:
-                anticipacion_msg = "La fecha ya pasó"
-                anticipacion_color = "#999"
-                anticipacion_consejo = ""
-            elif dias_anticipacion < 15:
-                anticipacion_msg = f"Faltan {dias_anticipacion} días - ¡URGENTE!"
-                anticipacion_color = "#ff4757"
-                anticipacion_consejo = "🚨 ¡Compra HOY! Los precios suben mucho cerca de la fecha de viaje."
-            elif dias_anticipacion <= 45:
-                anticipacion_msg = f"Faltan {dias_anticipacion} días - MOMENTO ÓPTIMO"
-                anticipacion_color = "#26de81"
-                anticipacion_consejo = "✅ ¡Perfecto! Estás en la ventana ideal de compra (15-45 días antes)."
-            elif dias_anticipacion <= 60:
-                anticipacion_msg = f"Faltan {dias_anticipacion} días"
-                anticipacion_color = "#667eea"
-                anticipacion_consejo = "📅 Buen momento para empezar a monitorear ofertas."
-            else:
-                anticipacion_msg = f"Faltan {dias_anticipacion} días"
-                anticipacion_color = "#ffa502"
-                anticipacion_consejo = "⏰ Es muy pronto. Espera 2-3 semanas más para precios más estables."
-            
-            # Análisis del día de viaje
-            dias_baratos = ['Martes', 'Miércoles']
-            dias_caros = ['Viernes', 'Domingo']
-            
-            if dia_viaje in dias_baratos:
-                dia_msg = f"✅ ¡Excelente! {dia_viaje} es uno de los días más baratos para viajar."
-            elif dia_viaje in dias_caros:
-                dia_msg = f"⚠️ {dia_viaje} suele ser más caro. Podrías ahorrar 20-30% viajando martes o miércoles."
+            if diferencia_pct < -15:
+                nivel_precio = "EXCELENTE"
+                emoji_precio = "✅"
+                comparacion = f"{abs(diferencia_pct):.1f}% más barato que el promedio"
+                recomendacion_precio = "¡Este es un precio excelente! Te recomiendo comprar pronto antes de que suba."
+            elif diferencia_pct > 15:
+                nivel_precio = "ELEVADO"
+                emoji_precio = "⚠️"
+                comparacion = f"{diferencia_pct:.1f}% más caro que el promedio"
+                recomendacion_precio = "El precio está alto. Considera buscar otras fechas u aerolíneas."
             else:
-                dia_msg = f"💰 {dia_viaje} tiene precios moderados."
-                
-        except:
-            temporada = "N/A"
-            emoji_temp = "❓"
-            msg_temporada = ""
-            color_temp = "#999"
-            anticipacion_msg = "No disponible"
-            anticipacion_color = "#999"
-            anticipacion_consejo = ""
-            dia_msg = ""
-        
-        # Respuesta completa con análisis detallado
-        return f"""📊 <strong>Análisis Completo de tu Vuelo</strong><br><br>
-
-<div style="background: #f8f9fa; padding: 15px; border-radius: 10px; border-left: 4px solid #667eea; margin: 10px 0;">
-<strong>📍 Ruta:</strong> {ruta}<br>
-<strong>✈️ Aerolínea:</strong> {aerolinea}<br>
-<strong>📅 Fecha:</strong> {fecha} ({dia_viaje})<br>
-<strong>⏰ Anticipación:</strong> {anticipacion_msg}
-</div>
-
-<div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 12px; margin: 15px 0;">
-<div style="font-size: 28px; font-weight: bold; margin-bottom: 10px;">
-{emoji_precio} S/ {precio:.2f}
-</div>
-<div style="font-size: 16px; margin-bottom: 5px;">
-Estado: <strong>{nivel_precio}</strong>
-</div>
-<div style="font-size: 13px; opacity: 0.9;">
-{comparacion}
-</div>
-</div>
-
-<div style="background: {color_temp}; color: white; padding: 15px; border-radius: 10px; margin: 10px 0;">
-<strong>{emoji_temp} TEMPORADA {temporada}</strong><br>
-{msg_temporada}
-</div>
-
-<div style="background: {anticipacion_color}; color: white; padding: 15px; border-radius: 10px; margin: 10px 0;">
-<strong>⏰ ANTICIPACIÓN</strong><br>
-{anticipacion_consejo}
-</div>
-
-<div style="background: #f0f7ff; padding: 15px; border-radius: 10px; border-left: 4px solid #667eea; margin: 15px 0;">
-<strong>📅 DÍA DE VIAJE</strong><br>
-{dia_msg}
-</div>
-
-<div style="background: #fff3cd; padding: 15px; border-radius: 10px; border-left: 4px solid #ffc107; margin: 15px 0;">
-<strong>💡 MI RECOMENDACIÓN</strong><br>
-{recomendacion_precio}<br><br>
-
-<strong>Consejos adicionales:</strong><br>
-• Compara con otras aerolíneas antes de decidir<br>
-• Usa modo incógnito para buscar<br>
-• Configura alertas de precio<br>
-• Considera volar martes o miércoles si puedes
-</div>
-
-¿Necesitas más información o tienes alguna pregunta? 😊""", False
-    
-    # ==================== OTRAS INTENCIONES ====================
-    elif intencion == 'temporada':
-        return """🏖️ <strong>Temporadas de Vuelos en Perú</strong><br><br>
-
-<div style="background: linear-gradient(135deg, #ff4757 0%, #ff6348 100%); color: white; padding: 15px; border-radius: 10px; margin: 10px 0;">
-<strong>🔥 TEMPORADA ALTA</strong> (+30-50% más caro)<br>
-• 🎄 Diciembre - Febrero: Verano y vacaciones<br>
-• 🇵🇪 Julio - Agosto: Fiestas Patrias<br>
-• 🐰 Semana Santa (Marzo/Abril)
-</div>
-
-<div style="background: linear-gradient(135deg, #ffa502 0%, #ffc048 100%); color: white; padding: 15px; border-radius: 10px; margin: 10px 0;">
-<strong>📊 TEMPORADA MEDIA</strong> (Precios normales)<br>
-• Junio, Septiembre, Octubre, Noviembre
-</div>
-
-<div style="background: linear-gradient(135deg, #26de81 0%, #4ade80 100%); color: white; padding: 15px; border-radius: 10px; margin: 10px 0;">
-<strong>✅ TEMPORADA BAJA</strong> (¡Ahorra hasta 40%!)<br>
-• Marzo, Abril, Mayo
-</div>
-
-<strong>💡 Estrategia ganadora:</strong><br>
-Viaja en temporada baja + compra 30-40 días antes = <strong>Máximo ahorro</strong> 💰<br><br>
-
-¿Te gustaría saber algo más? 😊""", False
-    
-    elif intencion == 'comparar_aerolineas':
-        return """✈️ <strong>Comparación de Aerolíneas en Perú</strong><br><br>
-
-<div style="background: #f8f9fa; padding: 12px; border-radius: 8px; margin: 10px 0; border-left: 4px solid #667eea;">
-<strong>🔵 LATAM Airlines</strong><br>
-✅ Más frecuencias y destinos<br>
-✅ Mejor programa de millas (LATAM Pass)<br>
-⚠️ Precios 20-30% más altos<br>
-✅ Servicio completo incluido<br>
-<em>→ Ideal para: Viajes frecuentes, acumular millas</em>
-</div>
-
-<div style="background: #f8f9fa; padding: 12px; border-radius: 8px; margin: 10px 0; border-left: 4px solid #ff6348;">
-<strong>🔴 Sky Airline</strong><br>
-✅ 15-25% más barato que LATAM<br>
-⚠️ Menos frecuencias<br>
-✅ Equipaje de mano incluido<br>
-⚠️ Servicio básico<br>
-<em>→ Ideal para: Presupuesto moderado</em>
-</div>
-
-<div style="background: #f8f9fa; padding: 12px; border-radius: 8px; margin: 10px 0; border-left: 4px solid #4ade80;">
-<strong>🟢 JetSmart</strong><br>
-✅ Low-cost, los mejores precios<br>
-⚠️ Todo se cobra extra (equipaje, asiento, etc.)<br>
-✅ Perfecto para viajes ligeros<br>
-⚠️ Menos flexibilidad<br>
-<em>→ Ideal para: Máximo ahorro, solo carry-on</em>
-</div>
-
-<div style="background: #fff3cd; padding: 12px; border-radius: 8px; border-left: 4px solid #ffc107;">
-<strong>⚠️ Importante:</strong> Siempre compara el precio TOTAL (con equipaje y extras incluidos) antes de decidir. A veces la "más barata" termina costando igual.
-</div>
-
-¿Quieres que analice cuál te conviene más? 😊""", False
-    
-    elif intencion == 'cuando_comprar':
-        return """⏰ <strong>Guía Completa: Cuándo Comprar Vuelos</strong><br><br>
-
-<div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 18px; border-radius: 12px; margin: 15px 0;">
-<strong style="font-size: 18px;">📅 ANTICIPACIÓN ÓPTIMA</strong><br><br>
-<div style="background: rgba(255,255,255,0.1); padding: 10px; border-radius: 8px; margin: 8px 0;">
-<strong>✅ 30-45 días antes:</strong> ¡PUNTO DULCE! 🎯<br>
-<small>El mejor momento para conseguir buenos precios</small>
-</div>
-<div style="background: rgba(255,255,255,0.1); padding: 10px; border-radius: 8px; margin: 8px 0;">
-<strong>💰 15-29 días:</strong> Precios estables<br>
-<small>Todavía aceptable, pero menos ofertas</small>
-</div>
-<div style="background: rgba(255,255,255,0.1); padding: 10px; border-radius: 8px; margin: 8px 0;">
-<strong>⚠️ Menos de 15 días:</strong> Precios suben 20-40%<br>
-<small>¡Evita comprar tan tarde!</small>
-</div>
-<div style="background: rgba(255,255,255,0.1); padding: 10px; border-radius: 8px; margin: 8px 0;">
-<strong>📈 Más de 60 días:</strong> Precios pueden fluctuar<br>
-<small>Aún no se estabilizan</small>
-</div>
-</div>
-
-<strong>📆 Mejor DÍA para COMPRAR:</strong><br>
-<div style="padding: 10px; background: #f0f7ff; border-radius: 8px; margin: 10px 0;">
-✅ <strong>Martes y Miércoles:</strong> Mejores ofertas<br>
-💰 <strong>Jueves:</strong> Precios moderados<br>
-🚫 <strong>Viernes-Domingo:</strong> Más caro (evitar)
-</div>
-
-<strong>📆 Mejor DÍA para VIAJAR:</strong><br>
-<div style="padding: 10px; background: #f0f7ff; border-radius: 8px; margin: 10px 0;">
-✅ <strong>Martes:</strong> Ahorro de 15% vs promedio<br>
-✅ <strong>Miércoles:</strong> Ahorro de 12%<br>
-⚠️ <strong>Viernes tarde:</strong> Recargo de 25%<br>
-🚫 <strong>Domingo tarde:</strong> Recargo de 30%
-</div>
-
-<strong>🕐 Mejor HORA para COMPRAR:</strong><br>
-<div style="padding: 10px; background: #f0f7ff; border-radius: 8px; margin: 10px 0;">
-✅ <strong>10 PM - 2 AM:</strong> Actualizaciones de precios<br>
-💰 <strong>Madrugada:</strong> Menos competencia<br>
-⚠️ <strong>8 AM - 12 PM:</strong> Precios más altos
-</div>
-
-<div style="background: linear-gradient(135deg, #26de81 0%, #4ade80 100%); color: white; padding: 18px; border-radius: 12px; margin: 15px 0;">
-<strong style="font-size: 16px;">🎯 FÓRMULA GANADORA:</strong><br><br>
-Compra un <strong>MARTES a las 11 PM</strong><br>
-Con <strong>30-40 DÍAS</strong> de anticipación<br>
-Para volar un <strong>MIÉRCOLES</strong><br>
-= <strong>¡AHORRO HASTA 35%!</strong> 💰✨
-</div>
-
-¿Quieres más consejos para ahorrar? 😊""", False
-    
-    elif intencion == 'escalas':
-        return """🛫 <strong>Guía Completa sobre Escalas</strong><br><br>
-
-<div style="background: linear-gradient(135deg, #26de81 0%, #4ade80 100%); color: white; padding: 18px; border-radius: 12px; margin: 12px 0;">
-<strong style="font-size: 17px;">✈️ VUELO DIRECTO</strong><br><br>
-⏱️ <strong>Tiempo:</strong> Ahorra 2-4 horas<br>
-💰 <strong>Precio:</strong> +15-30% más caro<br>
-✅ <strong>Ventajas:</strong><br>
-• Menos cansancio<br>
-• Menor riesgo de perder equipaje<br>
-• Sin preocupaciones por conexiones<br><br>
-<em>→ Ideal para: Viajes de negocios, vuelos cortos, poca flexibilidad</em>
-</div>
-
-<div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 18px; border-radius: 12px; margin: 12px 0;">
-<strong style="font-size: 17px;">🔄 1 ESCALA</strong><br><br>
-⏱️ <strong>Tiempo:</strong> +2-3 horas de viaje total<br>
-💰 <strong>Precio:</strong> Balance precio-tiempo<br>
-✅ <strong>Ventajas:</strong><br>
-• Ahorro moderado<br>
-• Tiempo razonable<br>
-• Opción de estirar piernas<br>
-⚠️ <strong>Riesgos:</strong> Moderados<br><br>
-<em>→ Ideal para: Presupuesto moderado, flexibilidad media</em>
-</div>
-
-<div style="background: linear-gradient(135deg, #ffa502 0%, #ff6348 100%); color: white; padding: 18px; border-radius: 12px; margin: 12px 0;">
-<strong style="font-size: 17px;">🔄🔄 2+ ESCALAS</strong><br><br>
-⏱️ <strong>Tiempo:</strong> +4-6 horas (o más)<br>
-💰 <strong>Precio:</strong> Hasta 40% más barato<br>
-✅ <strong>Ventajas:</strong><br>
-• Máximo ahorro<br>
-• Posibilidad de conocer ciudades intermedias<br>
-⚠️ <strong>Riesgos:</strong> ALTOS<br>
-• Mayor probabilidad de retrasos<br>
-• Riesgo de perder conexiones<br>
-• Mayor desgaste físico<br><br>
-<em>→ Ideal para: Presupuesto ajustado, mucha flexibilidad, viajes de placer</em>
-</div>
-
-<div style="background: #fff3cd; padding: 15px; border-radius: 10px; border-left: 4px solid #ffc107; margin: 15px 0;">
-<strong>💡 RECOMENDACIONES:</strong><br><br>
-<strong>Para vuelos DOMÉSTICOS en Perú (1-2h):</strong><br>
-→ Prioriza SIEMPRE vuelos directos<br>
-→ El ahorro no justifica el tiempo extra<br><br>
-
-<strong>Para vuelos INTERNACIONALES:</strong><br>
-→ Evalúa cuánto vale tu tiempo<br>
-→ Si ahorras $200 pero pierdes 6 horas, ¿vale la pena?<br><br>
-
-<strong>Si eliges escalas:</strong><br>
-✅ Deja MÍNIMO 2 horas entre conexiones<br>
-✅ Prefiere misma aerolínea (equipaje directo)<br>
-✅ Evita escalas en aeropuertos grandes (más demoras)<br>
-⚠️ NO reserves escalas cortas (menos de 90 min)
-</div>
-
-<div style="background: #ffe5e5; padding: 15px; border-radius: 10px; border-left: 4px solid #ff4757; margin: 15px 0;">
-<strong>⚠️ EVITA ESCALAS SI:</strong><br>
-• Viajas con niños pequeños<br>
-• Llevas equipaje delicado o importante<br>
-• Tienes reuniones/eventos inmediatos al llegar<br>
-• El clima puede afectar vuelos (invierno, temporada de huracanes)
-</div>
-
-¿Te ayudo a decidir entre directo o con escalas para tu viaje? 😊""", False
-    
-    elif intencion == 'dias_semana':
-        return """📅 <strong>Guía: Mejores Días para Viajar y Ahorrar</strong><br><br>
-
-<div style="background: linear-gradient(135deg, #26de81 0%, #4ade80 100%); color: white; padding: 18px; border-radius: 12px; margin: 15px 0;">
-<strong style="font-size: 18px;">✅ DÍAS MÁS BARATOS</strong><br><br>
-<div style="background: rgba(255,255,255,0.15); padding: 12px; border-radius: 8px; margin: 8px 0;">
-<strong>🔵 MARTES</strong><br>
-Ahorro: <strong>-15%</strong> vs promedio<br>
-<small>El mejor día de toda la semana</small>
-</div>
-<div style="background: rgba(255,255,255,0.15); padding: 12px; border-radius: 8px; margin: 8px 0;">
-<strong>🔵 MIÉRCOLES</strong><br>
-Ahorro: <strong>-12%</strong> vs promedio<br>
-<small>Segundo mejor día</small>
-</div>
-<div style="background: rgba(255,255,255,0.15); padding: 12px; border-radius: 8px; margin: 8px 0;">
-<strong>🔵 SÁBADO (mediodía)</strong><br>
-Ahorro: <strong>-8%</strong> vs promedio<br>
-<small>Buena opción de fin de semana</small>
-</div>
-</div>
-
-<div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 18px; border-radius: 12px; margin: 15px 0;">
-<strong style="font-size: 18px;">💰 PRECIO NORMAL</strong><br><br>
-<strong>⚪ LUNES:</strong> Precio estándar<br>
-<strong>⚪ JUEVES:</strong> Precio estándar<br>
-<strong>⚪ SÁBADO (mañana):</strong> Precio estándar
-</div>
-
-<div style="background: linear-gradient(135deg, #ff4757 0%, #ff6348 100%); color: white; padding: 18px; border-radius: 12px; margin: 15px 0;">
-<strong style="font-size: 18px;">🚫 DÍAS MÁS CAROS</strong><br><br>
-<div style="background: rgba(255,255,255,0.15); padding: 12px; border-radius: 8px; margin: 8px 0;">
-<strong>🔴 VIERNES (tarde/noche)</strong><br>
-Recargo: <strong>+20-30%</strong><br>
-<small>Inicio de fin de semana laboral</small>
-</div>
-<div style="background: rgba(255,255,255,0.15); padding: 12px; border-radius: 8px; margin: 8px 0;">
-<strong>🔴 DOMINGO (tarde/noche)</strong><br>
-Recargo: <strong>+25-35%</strong><br>
-<small>Retorno de fin de semana - EL MÁS CARO</small>
-</div>
-<div style="background: rgba(255,255,255,0.15); padding: 12px; border-radius: 8px; margin: 8px 0;">
-<strong>🔴 LUNES (mañana temprano)</strong><br>
-Recargo: <strong>+15-20%</strong><br>
-<small>Viajes de negocios</small>
-</div>
-</div>
-
-<div style="background: #f0f7ff; padding: 15px; border-radius: 10px; border-left: 4px solid #667eea; margin: 15px 0;">
-<strong>📊 ¿POR QUÉ SUCEDE ESTO?</strong><br><br>
-<strong>Viernes PM:</strong> Todos salen de viaje de fin de semana<br>
-<strong>Domingo PM:</strong> Todos regresan a casa/trabajo<br>
-<strong>Lunes AM:</strong> Viajes de negocios concentrados<br>
-<strong>Martes-Miércoles:</strong> Baja demanda = mejores precios
-</div>
-
-<div style="background: linear-gradient(135deg, #26de81 0%, #4ade80 100%); color: white; padding: 18px; border-radius: 12px; margin: 15px 0;">
-<strong style="font-size: 16px;">🎯 ESTRATEGIA MAESTRA:</strong><br><br>
-1️⃣ Viaja <strong>MARTES</strong> o <strong>MIÉRCOLES</strong><br>
-2️⃣ Compra el boleto un <strong>MARTES</strong> por la noche<br>
-3️⃣ Con <strong>30-40 DÍAS</strong> de anticipación<br>
-4️⃣ En <strong>TEMPORADA BAJA</strong> (Mar-May)<br><br>
-= <strong>¡AHORRO TOTAL: HASTA 50%!</strong> 💰✨
-</div>
-
-<div style="background: #fff3cd; padding: 15px; border-radius: 10px; border-left: 4px solid #ffc107; margin: 15px 0;">
-<strong>💡 TIP EXTRA:</strong><br>
-Si tu trabajo lo permite, toma vacaciones martes a jueves en lugar de viernes a domingo. Podrías ahorrar cientos de soles solo cambiando días.
-</div>
-
-¿Quieres saber algo más sobre cómo ahorrar? 😊""", False
-    
-    elif intencion == 'consejos':
-        return """💡 <strong>Guía Definitiva: Tips PRO para Ahorrar en Vuelos</strong><br><br>
-
-<div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 18px; border-radius: 12px; margin: 15px 0;">
-<strong style="font-size: 18px;">🎯 LOS 10 SECRETOS MÁS IMPORTANTES</strong>
-</div>
-
-<div style="background: #f8f9fa; padding: 15px; border-radius: 10px; margin: 10px 0; border-left: 4px solid #667eea;">
-<strong>1️⃣ Usa SIEMPRE Modo Incógnito</strong><br>
-Las aerolíneas rastrean tus búsquedas con cookies y suben los precios cada vez que vuelves a buscar el mismo vuelo. 🕵️<br>
-<em>→ Ahorro potencial: 10-15%</em>
-</div>
-
-<div style="background: #f8f9fa; padding: 15px; border-radius: 10px; margin: 10px 0; border-left: 4px solid #4ade80;">
-<strong>2️⃣ Configura Alertas de Precio</strong><br>
-Google Flights, Skyscanner o Kayak te avisan cuando bajan los precios de tu ruta. 📧<br>
-<em>→ No pierdas ofertas flash</em>
-</div>
-
-<div style="background: #f8f9fa; padding: 15px; border-radius: 10px; margin: 10px 0; border-left: 4px solid #ff6348;">
-<strong>3️⃣ Flexibilidad de ±3 Días</strong><br>
-Si puedes mover tu viaje 3 días antes o después, ahorras hasta 30%. Usa calendarios de precios. 📅<br>
-<em>→ Ahorro potencial: 20-30%</em>
-</div>
-
-<div style="background: #f8f9fa; padding: 15px; border-radius: 10px; margin: 10px 0; border-left: 4px solid #ffa502;">
-<strong>4️⃣ Aeropuertos Alternativos</strong><br>
-A veces volar desde/hacia ciudades cercanas es más barato. Ejemplo: Callao vs Centro Lima. 🛫<br>
-<em>→ Ahorro potencial: 15-25%</em>
-</div>
-
-<div style="background: #f8f9fa; padding: 15px; border-radius: 10px; margin: 10px 0; border-left: 4px solid #26de81;">
-<strong>5️⃣ Suscríbete a Newsletters</strong><br>
-LATAM, Sky y JetSmart envían ofertas flash EXCLUSIVAS a suscriptores antes que al público. 📬<br>
-<em>→ Acceso a ofertas limitadas</em>
-</div>
-
-<div style="background: #f8f9fa; padding: 15px; border-radius: 10px; margin: 10px 0; border-left: 4px solid #764ba2;">
-<strong>6️⃣ Acumula Millas</strong><br>
-Incluso en vuelos económicos, acumula puntos. LATAM Pass es el más útil en Perú. ✈️<br>
-<em>→ Vuelos gratis a largo plazo</em>
-</div>
-
-<div style="background: #f8f9fa; padding: 15px; border-radius: 10px; margin: 10px 0; border-left: 4px solid #667eea;">
-<strong>7️⃣ Viaja Solo con Carry-on</strong><br>
-Evita costos de equipaje documentado. Ahorras dinero y tiempo en el aeropuerto. 🎒<br>
-<em>→ Ahorro: S/80-150 por vuelo</em>
-</div>
-
-<div style="background: #f8f9fa; padding: 15px; border-radius: 10px; margin: 10px 0; border-left: 4px solid #ffc107;">
-<strong>8️⃣ Compara Monedas</strong><br>
-A veces pagar en soles vs dólares hace diferencia. Prueba ambas opciones. 💱<br>
-<em>→ Ahorro potencial: 5-10%</em>
-</div>
-
-<div style="background: #f8f9fa; padding: 15px; border-radius: 10px; margin: 10px 0; border-left: 4px solid #ff4757;">
-<strong>9️⃣ Evita Fines de Semana</strong><br>
-Comprar y viajar entre semana es SIEMPRE más barato. 📆<br>
-<em>→ Ahorro potencial: 25-35%</em>
-</div>
-
-<div style="background: #f8f9fa; padding: 15px; border-radius: 10px; margin: 10px 0; border-left: 4px solid #4ade80;">
-<strong>🔟 Usa Tarjetas con Beneficios</strong><br>
-Algunas tarjetas de crédito ofrecen millas, seguros de viaje o descuentos. 💳<br>
-<em>→ Beneficios adicionales gratis</em>
-</div>
-
-<div style="background: linear-gradient(135deg, #26de81 0%, #4ade80 100%); color: white; padding: 20px; border-radius: 12px; margin: 20px 0;">
-<strong style="font-size: 18px;">🏆 FÓRMULA MAESTRA DEFINITIVA</strong><br><br>
-<div style="background: rgba(255,255,255,0.15); padding: 15px; border-radius: 8px;">
-✅ Modo incógnito<br>
-✅ Compra un MARTES a las 11 PM<br>
-✅ Con 30-40 días de anticipación<br>
-✅ Para volar un MIÉRCOLES<br>
-✅ En temporada BAJA (Mar-May)<br>
-✅ Solo con carry-on<br>
-✅ Compara 3 aerolíneas<br><br>
-= <strong>¡AHORRO MÁXIMO POSIBLE: 40-50%!</strong> 💰🎉
-</div>
-</div>
-
-<div style="background: #fff3cd; padding: 15px; border-radius: 10px; border-left: 4px solid #ffc107; margin: 15px 0;">
-<strong>⚡ BONUS TIP:</strong><br>
-Si ves un buen precio, NO lo pienses mucho. Los algoritmos de aerolíneas detectan cuando muchas personas buscan la misma ruta y suben los precios en minutos. ¡Actúa rápido!
-</div>
-
-¿Quieres que analice tu predicción con estos consejos en mente? 😊""", False
-    
-    # ==================== RESPUESTA GENÉRICA ====================
+                comparacion = f"Diferencia: {diferencia_pct:+.1f}% vs promedio"
+                recomendacion_precio = "El precio está en el rango esperado. Es una opción razonable."
+    
+    consejo_dia = "Considera volar martes o miércoles si puedes"
+    if fecha_obj is None:
+        return {
+            'ruta': ruta, 'aerolinea': aerolinea, 'fecha': fecha, 'precio': precio,
+            'dia_viaje': "N/A", 'nivel_precio': nivel_precio, 'emoji_precio': emoji_precio,
+            'comparacion': comparacion, 'recomendacion_precio': recomendacion_precio,
+            'temporada': "N/A", 'emoji_temp': "❓", 'msg_temporada': "", 'color_temp': "#999",
+            'anticipacion_msg': "No disponible", 'anticipacion_color': "#999", 'anticipacion_consejo': "",
+            'dia_msg': "", 'consejo_dia': consejo_dia,
+        }
+    
+    mes_viaje = fecha_obj.month
+    dia_viaje = NOMBRES_DIAS[fecha_obj.weekday()]
+    
+    # Temporada
+    temporada_datos = temporadas(ruta).get(mes_viaje) if indice_precios is not None else None
+    if temporada_datos:
+        temporada, diferencia = temporada_datos
+        emoji_temp, color_temp = COLORES_TEMPORADA[temporada]
+        msg_temporada = f"En {NOMBRES_MESES[mes_viaje - 1].lower()} los vuelos {ruta} cuestan " \
+                        f"{diferencia * 100:+.0f}% frente a un mes típico."
+    elif mes_viaje in [12, 1, 2, 7, 8]:
+        temporada = "ALTA"
+        emoji_temp = "🏖️"
+        msg_temporada = "Estás viajando en temporada alta. Los precios suelen ser 30-50% más altos."
+        color_temp = "#ff4757"
+    elif mes_viaje in [6, 9, 10, 11]:
+        temporada = "MEDIA"
+        emoji_temp = "📊"
+        msg_temporada = "Temporada media. Los precios son moderados."
+        color_temp = "#ffa502"
     else:
-        return """👋 <strong>Hola, estoy aquí para ayudarte</strong><br><br>
-
-Puedo responder preguntas sobre:<br><br>
-
-<div style="display: grid; gap: 10px;">
-<div style="background: #f0f7ff; padding: 12px; border-radius: 8px; border-left: 4px solid #667eea;">
-📊 <strong>"Analiza mi predicción"</strong><br>
-<small>Te doy un análisis completo y personalizado</small>
-</div>
-
-<div style="background: #f0f7ff; padding: 12px; border-radius: 8px; border-left: 4px solid #ff6348;">
-🏖️ <strong>"¿Cuándo es temporada alta?"</strong><br>
-<small>Mejores fechas para viajar y ahorrar</small>
-</div>
-
-<div style="background: #f0f7ff; padding: 12px; border-radius: 8px; border-left: 4px solid #26de81;">
-⏰ <strong>"¿Cuál es el mejor momento?"</strong><br>
-<small>Estrategias para conseguir mejor precio</small>
-</div>
-
-<div style="background: #f0f7ff; padding: 12px; border-radius: 8px; border-left: 4px solid #ffa502;">
-✈️ <strong>"Compara aerolíneas"</strong><br>
-<small>LATAM vs Sky vs JetSmart</small>
-</div>
-
-<div style="background: #f0f7ff; padding: 12px; border-radius: 8px; border-left: 4px solid #764ba2;">
-💡 <strong>"Dame consejos"</strong><br>
-<small>Tips profesionales para ahorrar</small>
-</div>
-</div>
-
-<br>También puedo ayudarte con:<br>
-• Información sobre escalas<br>
-• Mejores días para viajar<br>
-• Preguntas específicas sobre tu viaje<br><br>
+        temporada = "BAJA"
+        emoji_temp = "✨"
+        msg_temporada = "¡Excelente elección! Temporada baja significa mejores precios."
+        color_temp = "#26de81"
+    
+    # Anticipación
+    dias_anticipacion = (fecha_obj - datetime.now()).days
+    
+    if dias_anticipacion < 0:
+        anticipacion_msg = "La fecha ya pasó"
+        anticipacion_color = "#999"
+        anticipacion_consejo = ""
+    elif dias_anticipacion < 15:
+        anticipacion_msg = f"Faltan {dias_anticipacion} días - ¡URGENTE!"
+        anticipacion_color = "#ff4757"
+        anticipacion_consejo = "🚨 ¡Compra HOY! Los precios suben mucho cerca de la fecha de viaje."
+    elif dias_anticipacion <= 45:
+        anticipacion_msg = f"Faltan {dias_anticipacion} días - MOMENTO ÓPTIMO"
+        anticipacion_color = "#26de81"
+        anticipacion_consejo = "✅ ¡Perfecto! Estás en la ventana ideal de compra (15-45 días antes)."
+    elif dias_anticipacion <= 60:
+        anticipacion_msg = f"Faltan {dias_anticipacion} días"
+        anticipacion_color = "#667eea"
+        anticipacion_consejo = "📅 Buen momento para empezar a monitorear ofertas."
+    else:
+        anticipacion_msg = f"Faltan {dias_anticipacion} días"
+        anticipacion_color = "#ffa502"
+        anticipacion_consejo = "⏰ Es muy pronto. Espera 2-3 semanas más para precios más estables."
+    
+    # Análisis del día de viaje
+    dia_barato = mes_barato = None
+    if indice_precios is not None:
+        dia_barato, mes_barato = dia_mas_barato(ruta), mes_mas_barato(ruta)
+    if dia_barato is not None and mes_barato is not None:
+        (dia_barato, mediana_barata), (mes_barato, _) = dia_barato, mes_barato
+        mediana_dia = _medianas_ruta(indice_precios.medianas_dia, ruta)[fecha_obj.weekday()]
+        nombre_barato = NOMBRES_DIAS[dia_barato]
+        if dia_barato == fecha_obj.weekday():
+            dia_msg = f"✅ ¡Excelente! {dia_viaje} es el día más barato para volar {ruta} " \
+                      f"(mediana S/ {mediana_barata:.2f})."
+        elif mediana_dia / mediana_barata - 1 >= 0.10:
+            dia_msg = f"⚠️ {dia_viaje} suele ser más caro (mediana S/ {mediana_dia:.2f}). Podrías ahorrar " \
+                      f"{(1 - mediana_barata / mediana_dia) * 100:.0f}% viajando el {nombre_barato.lower()}."
+        else:
+            dia_msg = f"💰 {dia_viaje} tiene precios moderados (mediana S/ {mediana_dia:.2f}). " \
+                      f"El más barato es el {nombre_barato.lower()}."
+        consejo_dia = f"Considera volar un {nombre_barato.lower()} de {NOMBRES_MESES[mes_barato - 1].lower()} " \
+                      f"si puedes: son el día y el mes más baratos en esta ruta"
+    elif dia_viaje in ['Martes', 'Miércoles']:
+        dia_msg = f"✅ ¡Excelente! {dia_viaje} es uno de los días más baratos para viajar."
+    elif dia_viaje in ['Viernes', 'Domingo']:
+        dia_msg = f"⚠️ {dia_viaje} suele ser más caro. Podrías ahorrar 20-30% viajando martes o miércoles."
+    else:
+        dia_msg = f"💰 {dia_viaje} tiene precios moderados."
+    
+    return {
+        'ruta': ruta,
+        'aerolinea': aerolinea,
+        'fecha': fecha,
+        'precio': precio,
+        'dia_viaje': dia_viaje,
+        'nivel_precio': nivel_precio,
+        'emoji_precio': emoji_precio,
+        'comparacion': comparacion,
+        'recomendacion_precio': recomendacion_precio,
+        'temporada': temporada,
+        'emoji_temp': emoji_temp,
+        'msg_temporada': msg_temporada,
+        'color_temp': color_temp,
+        'anticipacion_msg': anticipacion_msg,
+        'anticipacion_color': anticipacion_color,
+        'anticipacion_consejo': anticipacion_consejo,
+        'dia_msg': dia_msg,
+        'consejo_dia': consejo_dia,
+    }
+
+
+def datos_temporadas(ruta=None):
+    """Variables de la plantilla de temporadas calculadas desde el índice"""
+    # Rutas con pocos vuelos no tienen fila propia en el índice: se usan todas
+    fila = indice_precios.filas.get((('ruta',), (ruta,)))
+    if fila is None:
+        ruta, fila = None, indice_precios.filas[((), ())]
+    meses = {'ALTA': [], 'MEDIA': [], 'BAJA': []}
+    for mes, (nombre, diferencia) in temporadas(ruta).items():
+        meses[nombre].append((NOMBRES_MESES[mes - 1], diferencia))
+    mes_barato, dia_barato = mes_mas_barato(ruta), dia_mas_barato(ruta)
+    return {
+        'ruta': ruta,
+        'muestras': int(indice_precios.muestras[fila]),
+        'meses': meses,
+        'bloques': [
+            ('ALTA', '🔥 TEMPORADA ALTA', 'linear-gradient(135deg, #ff4757 0%, #ff6348 100%)'),
+            ('MEDIA', '📊 TEMPORADA MEDIA', 'linear-gradient(135deg, #ffa502 0%, #ffc048 100%)'),
+            ('BAJA', '✅ TEMPORADA BAJA', 'linear-gradient(135deg, #26de81 0%, #4ade80 100%)'),
+        ],
+        'mes_barato': NOMBRES_MESES[mes_barato[0] - 1] if mes_barato else None,
+        'dia_barato': NOMBRES_DIAS[dia_barato[0]].lower() if dia_barato else None,
+    }
+
+
+def elegir_respuesta_bot(mensaje, contexto, plantilla_anterior=None):
+    """Devuelve (plantilla, variables); variables es None cuando la respuesta es fija"""
+    intencion = detectar_intencion(mensaje)
+    if intencion == 'generico':
+        # Continuación de la conversación: seguir con el tema anterior
+        intencion = INTENCION_POR_PLANTILLA.get(plantilla_anterior, 'generico')
+    
+    ultima_pred = contexto.get('ultimaPrediccion') if contexto else None
+    stats = contexto.get('estadisticas') if contexto else None
+    
+    if intencion == 'temporada' and indice_precios is not None:
+        return 'temporada_datos', datos_temporadas(ultima_pred.get('ruta') if ultima_pred else None)
+    
+    if intencion == 'despedida':
+        # Agradecimiento o despedida normal: ambas cierran el chat
+        mensaje_lower = mensaje.lower()
+        if any(palabra in mensaje_lower for palabra in ['gracias', 'thank', 'excelente', 'perfecto', 'genial']):
+            return 'agradecimiento', None
+        return 'despedida', None
+    
+    if ultima_pred:
+        if intencion == 'saludo':
+            return 'saludo_prediccion', {'ruta': ultima_pred.get('ruta', ''),
+                                         'precio': ultima_pred.get('precio', 0)}
+        if intencion == 'ayuda_prediccion':
+            return 'ayuda_prediccion', {'ruta': ultima_pred.get('ruta', ''),
+                                        'aerolinea': ultima_pred.get('aerolinea', '')}
+        if intencion == 'analizar_prediccion':
+            return 'analisis', datos_analisis(ultima_pred, stats)
+    
+    return PLANTILLA_POR_INTENCION[intencion], None
 
-¿En qué te puedo ayudar hoy? 😊""", False    
 
 # ========== MANEJO DE ERRORES ==========
 @app.errorhandler(404)
@@ -1635,6 +3108,19 @@ def no_encontrado(error):
         </html>
         ''', 404
 
+@app.errorhandler(exc.TimeoutError)
+@app.errorhandler(HashSaturado)
+def servidor_ocupado(error):
+    """Pool de conexiones o de hashing saturado: 503 para que el cliente reintente"""
+    db.session.rollback()
+    if request.path.startswith('/api/'):
+        respuesta = jsonify({'error': 'Servidor ocupado, intenta de nuevo'})
+    else:
+        respuesta = render_template('error.html',
+                                    mensaje='Servidor ocupado',
+                                    detalle='Intenta de nuevo en unos segundos')
+    return respuesta, 503, {'Retry-After': '5'}
+
 @app.errorhandler(500)
 def error_interno(error):
     try:
@@ -1665,95 +3151,77 @@ def error_interno(error):
 #                         detalle='Ocurrió un error en el servidor'), 500
 
 # ========== INICIALIZACIÓN1 ==========
-#if __name__ == '__main__':
-#    with app.app_context():
-#        db.create_all()  # Crear tablas si no existen
-    
-#   print("🚀 Iniciando aplicación Flask...")
-    
-#    if cargar_modelo():
-#        print("✓ Modelo cargado exitosamente")
-#    else:
-#        print("⚠️  Modelo no encontrado")
-#    
-#    if cargar_datos_cache():
-#        print("✓ Datos cargados en caché")
-#    else:
-#        print("⚠️  Datos no encontrados")
-    
-    #app.run(debug=True, host='0.0.0.0', port=5000)
-    # CAMBIO AQUÍ ⬇️
-#    port = int(os.environ.get('PORT', 5000))
-#    debug = os.environ.get('FLASK_ENV') != 'production'
-#    app.run(debug=debug, host='0.0.0.0', port=port)
-# ========== INICIALIZACIÓN ==========
-#if __name__ == '__main__':
-#    with app.app_context():
-#        try:
-#            db.create_all()  # Crear tablas si no existen
-#            print("✓ Tablas de base de datos creadas/verificadas")
-#        except Exception as e:
-#            print(f"⚠️ Error creando tablas: {e}")
-#    
-#    print("🚀 Iniciando aplicación Flask...")
-#    
-#    if cargar_modelo():
-#        print("✓ Modelo cargado exitosamente")
-#    else:
-#        print("⚠️ Modelo no encontrado - Ejecuta training.py primero")
-#    
-#    if cargar_datos_cache():
-#        print("✓ Datos cargados en caché")
-#    else:
-#        print("⚠️ Datos no encontrados - Ejecuta generar_datos.py primero")
-#    
-#    # Configuración para producción
-#    port = int(os.environ.get('PORT', 5000))
-#    debug = os.environ.get('FLASK_ENV') != 'production'
-#    app.run(debug=debug, host='0.0.0.0', port=port) 
+## ========== INICIALIZACIÓN ==========
+# Nada pesado se ejecuta al importar el módulo. inicializar_app() carga el
+# esquema, los datos, el índice de precios, el modelo y las respuestas fijas
+# del bot una sola vez por proceso. Con gunicorn --preload corre en el master
+# antes del fork (ver gunicorn.conf.py) y los workers heredan esos objetos por
+# copy-on-write; el pool de la base se descarta para que cada worker abra el suyo.
+_app_inicializada = False
+_candado_inicializacion = threading.Lock()
+
+
+def inicializar_app():
+    """Prepara la app una sola vez por proceso y la devuelve"""
+    global _app_inicializada
+    if _app_inicializada:
+        return app
+    with _candado_inicializacion:
+        if _app_inicializada:
+            return app
+        
+        inicio = time.perf_counter()
+        print("🔧 Inicializando app...")
+        with app.app_context():
+            try:
+                inicializar_esquema()
+                print("✓ Base de datos inicializada")
+            except Exception as e:
+                print(f"⚠️ Error en base de datos: {e}")
+            # Sin conexiones abiertas: tras un fork se compartirían los sockets
+            for engine in db.engines.values():
+                engine.dispose()
+        
+        # Cargar datos primero (necesarios para el modelo)
+        if cargar_datos_cache():
+            print("✓ Datos disponibles")
+        else:
+            print("⚠️ No se pudieron cargar datos")
+        
+        # Luego cargar modelo
+        inicio_modelo = time.perf_counter()
+        if cargar_modelo():
+            CARGA_MODELO_SEGUNDOS.set(time.perf_counter() - inicio_modelo)
+            print("✓ Modelo disponible")
+        else:
+            print("⚠️ Modelo no disponible")
+        
+        precargar_respuestas_bot()
+        precargar_estaticos()
+        _app_inicializada = True
+        print(f"✅ App lista para recibir peticiones ({time.perf_counter() - inicio:.1f} s)")
+    return app
+
+
+def crear_app():
+    """Punto de entrada para gunicorn: gunicorn 'app:crear_app()'"""
+    return inicializar_app()
+
+
+@app.before_request
+def inicializar_si_falta():
+    # Servidores que importan `app:app` directamente (flask run, tests)
+    if not _app_inicializada:
+        inicializar_app()
+
 
-# ========== INICIALIZACIÓN ==========
 if __name__ == '__main__':
-    with app.app_context():
-        try:
-            db.create_all()
-            print("✓ Tablas de base de datos creadas/verificadas")
-        except Exception as e:
-            print(f"⚠️ Error creando tablas: {e}")
-    
     print("🚀 Iniciando aplicación Flask...")
     
-    # Cargar datos primero (necesarios para el modelo)
-    if cargar_datos_cache():
-        print("✓ Datos disponibles")
-    else:
-        print("⚠️ No se pudieron cargar datos")
-    
-    # Luego cargar modelo
-    if cargar_modelo():
-        print("✓ Modelo disponible")
-    else:
-        print("⚠️ Modelo no disponible")
-    
     # Configuración para producción
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') != 'production'
+    # Con debug, el proceso que vigila los archivos no atiende peticiones: solo se inicializa el hijo
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        inicializar_app()
     app.run(debug=debug, host='0.0.0.0', port=port)
-
-# ========== INICIALIZACIÓN PARA GUNICORN ==========
-# Esto se ejecuta cuando gunicorn carga la app
-print("🔧 Inicializando app para Gunicorn...")
-
-# Crear tablas
-with app.app_context():
-    try:
-        db.create_all()
-        print("✓ Base de datos inicializada")
-    except Exception as e:
-        print(f"⚠️ Error en base de datos: {e}")
-
-# Cargar datos y modelo al inicio
-print("📊 Cargando recursos...")
-cargar_datos_cache()
-cargar_modelo()
-print("✅ App lista para recibir peticiones")
\ No newline at end of file
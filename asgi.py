@@ -0,0 +1,289 @@
+"""
+Modo asíncrono opcional (ASGI) para los endpoints de entrada/salida.
+
+    pip install -r requirements-async.txt
+    uvicorn asgi:aplicacion --host 0.0.0.0 --port $PORT --workers 2
+
+Historial, perfil, exportaciones CSV/NDJSON y chat bot se atienden en el
+event loop con SQLAlchemy asíncrono (asyncpg en Postgres, aiosqlite en
+SQLite): una consulta lenta o una descarga larga no ocupa un hilo. El resto
+de la app Flask (páginas, login, predicción, PDF/Excel, trabajos de
+exportación) se monta tal cual con WSGIMiddleware, que la ejecuta en un pool
+de hilos: ahí corre también la inferencia del modelo, fuera del event loop.
+Rutas, cookie de sesión y JSON son los mismos que en el modo síncrono.
+
+Las réplicas de lectura (DATABASE_REPLICA_URLS) solo las usa la parte Flask;
+las rutas asíncronas leen del primario. Su latencia va al mismo histograma de
+Prometheus que las rutas Flask, con la misma ruta como etiqueta.
+"""
+import asyncio
+import contextlib
+import os
+import time
+import zlib
+from datetime import datetime
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import RedirectResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as flask_app
+from app import (app, Usuario, UsuarioEstadisticas, PerfilUsuario, LIMITE_MAXIMO_PAGINA,
+                 TAMANO_LOTE_CRUDO, TAMANO_BLOQUE_COPY, COLUMNAS_CRUDAS)
+
+# Hilos para la parte Flask (incluye la inferencia del modelo)
+ASGI_HILOS_WSGI = int(os.environ.get('ASGI_HILOS_WSGI', 8))
+
+# ========== BASE DE DATOS ASÍNCRONA ==========
+def url_asincrona(url):
+    """Misma base que la app, con el driver asíncrono equivalente"""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        return url.set(drivername='sqlite+aiosqlite'), {}
+    # asyncpg no entiende sslmode: se traduce a su parámetro ssl
+    sslmode = url.query.get('sslmode')
+    conexion = {'ssl': sslmode} if sslmode and sslmode not in ('disable', 'allow', 'prefer') else {}
+    return url.set(drivername='postgresql+asyncpg').difference_update_query(['sslmode']), conexion
+
+
+def crear_motor():
+    url, argumentos_conexion = url_asincrona(app.config['SQLALCHEMY_DATABASE_URI'])
+    opciones = {'pool_pre_ping': True, 'connect_args': argumentos_conexion}
+    if url.get_backend_name() != 'sqlite':
+        opciones.update(pool_size=flask_app.DB_POOL_SIZE, max_overflow=flask_app.DB_MAX_OVERFLOW,
+                        pool_timeout=flask_app.DB_POOL_TIMEOUT, pool_recycle=flask_app.DB_POOL_RECYCLE)
+    return create_async_engine(url, **opciones)
+
+
+motor = crear_motor()
+SesionAsincrona = async_sessionmaker(motor, expire_on_commit=False)
+
+# ========== SESIÓN DE FLASK ==========
+_serializador_sesion = app.session_interface.get_signing_serializer(app)
+
+
+def leer_sesion(peticion):
+    """Decodifica la cookie firmada de Flask (la misma que valida la parte síncrona)"""
+    cookie = peticion.cookies.get(app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return {}
+    try:
+        return _serializador_sesion.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+def login_requerido(vista):
+    async def decorada(peticion):
+        sesion = leer_sesion(peticion)
+        if 'usuario_id' not in sesion:
+            return RedirectResponse('/login', status_code=302)
+        return await vista(peticion, sesion)
+    return decorada
+
+
+def ruta_medida(ruta, vista, metodos):
+    """Route que observa la latencia hasta tener la respuesta, como el middleware de la app Flask"""
+    async def medida(peticion):
+        inicio = time.perf_counter()
+        estado = '500'
+        try:
+            respuesta = await vista(peticion)
+            estado = str(respuesta.status_code)
+            return respuesta
+        finally:
+            flask_app.observar_peticion((ruta, peticion.method, estado), time.perf_counter() - inicio)
+    return Route(ruta, medida, methods=metodos)
+
+
+def respuesta_json(datos, estado=200, cabeceras=None):
+    """Mismo cuerpo que jsonify() en la app Flask"""
+    return Response(app.json.response(datos).get_data(), estado, cabeceras, media_type='application/json')
+
+# ========== HISTORIAL Y PERFIL ==========
+@login_requerido
+async def historial_json(peticion, sesion):
+    try:
+        limite = int(peticion.query_params.get('limite', 10))
+    except ValueError:
+        limite = 10
+    limite = max(min(limite, LIMITE_MAXIMO_PAGINA), 1)
+    try:
+        consulta = flask_app.consulta_pagina(sesion['usuario_id'], peticion.query_params.get('cursor'), limite)
+    except ValueError as e:
+        return respuesta_json({'error': str(e)}, 400)
+
+    async with SesionAsincrona() as s:
+        predicciones = (await s.scalars(consulta)).all()
+    predicciones, siguiente_cursor = flask_app.partir_pagina(predicciones, limite)
+    cabeceras = {'X-Siguiente-Cursor': siguiente_cursor} if siguiente_cursor else None
+    return respuesta_json([flask_app.prediccion_json(p) for p in predicciones], cabeceras=cabeceras)
+
+
+@login_requerido
+async def perfil(peticion, sesion):
+    usuario_id = sesion['usuario_id']
+    version = sesion.get('version_perfil')
+    async with SesionAsincrona() as s:
+        datos = flask_app.perfil_en_cache(usuario_id, version)
+        if datos is None:
+            usuario = await s.get(Usuario, usuario_id)
+            datos = PerfilUsuario(usuario.id, usuario.usuario, usuario.email, usuario.fecha_creacion)
+            flask_app.guardar_perfil_en_cache(usuario_id, version, datos)
+        estadisticas = await s.get(UsuarioEstadisticas, usuario_id)
+
+    return respuesta_json({
+        'usuario': datos.usuario,
+        'email': datos.email,
+        'fecha_creacion': datos.fecha_creacion.strftime('%Y-%m-%d'),
+        'total_predicciones': estadisticas.total if estadisticas else 0
+    })
+
+# ========== CHAT BOT ==========
+@login_requerido
+async def chat_bot(peticion, sesion):
+    try:
+        data = await peticion.json()
+        mensaje_usuario = data.get('mensaje', '')
+
+        if not mensaje_usuario:
+            return respuesta_json({'exito': False, 'error': 'Mensaje vacío'}, 400)
+
+        usuario_id = sesion['usuario_id']
+        async with SesionAsincrona() as s:
+            ultima = (await s.scalars(flask_app.consulta_pagina(usuario_id, limite=1))).first()
+        cuerpo = flask_app.cuerpo_respuesta_chat(usuario_id, mensaje_usuario, flask_app.armar_contexto_chat(ultima))
+        return Response(cuerpo, media_type='application/json')
+
+    except Exception as e:
+        print(f"Error en chat_bot: {str(e)}")
+        return respuesta_json({'exito': False, 'error': 'Error procesando mensaje'}, 500)
+
+# ========== EXPORTACIÓN DE FILAS EN CRUDO ==========
+async def lotes_crudos(consulta):
+    async with motor.connect() as conexion:
+        resultado = await conexion.stream(consulta)
+        async for filas in resultado.partitions(TAMANO_LOTE_CRUDO):
+            yield filas
+
+
+async def copiar_postgres(consulta, **opciones):
+    """COPY ... TO STDOUT con asyncpg; las partes llegan por una cola acotada"""
+    sql = str(consulta.compile(dialect=motor.dialect, compile_kwargs={'literal_binds': True}))
+    cola = asyncio.Queue(maxsize=8)
+    pendiente = []
+
+    async def escribir(datos):
+        pendiente.append(datos)
+        if sum(map(len, pendiente)) >= TAMANO_BLOQUE_COPY:
+            await cola.put(b''.join(pendiente))
+            pendiente.clear()
+
+    async def copiar():
+        try:
+            async with motor.connect() as conexion:
+                crudo = await conexion.get_raw_connection()
+                await crudo.driver_connection.copy_from_query(sql, output=escribir, **opciones)
+            if pendiente:
+                await cola.put(b''.join(pendiente))
+            await cola.put(None)
+        except Exception as e:
+            await cola.put(e)
+
+    tarea = asyncio.create_task(copiar())
+    try:
+        while True:
+            parte = await cola.get()
+            if parte is None:
+                return
+            if isinstance(parte, Exception):
+                raise parte
+            yield parte
+    finally:
+        # Si el cliente corta la descarga, cancelar el COPY y liberar la conexión
+        tarea.cancel()
+
+
+async def generar_csv_crudo(usuario_id, desde, cursor):
+    consulta = flask_app.consulta_cruda(usuario_id, flask_app.columnas_csv_crudas(), desde, cursor)
+    if motor.dialect.name == 'postgresql':
+        async for parte in copiar_postgres(consulta, format='csv', header=True):
+            yield parte
+        return
+
+    buffer = flask_app.io.StringIO()
+    escritor = flask_app.csv.writer(buffer)
+    escritor.writerow([c.name for c in COLUMNAS_CRUDAS])
+    async for filas in lotes_crudos(consulta):
+        escritor.writerows(filas)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+async def generar_ndjson_crudo(usuario_id, desde, cursor):
+    objeto = flask_app.objeto_json_crudo(motor.dialect.name)
+    consulta = flask_app.consulta_cruda(usuario_id, [objeto], desde, cursor)
+    if motor.dialect.name == 'postgresql':
+        async for parte in copiar_postgres(consulta, format='csv', quote='\x01', delimiter='\x02'):
+            yield parte
+        return
+
+    async for filas in lotes_crudos(consulta):
+        yield ('\n'.join(f[0] for f in filas) + '\n').encode('utf-8')
+
+
+async def comprimir_gzip(partes, nivel=5):
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31 = cabecera gzip
+    async for parte in partes:
+        comprimido = compresor.compress(parte)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+def exportacion_cruda(generador, mimetype, extension):
+    @login_requerido
+    async def vista(peticion, sesion):
+        try:
+            desde, cursor = flask_app.parametros_incrementales(peticion.query_params)
+        except ValueError:
+            return respuesta_json({'error': 'Parámetros since/cursor inválidos'}, 400)
+
+        partes = generador(sesion['usuario_id'], desde, cursor)
+        cabeceras = flask_app.cabeceras_descarga(
+            f"historial_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}")
+        if 'gzip' in peticion.headers.get('Accept-Encoding', ''):
+            partes = comprimir_gzip(partes)
+            cabeceras['Content-Encoding'] = 'gzip'
+        return StreamingResponse(partes, media_type=mimetype, headers=cabeceras)
+    return vista
+
+# ========== APLICACIÓN ==========
+@contextlib.asynccontextmanager
+async def ciclo_de_vida(_):
+    # Carga de datos y modelo fuera del event loop
+    await asyncio.to_thread(flask_app.inicializar_app)
+    yield
+    await motor.dispose()
+
+
+aplicacion = Starlette(
+    routes=[
+        ruta_medida('/api/historial-json', historial_json, ['GET']),
+        ruta_medida('/api/perfil', perfil, ['GET']),
+        ruta_medida('/api/chat-bot', chat_bot, ['POST']),
+        ruta_medida('/api/historial/exportar-csv', exportacion_cruda(generar_csv_crudo, 'text/csv', 'csv'),
+                    ['GET']),
+        ruta_medida('/api/historial/exportar-ndjson',
+                    exportacion_cruda(generar_ndjson_crudo, 'application/x-ndjson', 'ndjson'), ['GET']),
+        Mount('/', app=WSGIMiddleware(app, workers=ASGI_HILOS_WSGI)),
+    ],
+    lifespan=ciclo_de_vida,
+)
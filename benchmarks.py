@@ -0,0 +1,825 @@
+"""
+Benchmarks de rendimiento de la app.
+
+Cada benchmark usa una base SQLite temporal (salvo que DATABASE_URL esté
+definida) y compara la implementación actual con la anterior.
+
+Uso:
+    python benchmarks.py dashboard --predicciones 100000
+    python benchmarks.py excel --predicciones 100000
+    python benchmarks.py pdf --filas 1000 10000 100000
+    python benchmarks.py intenciones --mensajes 20000
+    python benchmarks.py bot --repeticiones 2000
+    python benchmarks.py chat --turnos 20 --predicciones 1000
+    python benchmarks.py indice --consultas 5000
+    python benchmarks.py arranque --workers 2
+    python benchmarks.py asincrono --lentos 8 --predicciones 50000
+    python benchmarks.py compresion --visitas 5
+    python benchmarks.py metricas --repeticiones 100000
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+# ========== UTILIDADES ==========
+def preparar_app():
+    """Importa la app apuntando a una base SQLite temporal y la inicializa"""
+    if not os.environ.get('DATABASE_URL'):
+        directorio = tempfile.mkdtemp(prefix='bench_')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directorio, 'bench.db')}"
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as modulo_app
+        modulo_app.inicializar_app()
+    return modulo_app
+
+
+def crear_usuario(modulo_app, nombre):
+    usuario = modulo_app.Usuario(usuario=nombre, email=f"{nombre}@bench.local")
+    usuario.set_password('bench123')
+    modulo_app.db.session.add(usuario)
+    modulo_app.db.session.commit()
+    return usuario.id
+
+
+def poblar_predicciones(modulo_app, usuario_id, cantidad, lote=50_000, semilla=42):
+    """Inserta `cantidad` predicciones sintéticas con inserciones masivas (sin ORM)"""
+    from generar_datos import AEROLINEAS, RUTAS_POSIBLES
+
+    rng = np.random.default_rng(semilla)
+    tabla = modulo_app.Prediccion.__table__
+    inicio = datetime.now() - timedelta(days=365)
+    for desde in range(0, cantidad, lote):
+        n = min(lote, cantidad - desde)
+        rutas = rng.integers(0, len(RUTAS_POSIBLES), n)
+        filas = [{
+            'usuario_id': usuario_id,
+            'aerolinea': AEROLINEAS[int(a)],
+            'origen': RUTAS_POSIBLES[r][0],
+            'destino': RUTAS_POSIBLES[r][1],
+            'fecha_viaje': date(2025, 1, 1) + timedelta(days=int(d)),
+            'hora_salida': '08:00',
+            'duracion': 1.2,
+            'escalas': int(e),
+            'informacion': 'Incluye equipaje',
+            'precio_predicho': float(p),
+            'fecha_prediccion': inicio + timedelta(seconds=desde + i)
+        } for i, (r, a, d, e, p) in enumerate(zip(
+            rutas, rng.integers(0, len(AEROLINEAS), n), rng.integers(0, 365, n),
+            rng.random(n) < 0.05, rng.normal(300, 80, n).round(2)))]
+        modulo_app.db.session.execute(tabla.insert(), filas)
+    modulo_app.db.session.commit()
+
+
+def medir(funcion, repeticiones=5):
+    """Mediana del tiempo (s) y pico de memoria asignada (bytes) de `funcion`"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(tiempos)), pico
+
+
+def imprimir_fila(nombre, segundos, pico):
+    print(f"  {nombre:<28} {segundos * 1000:>10.1f} ms {pico / 1024 / 1024:>10.1f} MB")
+
+
+# ========== DASHBOARD ==========
+def dashboard_legado(modulo_app, usuario_id):
+    """Implementación anterior: carga todo el historial en objetos ORM"""
+    predicciones = modulo_app.Prediccion.query.filter_by(usuario_id=usuario_id).all()
+    precios = [p.precio_predicho for p in predicciones]
+    rutas = {}
+    for p in predicciones:
+        ruta = f"{p.origen}-{p.destino}"
+        rutas[ruta] = rutas.get(ruta, 0) + 1
+    return {
+        'total': len(predicciones),
+        'promedio': np.mean(precios),
+        'minimo': min(precios),
+        'maximo': max(precios),
+        'rutas_top': dict(sorted(rutas.items(), key=lambda x: x[1], reverse=True)[:5])
+    }
+
+
+def dashboard_sql(modulo_app, usuario_id, top_rutas=5):
+    """Implementación intermedia: agregados en una sola consulta SQL con funciones de ventana"""
+    db, Prediccion = modulo_app.db, modulo_app.Prediccion
+    conteo = db.func.count(Prediccion.id)
+    precio = Prediccion.precio_predicho
+    consulta = db.select(
+        Prediccion.origen,
+        Prediccion.destino,
+        conteo.label('n'),
+        db.func.sum(conteo).over().label('total'),
+        db.func.sum(db.func.sum(precio)).over().label('suma'),
+        db.func.min(db.func.min(precio)).over().label('minimo'),
+        db.func.max(db.func.max(precio)).over().label('maximo')
+    ).where(Prediccion.usuario_id == usuario_id)\
+     .group_by(Prediccion.origen, Prediccion.destino)\
+     .order_by(conteo.desc(), Prediccion.origen, Prediccion.destino)\
+     .limit(top_rutas)
+
+    filas = db.session.execute(consulta).all()
+    total = int(filas[0].total)
+    return {
+        'total': total,
+        'promedio': float(filas[0].suma) / total,
+        'minimo': float(filas[0].minimo),
+        'maximo': float(filas[0].maximo),
+        'rutas_top': {f"{f.origen}-{f.destino}": f.n for f in filas}
+    }
+
+
+def benchmark_dashboard(predicciones):
+    modulo_app = preparar_app()
+    with modulo_app.app.app_context():
+        usuario_id = crear_usuario(modulo_app, f"bench_dashboard_{predicciones}")
+        print(f"📥 Insertando {predicciones:,} predicciones...")
+        poblar_predicciones(modulo_app, usuario_id, predicciones)
+        # Las inserciones masivas no pasan por registrar_prediccion
+        modulo_app.reconstruir_estadisticas()
+
+        def legado():
+            resultado = dashboard_legado(modulo_app, usuario_id)
+            modulo_app.db.session.expunge_all()
+            return resultado
+
+        def sql():
+            return dashboard_sql(modulo_app, usuario_id)
+
+        def actual():
+            estadisticas = modulo_app.obtener_estadisticas(usuario_id)
+            resultado = {
+                'total': estadisticas.total,
+                'promedio': estadisticas.precio_promedio,
+                'minimo': estadisticas.precio_min,
+                'maximo': estadisticas.precio_max,
+                'rutas_top': estadisticas.rutas_top()
+            }
+            modulo_app.db.session.expunge_all()
+            return resultado
+
+        a = legado()
+        for b in (sql(), actual()):
+            assert a['total'] == b['total'] and abs(a['promedio'] - b['promedio']) < 1e-6
+            assert (a['minimo'], a['maximo']) == (b['minimo'], b['maximo'])
+            assert sorted(a['rutas_top'].values()) == sorted(b['rutas_top'].values())
+
+        print(f"\n📊 Dashboard con {predicciones:,} predicciones")
+        print(f"  {'Implementación':<28} {'Tiempo':>13} {'Memoria pico':>13}")
+        imprimir_fila('ORM .all() + Python', *medir(legado, 3))
+        imprimir_fila('Agregados SQL', *medir(sql))
+        imprimir_fila('usuario_estadisticas', *medir(actual))
+    return True
+
+
+# ========== EXPORTACIÓN A EXCEL ==========
+def excel_legado(modulo_app, usuario_id, destino):
+    """Implementación anterior: .all() + workbook normal con estilos celda a celda"""
+    import openpyxl
+    from openpyxl.styles import Alignment, Border, Side
+
+    predicciones = modulo_app.Prediccion.query.filter_by(usuario_id=usuario_id)\
+        .order_by(modulo_app.Prediccion.fecha_prediccion.desc()).all()
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                    top=Side(style='thin'), bottom=Side(style='thin'))
+    ws.append(['#', 'Fecha Viaje', 'Aerolínea', 'Origen', 'Destino', 'Duración (h)', 'Escalas', 'Precio (S/)'])
+    for idx, pred in enumerate(predicciones, 1):
+        ws.append([idx, pred.fecha_viaje.strftime('%Y-%m-%d'), pred.aerolinea, pred.origen,
+                   pred.destino, pred.duracion, pred.escalas, pred.precio_predicho])
+        for cell in ws[ws.max_row]:
+            cell.border = border
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+    precios = [p.precio_predicho for p in predicciones]
+    ws.append(['Precio Promedio:', np.mean(precios)])
+    wb.save(destino)
+    modulo_app.db.session.expunge_all()
+
+
+def benchmark_excel(predicciones, omitir_legado=False):
+    modulo_app = preparar_app()
+    with modulo_app.app.app_context():
+        usuario_id = crear_usuario(modulo_app, f"bench_excel_{predicciones}")
+        print(f"📥 Insertando {predicciones:,} predicciones...")
+        poblar_predicciones(modulo_app, usuario_id, predicciones)
+
+        def legado():
+            excel_legado(modulo_app, usuario_id, io.BytesIO())
+
+        def actual():
+            with tempfile.TemporaryFile() as archivo:
+                modulo_app.escribir_excel_historial(usuario_id, 'bench', predicciones, archivo)
+
+        print(f"\n📊 Exportación Excel con {predicciones:,} predicciones")
+        print(f"  {'Implementación':<28} {'Tiempo':>13} {'Memoria pico':>13}")
+        if not omitir_legado:
+            imprimir_fila('Workbook normal + .all()', *medir(legado, 1))
+        imprimir_fila('Write-only + yield_per', *medir(actual, 1))
+    return True
+
+
+# ========== EXPORTACIÓN A PDF ==========
+def pdf_legado(modulo_app, usuario_id, destino):
+    """Implementación anterior: .all() y una única Table con todo el historial"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+
+    predicciones = modulo_app.Prediccion.query.filter_by(usuario_id=usuario_id)\
+        .order_by(modulo_app.Prediccion.fecha_prediccion.desc()).all()
+    data = [['#', 'Fecha', 'Aerolínea', 'Ruta', 'Duración', 'Escalas', 'Precio']]
+    for idx, pred in enumerate(predicciones, 1):
+        data.append([str(idx), pred.fecha_viaje.strftime('%Y-%m-%d'), pred.aerolinea[:15],
+                     f"{pred.origen}-{pred.destino}", f"{pred.duracion}h", str(pred.escalas),
+                     f"S/ {pred.precio_predicho:.2f}"])
+    table = Table(data)
+    table.setStyle(TableStyle([
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F7F7F7')]),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ]))
+    SimpleDocTemplate(destino, pagesize=letter).build([table])
+    modulo_app.db.session.expunge_all()
+
+
+def benchmark_pdf(tamanos, max_legado):
+    modulo_app = preparar_app()
+    with modulo_app.app.app_context():
+        print(f"\n📊 Exportación PDF")
+        print(f"  {'Filas / implementación':<28} {'Tiempo':>13} {'Memoria pico':>13}")
+        for filas in tamanos:
+            usuario_id = crear_usuario(modulo_app, f"bench_pdf_{filas}")
+            poblar_predicciones(modulo_app, usuario_id, filas)
+
+            def legado():
+                pdf_legado(modulo_app, usuario_id, io.BytesIO())
+
+            def actual():
+                with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as archivo:
+                    modulo_app.escribir_pdf_historial(usuario_id, 'bench', filas, archivo)
+
+            if filas <= max_legado:
+                imprimir_fila(f"{filas:,} · Table única", *medir(legado, 1))
+            imprimir_fila(f"{filas:,} · tablas por página", *medir(actual, 1))
+    return True
+
+
+# ========== INTENCIONES DEL CHATBOT ==========
+def benchmark_intenciones(cantidad):
+    """Velocidad frente a la versión anterior; la paridad se prueba en test_predictor.py"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import detectar_intencion, normalizar_texto
+    from test_predictor import corpus_intenciones, detectar_intencion_legado
+
+    mensajes = corpus_intenciones(cantidad)
+    # Paridad: mismo resultado que la versión anterior sobre el texto sin tildes
+    # (la anterior no trataba 'buenos días' como 'buenos dias'; ese es el cambio buscado)
+    diferencias = [m for m in mensajes if detectar_intencion(m) != detectar_intencion_legado(normalizar_texto(m))]
+    sin_tildes = [m for m in mensajes if m == normalizar_texto(m)]
+    diferencias += [m for m in sin_tildes if detectar_intencion(m) != detectar_intencion_legado(m)]
+    print(f"🔍 Paridad sobre {len(mensajes):,} mensajes: {len(diferencias)} diferencias")
+    for m in diferencias[:10]:
+        print(f"   {m!r}: {detectar_intencion(m)} vs {detectar_intencion_legado(normalizar_texto(m))}")
+
+    print(f"\n📊 Detección de intención ({len(mensajes):,} mensajes)")
+    print(f"  {'Implementación':<28} {'Tiempo':>13} {'µs/mensaje':>13}")
+    for nombre, funcion in (('any(... in ...) encadenados', detectar_intencion_legado),
+                            ('Patrón compilado', detectar_intencion)):
+        segundos, _ = medir(lambda: [funcion(m) for m in mensajes], 5)
+        print(f"  {nombre:<28} {segundos * 1000:>10.1f} ms {segundos / len(mensajes) * 1e6:>13.2f}")
+    return not diferencias
+
+
+# ========== RESPUESTAS DEL CHAT BOT ==========
+def casos_bot():
+    """Un mensaje de ejemplo por plantilla, con o sin predicción en el contexto"""
+    prediccion = {'ultimaPrediccion': {'ruta': 'LIM → CUZ', 'precio': 321.45, 'aerolinea': 'LATAM Perú',
+                                       'fecha': (date.today() + timedelta(days=30)).isoformat()},
+                  'estadisticas': {'precio_promedio': 350.0}}
+    return [
+        ('saludo', 'hola', None),
+        ('agradecimiento', 'muchas gracias', None),
+        ('despedida', 'adiós', None),
+        ('ayuda_sin_prediccion', 'necesito ayuda con el precio', None),
+        ('sin_prediccion', 'analiza mi vuelo', None),
+        ('temporada_datos', '¿es temporada alta?', None),
+        ('comparar_aerolineas', 'compara aerolíneas', None),
+        ('cuando_comprar', '¿cuándo compro?', None),
+        ('escalas', 'vuelos con escalas', None),
+        ('dias_semana', 'mejor día', None),
+        ('consejos', 'dame consejos', None),
+        ('generico', 'cusco', None),
+        ('saludo_prediccion', 'hola', prediccion),
+        ('ayuda_prediccion', 'necesito ayuda con el precio', prediccion),
+        ('analisis', 'analiza mi vuelo', prediccion),
+    ]
+
+
+def benchmark_bot(repeticiones):
+    modulo_app = preparar_app()
+    app = modulo_app.app
+
+    print(f"📊 Respuesta del chat bot por plantilla ({repeticiones:,} repeticiones, µs por mensaje)")
+    print(f"  {'Plantilla':<22} {'Render + JSON':>14} {'Actual':>10} {'Bytes':>8}")
+    ok = True
+    for plantilla, mensaje, contexto in casos_bot():
+        elegida, variables = modulo_app.elegir_respuesta_bot(mensaje, contexto)
+        ok &= elegida == plantilla
+        estatica = variables is None
+        variables = variables or {}
+
+        def sin_cache():
+            # Lo que costaría cada petición renderizando la plantilla y serializando
+            html = modulo_app.renderizar_respuesta_bot(plantilla, variables)
+            return app.json.response({'exito': True, 'respuesta': html, 'cerrar_chat': False}).get_data()
+
+        def actual():
+            elegida, variables = modulo_app.elegir_respuesta_bot(mensaje, contexto)
+            if variables is None:
+                return modulo_app.respuesta_estatica_bot(elegida)
+            return sin_cache()
+
+        segundos_render, _ = medir(lambda: [sin_cache() for _ in range(repeticiones)], 3)
+        segundos_actual, _ = medir(lambda: [actual() for _ in range(repeticiones)], 3)
+        marca = '' if estatica else ' *'
+        print(f"  {plantilla + marca:<22} {segundos_render / repeticiones * 1e6:>14.1f} "
+              f"{segundos_actual / repeticiones * 1e6:>10.1f} {len(actual()):>8,}")
+    print("  (* personalizada: se renderiza en cada petición)")
+    if not ok:
+        print("❌ Algún mensaje de ejemplo no eligió la plantilla esperada")
+    return ok
+
+
+def benchmark_chat(turnos, predicciones):
+    """Payload y latencia por mensaje: contexto enviado por el cliente vs resuelto en el servidor"""
+    modulo_app = preparar_app()
+    with modulo_app.app.app_context():
+        usuario_id = crear_usuario(modulo_app, 'bench_chat')
+        poblar_predicciones(modulo_app, usuario_id, predicciones)
+
+    cliente = modulo_app.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['usuario_id'] = usuario_id
+        sesion['usuario'] = 'bench_chat'
+    mensajes = ['hola', 'analiza mi predicción', '¿es temporada alta?', 'compara aerolíneas',
+                'dame consejos', 'mejor día para viajar', 'vuelos con escalas', '¿cuándo compro?']
+
+    def conversacion_legada():
+        # Flujo anterior del frontend: 2 GET de contexto + POST con contexto e historial
+        enviados = recibidos = 0
+        conversacion = []
+        for i in range(turnos):
+            mensaje = mensajes[i % len(mensajes)]
+            historial = cliente.get('/api/historial-json')
+            stats = cliente.get('/api/estadisticas')
+            lista = historial.get_json()
+            conversacion.append({'role': 'user', 'content': mensaje})
+            cuerpo = json.dumps({
+                'mensaje': mensaje,
+                'contexto': {'ultimaPrediccion': lista[0] if lista else None, 'totalPredicciones': len(lista),
+                             'estadisticas': stats.get_json(), 'historialReciente': lista[:5]},
+                'conversacion': conversacion[-6:]
+            })
+            respuesta = cliente.post('/api/chat-bot', data=cuerpo, content_type='application/json')
+            conversacion.append({'role': 'assistant', 'content': respuesta.get_json()['respuesta']})
+            enviados += len(cuerpo.encode('utf-8'))
+            recibidos += len(historial.data) + len(stats.data) + len(respuesta.data)
+        return enviados, recibidos
+
+    def conversacion_actual():
+        enviados = recibidos = 0
+        for i in range(turnos):
+            cuerpo = json.dumps({'mensaje': mensajes[i % len(mensajes)]})
+            respuesta = cliente.post('/api/chat-bot', data=cuerpo, content_type='application/json')
+            enviados += len(cuerpo.encode('utf-8'))
+            recibidos += len(respuesta.data)
+        return enviados, recibidos
+
+    print(f"📊 Conversación de {turnos} mensajes ({predicciones:,} predicciones en el historial)")
+    print(f"  {'Flujo':<30} {'Peticiones':>10} {'Enviado/msg':>12} {'Recibido/msg':>13} {'ms/msg':>8}")
+    for nombre, funcion, peticiones in (('Contexto desde el cliente', conversacion_legada, 3),
+                                        ('Estado en el servidor', conversacion_actual, 1)):
+        enviados, recibidos = funcion()
+        segundos, _ = medir(funcion, 3)
+        print(f"  {nombre:<30} {peticiones:>10} {enviados / turnos:>10,.0f} B {recibidos / turnos:>11,.0f} B "
+              f"{segundos / turnos * 1000:>8.2f}")
+    return True
+
+
+# ========== ÍNDICE DE PRECIOS ==========
+def benchmark_indice(consultas):
+    """Ubicar un precio en su percentil: índice precalculado vs filtrar el DataFrame"""
+    modulo_app = preparar_app()
+    datos = modulo_app.datos_cache
+    if datos is None:
+        print("❌ datos_vuelos.xlsx no disponible")
+        return False
+
+    inicio = time.perf_counter()
+    indice = modulo_app.construir_indice_precios(datos)
+    construccion = time.perf_counter() - inicio
+    print(f"📊 Índice de precios sobre {len(datos):,} vuelos: {len(indice.filas)} grupos, "
+          f"{indice.percentiles.nbytes / 1024:.1f} KB, construido en {construccion * 1000:.0f} ms")
+
+    rng = np.random.default_rng(3)
+    muestra = datos.iloc[rng.integers(0, len(datos), consultas)]
+    casos = [(f"{o}-{d}", a, datetime.strptime(str(f)[:10], '%Y-%m-%d'), float(p))
+             for o, d, a, f, p in zip(muestra['Origen'], muestra['Destino'], muestra['Aerolínea'],
+                                      muestra['Fecha_del_viaje'], muestra['Precio (S/)'])]
+    fechas = pd.to_datetime(datos['Fecha_del_viaje'])
+
+    def escaneo(ruta, aerolinea, fecha, precio):
+        # Lo que costaría sin índice: filtrar por ruta y mes en cada mensaje
+        precios = datos.loc[((datos['Origen'] + '-' + datos['Destino']) == ruta) &
+                            (fechas.dt.month == fecha.month), 'Precio (S/)']
+        return (precios < precio).mean() * 100
+
+    print(f"  {'Implementación':<28} {'µs/consulta':>12}")
+    for nombre, funcion, n in (('Filtrar el DataFrame', escaneo, min(consultas, 200)),
+                               ('Índice precalculado', modulo_app.percentil_precio, consultas)):
+        segundos, _ = medir(lambda: [funcion(*caso) for caso in casos[:n]], 3)
+        print(f"  {nombre:<28} {segundos / n * 1e6:>12.1f}")
+    return True
+
+
+# ========== ARRANQUE CON GUNICORN ==========
+def medir_arranque(preload, workers, puerto, peticiones):
+    """Arranca gunicorn, espera a que atienda y mide tiempo y memoria de cada worker"""
+    import http.cookiejar
+    import subprocess
+    import threading
+    import urllib.parse
+    import urllib.request
+
+    import psutil
+
+    entorno = dict(os.environ, GUNICORN_PRELOAD='1' if preload else '0',
+                   WEB_CONCURRENCY=str(workers), PORT=str(puerto))
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:crear_app()', '--config', 'gunicorn.conf.py'],
+                               cwd=directorio, env=entorno, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True)
+    try:
+        # Listo cuando la app se inicializó (en el master o en cada worker) y arrancaron todos los workers
+        inicializaciones = arrancados = 0
+        for linea in proceso.stdout:
+            inicializaciones += 'App lista' in linea
+            arrancados += 'Booting worker' in linea
+            if inicializaciones >= (1 if preload else workers) and arrancados >= workers:
+                break
+        threading.Thread(target=proceso.stdout.read, daemon=True).start()
+
+        base = f"http://127.0.0.1:{puerto}"
+        cliente = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        while True:
+            try:
+                cliente.open(f"{base}/login", timeout=5)
+                break
+            except OSError:
+                time.sleep(0.05)
+        arranque = time.perf_counter() - inicio
+
+        formulario = {'usuario': 'bench', 'email': 'bench@bench.local',
+                      'contrasena': 'bench123', 'confirmar_contrasena': 'bench123'}
+        cliente.open(f"{base}/registro", urllib.parse.urlencode(formulario).encode())
+        cliente.open(f"{base}/login", urllib.parse.urlencode(formulario).encode())
+        prediccion = json.dumps({'aerolinea': 'LATAM Perú', 'origen': 'LIM', 'destino': 'CUZ',
+                                 'fecha': '2025-03-04', 'hora_salida': '08:15', 'duracion': 1.2,
+                                 'escalas': 0, 'informacion': 'Incluye equipaje'}).encode()
+        for _ in range(peticiones):
+            cliente.open(f"{base}/api/datos")
+            cliente.open(urllib.request.Request(f"{base}/api/predecir", prediccion,
+                                                {'Content-Type': 'application/json'}))
+
+        memoria = [hijo.memory_full_info() for hijo in psutil.Process(proceso.pid).children()]
+        return arranque, memoria
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+
+
+def benchmark_arranque(workers, peticiones):
+    if not os.environ.get('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_'), 'bench.db')}"
+
+    print(f"📊 Arranque con gunicorn ({workers} workers, {peticiones} predicciones de calentamiento)")
+    print(f"  {'Modo':<34} {'Arranque':>9} {'RSS/worker':>11} {'USS/worker':>11} {'PSS total':>10}")
+    for nombre, preload, puerto in (('Carga en cada worker', False, 8761),
+                                    ('--preload + gc.freeze', True, 8762)):
+        arranque, memoria = medir_arranque(preload, workers, puerto, peticiones)
+        mb = 1024 * 1024
+        print(f"  {nombre:<34} {arranque:>7.1f} s {np.mean([m.rss for m in memoria]) / mb:>8.0f} MB "
+              f"{np.mean([m.uss for m in memoria]) / mb:>8.0f} MB {sum(m.pss for m in memoria) / mb:>7.0f} MB")
+    return True
+
+
+# ========== MODO ASÍNCRONO ==========
+def medir_servidor(comando, puerto, lentos, rapidos, duracion):
+    """Descargas NDJSON lentas en paralelo con clientes que piden /api/historial-json"""
+    import subprocess
+    import threading
+    import urllib.parse
+    import urllib.request
+
+    import psutil
+
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    proceso = subprocess.Popen(comando, cwd=directorio, env=dict(os.environ, PORT=str(puerto)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{puerto}"
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(f"{base}/login", timeout=5)
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        class SinRedireccion(urllib.request.HTTPRedirectHandler):
+            def redirect_request(self, *args):
+                return None
+
+        formulario = urllib.parse.urlencode({'usuario': 'bench', 'contrasena': 'bench123'}).encode()
+        try:
+            urllib.request.build_opener(SinRedireccion).open(f"{base}/login", formulario)
+        except urllib.error.HTTPError as e:
+            cookie = e.headers['Set-Cookie'].split(';')[0]
+        cabeceras = {'Cookie': cookie}
+
+        fin = time.perf_counter() + duracion
+        latencias, descargado = [], [0]
+
+        def descarga_lenta():
+            # Cliente con poco ancho de banda: 16 KB cada 100 ms
+            while time.perf_counter() < fin:
+                peticion = urllib.request.Request(f"{base}/api/historial/exportar-ndjson", headers=cabeceras)
+                with urllib.request.urlopen(peticion, timeout=duracion + 60) as respuesta:
+                    while time.perf_counter() < fin and (parte := respuesta.read(16 * 1024)):
+                        descargado[0] += len(parte)
+                        time.sleep(0.1)
+
+        def cliente_rapido():
+            peticion = urllib.request.Request(f"{base}/api/historial-json?limite=20", headers=cabeceras)
+            while time.perf_counter() < fin:
+                inicio = time.perf_counter()
+                urllib.request.urlopen(peticion, timeout=duracion + 60).read()
+                latencias.append(time.perf_counter() - inicio)
+
+        hilos = [threading.Thread(target=descarga_lenta) for _ in range(lentos)]
+        for hilo in hilos:
+            hilo.start()
+        time.sleep(0.5)  # que las descargas ocupen el servidor antes de medir
+        hilos += [threading.Thread(target=cliente_rapido) for _ in range(rapidos)]
+        for hilo in hilos[lentos:]:
+            hilo.start()
+
+        principal = psutil.Process(proceso.pid)
+        memoria = [p.memory_full_info() for p in [principal] + principal.children(recursive=True)]
+        for hilo in hilos:
+            hilo.join()
+        return latencias, descargado[0], memoria
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+
+
+def benchmark_asincrono(lentos, rapidos, predicciones, duracion):
+    modulo_app = preparar_app()
+    with modulo_app.app.app_context():
+        poblar_predicciones(modulo_app, crear_usuario(modulo_app, 'bench'), predicciones)
+
+    print(f"📊 {lentos} descargas NDJSON lentas + {rapidos} clientes de /api/historial-json "
+          f"({predicciones} predicciones, {duracion:.0f} s)")
+    print(f"  {'Servidor':<30} {'req/s':>7} {'p50':>9} {'p95':>9} {'Descargado':>11} {'RSS':>8} {'PSS':>8}")
+    servidores = (
+        ('gunicorn gthread (1x4 hilos)', [sys.executable, '-m', 'gunicorn', 'app:crear_app()',
+                                          '--config', 'gunicorn.conf.py', '--workers', '1', '--threads', '4'], 8771),
+        ('uvicorn asgi (1 worker)', [sys.executable, '-m', 'uvicorn', 'asgi:aplicacion',
+                                     '--port', '8772', '--workers', '1', '--log-level', 'warning'], 8772),
+    )
+    for nombre, comando, puerto in servidores:
+        latencias, descargado, memoria = medir_servidor(comando, puerto, lentos, rapidos, duracion)
+        mb = 1024 * 1024
+        p50, p95 = (np.percentile(latencias, [50, 95]) * 1000) if latencias else (float('nan'),) * 2
+        print(f"  {nombre:<30} {len(latencias) / duracion:>7.1f} {p50:>6.1f} ms {p95:>6.1f} ms "
+              f"{descargado / mb:>8.1f} MB {sum(m.rss for m in memoria) / mb:>5.0f} MB "
+              f"{sum(m.pss for m in memoria) / mb:>5.0f} MB")
+    return True
+
+
+# ========== COMPRESIÓN Y CACHÉ HTTP ==========
+def benchmark_compresion(visitas, predicciones):
+    """Bytes transferidos por sesión: sin compresión ni validadores vs gzip/brotli + caché"""
+    import re
+    import gzip
+
+    modulo_app = preparar_app()
+    with modulo_app.app.app_context():
+        usuario_id = crear_usuario(modulo_app, 'bench_http')
+        poblar_predicciones(modulo_app, usuario_id, predicciones)
+
+    cliente = modulo_app.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['usuario_id'] = usuario_id
+        sesion['usuario'] = 'bench_http'
+    prediccion = {'aerolinea': 'LATAM Perú', 'origen': 'LIM', 'destino': 'CUZ', 'fecha': '2025-03-04',
+                  'hora_salida': '08:15', 'duracion': 1.2, 'escalas': 0, 'informacion': 'Incluye equipaje'}
+    # Antes el JS de la página y el CSS/JS del chat iban en línea dentro de index.html
+    en_linea = {'index.js', 'chat-bot.css', 'chat-bot.js'}
+    descomprimir = {'gzip': gzip.decompress, 'br': lambda d: modulo_app.brotli.decompress(d)}
+
+    def visita(codificacion, cache, legado):
+        """Página principal, sus recursos y las llamadas que hace el frontend al cargar y chatear"""
+        transferido = 0
+
+        def pedir(metodo, url, **kwargs):
+            nonlocal transferido
+            entrada = cache.get(url)
+            if entrada == 'inmutable':
+                return None
+            cabeceras = {'Accept-Encoding': codificacion}
+            if entrada:
+                cabeceras['If-None-Match'] = entrada
+            respuesta = cliente.open(url, method=metodo, headers=cabeceras, **kwargs)
+            transferido += len(respuesta.data) + sum(len(k) + len(v) + 4 for k, v in respuesta.headers.items())
+            if respuesta.status_code == 200 and metodo == 'GET':
+                if 'immutable' in respuesta.headers.get('Cache-Control', ''):
+                    cache[url] = 'inmutable'
+                elif respuesta.headers.get('ETag') and not (legado and url.startswith('/api/')):
+                    cache[url] = respuesta.headers['ETag']
+            return respuesta
+
+        pagina = pedir('GET', '/')
+        html = descomprimir.get(pagina.headers.get('Content-Encoding'), bytes)(pagina.data).decode('utf-8')
+        for recurso in re.findall(r'"(/static/[^"]+)"', html):
+            ruta = recurso.split('?')[0]
+            if legado and os.path.basename(ruta) in en_linea:
+                # Iba dentro del HTML: se descargaba entero en cada visita
+                transferido += os.path.getsize(os.path.join(modulo_app.app.static_folder, os.path.basename(ruta)))
+                continue
+            pedir('GET', ruta if legado else recurso)
+        for url in ('/api/datos', '/api/estadisticas', '/api/perfil', '/api/historial-json'):
+            pedir('GET', url)
+        pedir('POST', '/api/predecir', json=prediccion)
+        for mensaje in ('hola', 'analiza mi predicción', 'dame consejos'):
+            pedir('POST', '/api/chat-bot', json={'mensaje': mensaje})
+        return transferido
+
+    modos = [('Sin compresión ni caché (antes)', 'identity', True),
+             ('gzip + caché', 'gzip', False)]
+    if modulo_app.brotli:
+        modos.append(('brotli + caché', 'br, gzip', False))
+
+    print(f"📊 Bytes por sesión ({visitas} visitas a la página principal)")
+    print(f"  {'Modo':<34} {'1ª visita':>10} {'Siguientes':>11} {'Sesión':>10}")
+    for nombre, codificacion, legado in modos:
+        cache = {}
+        bytes_visitas = [visita(codificacion, cache, legado) for _ in range(visitas)]
+        siguientes = np.mean(bytes_visitas[1:]) if visitas > 1 else 0
+        print(f"  {nombre:<34} {bytes_visitas[0] / 1024:>7.1f} KB {siguientes / 1024:>8.1f} KB "
+              f"{sum(bytes_visitas) / 1024:>7.1f} KB")
+    return True
+
+
+# ========== MÉTRICAS ==========
+def benchmark_metricas(repeticiones):
+    """Costo de registrar métricas por petición, en modo multiproceso como bajo gunicorn"""
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='bench_metricas_'))
+    os.environ.setdefault('METRICAS_TOKEN', 'benchmark')
+    modulo_app = preparar_app()
+    app = modulo_app.app
+
+    def por_llamada(funcion):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            funcion()
+        return (time.perf_counter() - inicio) / repeticiones
+
+    # Middleware alrededor de una app WSGI vacía: solo queda el costo de medir
+    middleware = modulo_app.MedirPeticiones(lambda environ, start_response: start_response('200 OK', []) or [])
+    regla = app.url_map.bind('localhost').match('/api/estadisticas', return_rule=True)[0]
+    environ = {'REQUEST_METHOD': 'GET', 'werkzeug.request': type('Peticion', (), {'url_rule': regla})}
+
+    def peticion():
+        middleware(environ, lambda status, headers, exc_info=None: None)
+
+    def peticion_sin_cache():
+        modulo_app.LATENCIA_PETICIONES.labels('/api/estadisticas', 'GET', '200').observe(0.001)
+
+    def etapas():
+        marca = time.perf_counter()
+        for etapa in ('codificacion', 'escalado', 'modelo', 'guardado'):
+            marca = modulo_app.registrar_etapa(etapa, marca)
+
+    filas = [('Petición (middleware)', por_llamada(peticion)),
+             ('  solo .labels().observe()', por_llamada(peticion_sin_cache)),
+             ('Etapas de /api/predecir (4)', por_llamada(etapas))]
+
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['usuario_id'] = 1
+    segundos, _ = medir(lambda: [cliente.get('/api/estadisticas') for _ in range(1000)], 3)
+    filas.append(('Referencia: GET /api/estadisticas', segundos / 1000))
+    token = {'Authorization': f"Bearer {os.environ['METRICAS_TOKEN']}"}
+    segundos, _ = medir(lambda: cliente.get('/metrics', headers=token), 20)
+    filas.append(('Referencia: GET /metrics', segundos))
+
+    print(f"📊 Costo de las métricas ({repeticiones:,} repeticiones, modo multiproceso)")
+    for nombre, tiempo in filas:
+        print(f"  {nombre:<36} {tiempo * 1e6:>10.2f} µs")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de rendimiento de AeroPredict')
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+
+    p = sub.add_parser('dashboard', help='Agregados del dashboard: ORM vs SQL vs usuario_estadisticas')
+    p.add_argument('--predicciones', type=int, default=100_000)
+
+    p = sub.add_parser('excel', help='Exportación Excel write-only vs workbook normal')
+    p.add_argument('--predicciones', type=int, default=100_000)
+    p.add_argument('--omitir-legado', action='store_true', help='Solo la versión nueva (historiales enormes)')
+
+    p = sub.add_parser('pdf', help='Exportación PDF por páginas vs una Table única')
+    p.add_argument('--filas', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    p.add_argument('--max-legado', type=int, default=10_000,
+                   help='Tamaño máximo con el que se mide la versión anterior')
+
+    p = sub.add_parser('intenciones', help='Paridad y velocidad del detector de intenciones')
+    p.add_argument('--mensajes', type=int, default=20_000)
+
+    p = sub.add_parser('bot', help='Tiempo de render de cada respuesta del chat bot')
+    p.add_argument('--repeticiones', type=int, default=2_000)
+
+    p = sub.add_parser('chat', help='Payload y latencia del chat con estado en el servidor')
+    p.add_argument('--turnos', type=int, default=20)
+    p.add_argument('--predicciones', type=int, default=1_000)
+
+    p = sub.add_parser('indice', help='Percentil de un precio: índice precalculado vs DataFrame')
+    p.add_argument('--consultas', type=int, default=5_000)
+
+    p = sub.add_parser('arranque', help='Tiempo de arranque y memoria por worker con gunicorn')
+    p.add_argument('--workers', type=int, default=2)
+    p.add_argument('--peticiones', type=int, default=20)
+
+    p = sub.add_parser('asincrono', help='Historial con descargas lentas: gunicorn gthread vs uvicorn ASGI')
+    p.add_argument('--lentos', type=int, default=8)
+    p.add_argument('--rapidos', type=int, default=4)
+    p.add_argument('--predicciones', type=int, default=50_000)
+    p.add_argument('--duracion', type=float, default=10)
+
+    p = sub.add_parser('compresion', help='Bytes por sesión con compresión y caché HTTP')
+    p.add_argument('--visitas', type=int, default=5)
+    p.add_argument('--predicciones', type=int, default=1_000)
+
+    p = sub.add_parser('metricas', help='Costo por petición de registrar métricas de Prometheus')
+    p.add_argument('--repeticiones', type=int, default=100_000)
+
+    args = parser.parse_args()
+    if args.benchmark == 'dashboard':
+        return benchmark_dashboard(args.predicciones)
+    if args.benchmark == 'excel':
+        return benchmark_excel(args.predicciones, args.omitir_legado)
+    if args.benchmark == 'pdf':
+        return benchmark_pdf(args.filas, args.max_legado)
+    if args.benchmark == 'intenciones':
+        return benchmark_intenciones(args.mensajes)
+    if args.benchmark == 'bot':
+        return benchmark_bot(args.repeticiones)
+    if args.benchmark == 'chat':
+        return benchmark_chat(args.turnos, args.predicciones)
+    if args.benchmark == 'indice':
+        return benchmark_indice(args.consultas)
+    if args.benchmark == 'arranque':
+        return benchmark_arranque(args.workers, args.peticiones)
+    if args.benchmark == 'asincrono':
+        return benchmark_asincrono(args.lentos, args.rapidos, args.predicciones, args.duracion)
+    if args.benchmark == 'compresion':
+        return benchmark_compresion(args.visitas, args.predicciones)
+    if args.benchmark == 'metricas':
+        return benchmark_metricas(args.repeticiones)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -1,108 +1,116 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+import time
 
 np.random.seed(42)
 
+# ✈️ Aerolíneas nacionales más comunes
+AEROLINEAS = [
+    'LATAM Perú', 'Sky Airline Perú', 'JetSMART Perú',
+    'VIVA Air Perú', 'Avianca Perú'
+]
+
+# 🏙️ Principales aeropuertos del Perú (códigos IATA)
+CIUDADES = {
+    'LIM': 'Lima',
+    'AQP': 'Arequipa',
+    'CUZ': 'Cusco',
+    'TRU': 'Trujillo',
+    'PIU': 'Piura',
+    'IQT': 'Iquitos',
+    'TCQ': 'Tacna',
+    'JUL': 'Juliaca',
+    'PCL': 'Pucallpa',
+    'TPP': 'Tarapoto',
+    'AYP': 'Ayacucho',
+    'CIX': 'Chiclayo'
+}
+
+# 🍽️ Información adicional común en vuelos nacionales
+INFORMACION = [
+    'Solo equipaje de mano',
+    'Incluye equipaje',
+    'Asiento preferente',
+    'Clase económica',
+    'Clase business',
+    'Incluye snack',
+    'WiFi incluido',
+    'Cancelación gratuita'
+]
+
+# ✈️ Rutas posibles (reales entre ciudades grandes)
+RUTAS_POSIBLES = [
+    ('LIM', 'AQP'), ('LIM', 'CUZ'), ('LIM', 'TRU'), ('LIM', 'PIU'), ('LIM', 'IQT'),
+    ('LIM', 'TCQ'), ('LIM', 'JUL'), ('LIM', 'PCL'), ('LIM', 'TPP'), ('LIM', 'CIX'),
+    ('CUZ', 'AQP'), ('CUZ', 'JUL'), ('TRU', 'PIU'), ('TRU', 'CIX'),
+    ('AQP', 'TCQ'), ('AQP', 'JUL')
+]
+
+DURACIONES_PROMEDIO = {
+    'LIM-AQP': 1.3, 'LIM-CUZ': 1.2, 'LIM-TRU': 1.1, 'LIM-PIU': 1.5,
+    'LIM-IQT': 1.9, 'LIM-TCQ': 1.6, 'LIM-JUL': 1.4, 'LIM-PCL': 1.2,
+    'LIM-TPP': 1.4, 'LIM-CIX': 1.2, 'CUZ-AQP': 1.0, 'CUZ-JUL': 0.8,
+    'TRU-PIU': 1.0, 'TRU-CIX': 0.8, 'AQP-TCQ': 0.9, 'AQP-JUL': 0.9
+}
+
+AJUSTE_AEROLINEA = {
+    'LATAM Perú': 1.00,
+    'Sky Airline Perú': 0.80,
+    'JetSMART Perú': 0.75,
+    'VIVA Air Perú': 0.70,
+    'Avianca Perú': 0.95
+}
+
+MULTIPLICADORES_INFO = {
+    'Solo equipaje de mano': 0.85,
+    'Incluye equipaje': 1.0,
+    'Asiento preferente': 1.2,
+    'Clase económica': 0.9,
+    'Clase business': 2.3,
+    'Incluye snack': 1.1,
+    'WiFi incluido': 1.15,
+    'Cancelación gratuita': 1.3
+}
+
+FECHA_INICIO = datetime(2024, 1, 1)
+MINUTOS = [0, 15, 30, 45]
+
 def generar_datos_vuelos_peru(cantidad=10000):
     """
     Genera datos simulados pero realistas de vuelos nacionales en Perú 🇵🇪
+    (versión fila a fila, se conserva como referencia para el benchmark)
     """
 
-    # ✈️ Aerolíneas nacionales más comunes
-    aerolineas = [
-        'LATAM Perú', 'Sky Airline Perú', 'JetSMART Perú',
-        'VIVA Air Perú', 'Avianca Perú'
-    ]
-    
-    # 🏙️ Principales aeropuertos del Perú (códigos IATA)
-    ciudades = {
-        'LIM': 'Lima',
-        'AQP': 'Arequipa',
-        'CUZ': 'Cusco',
-        'TRU': 'Trujillo',
-        'PIU': 'Piura',
-        'IQT': 'Iquitos',
-        'TCQ': 'Tacna',
-        'JUL': 'Juliaca',
-        'PCL': 'Pucallpa',
-        'TPP': 'Tarapoto',
-        'AYP': 'Ayacucho',
-        'CIX': 'Chiclayo'
-    }
-
-    # 🍽️ Información adicional común en vuelos nacionales
-    informacion = [
-        'Solo equipaje de mano',
-        'Incluye equipaje',
-        'Asiento preferente',
-        'Clase económica',
-        'Clase business',
-        'Incluye snack',
-        'WiFi incluido',
-        'Cancelación gratuita'
-    ]
-
     datos = []
-    fecha_inicio = datetime(2024, 1, 1)
-
-    # ✈️ Rutas posibles (reales entre ciudades grandes)
-    rutas_posibles = [
-        ('LIM', 'AQP'), ('LIM', 'CUZ'), ('LIM', 'TRU'), ('LIM', 'PIU'), ('LIM', 'IQT'),
-        ('LIM', 'TCQ'), ('LIM', 'JUL'), ('LIM', 'PCL'), ('LIM', 'TPP'), ('LIM', 'CIX'),
-        ('CUZ', 'AQP'), ('CUZ', 'JUL'), ('TRU', 'PIU'), ('TRU', 'CIX'),
-        ('AQP', 'TCQ'), ('AQP', 'JUL')
-    ]
 
     for _ in range(cantidad):
-        origen, destino = rutas_posibles[np.random.randint(0, len(rutas_posibles))]
+        origen, destino = RUTAS_POSIBLES[np.random.randint(0, len(RUTAS_POSIBLES))]
         ruta = f"{origen}-{destino}"
 
-        aerolinea = np.random.choice(aerolineas)
-        info = np.random.choice(informacion)
-        fecha = fecha_inicio + timedelta(days=np.random.randint(0, 365))
+        aerolinea = np.random.choice(AEROLINEAS)
+        info = np.random.choice(INFORMACION)
+        fecha = FECHA_INICIO + timedelta(days=np.random.randint(0, 365))
 
         hora_salida_h = np.random.randint(5, 22)
-        hora_salida_m = np.random.choice([0, 15, 30, 45])
+        hora_salida_m = np.random.choice(MINUTOS)
         hora_salida = f"{hora_salida_h:02d}:{hora_salida_m:02d}"
 
-        duraciones_promedio = {
-            'LIM-AQP': 1.3, 'LIM-CUZ': 1.2, 'LIM-TRU': 1.1, 'LIM-PIU': 1.5,
-            'LIM-IQT': 1.9, 'LIM-TCQ': 1.6, 'LIM-JUL': 1.4, 'LIM-PCL': 1.2,
-            'LIM-TPP': 1.4, 'LIM-CIX': 1.2, 'CUZ-AQP': 1.0, 'CUZ-JUL': 0.8,
-            'TRU-PIU': 1.0, 'TRU-CIX': 0.8, 'AQP-TCQ': 0.9, 'AQP-JUL': 0.9
-        }
-        duracion = round(duraciones_promedio.get(ruta, np.random.uniform(1.0, 2.0)) + np.random.normal(0, 0.1), 1)
+        duracion = round(DURACIONES_PROMEDIO.get(ruta, np.random.uniform(1.0, 2.0)) + np.random.normal(0, 0.1), 1)
 
         escalas = np.random.choice([0, 0, 1], p=[0.85, 0.10, 0.05])
 
         hora_llegada_total = hora_salida_h + int(np.floor(duracion))
         hora_llegada_h = hora_llegada_total % 24
-        hora_llegada_m = np.random.choice([0, 15, 30, 45])
+        hora_llegada_m = np.random.choice(MINUTOS)
         hora_llegada = f"{hora_llegada_h:02d}:{hora_llegada_m:02d}"
 
         precio_base = 150 + duracion * 80
-
-        ajuste_aerolinea = {
-            'LATAM Perú': 1.00,
-            'Sky Airline Perú': 0.80,
-            'JetSMART Perú': 0.75,
-            'VIVA Air Perú': 0.70,
-            'Avianca Perú': 0.95
-        }
-        precio_base *= ajuste_aerolinea[aerolinea]
-
-        multiplicadores_info = {
-            'Solo equipaje de mano': 0.85,
-            'Incluye equipaje': 1.0,
-            'Asiento preferente': 1.2,
-            'Clase económica': 0.9,
-            'Clase business': 2.3,
-            'Incluye snack': 1.1,
-            'WiFi incluido': 1.15,
-            'Cancelación gratuita': 1.3
-        }
-        precio_base *= multiplicadores_info[info]
+        precio_base *= AJUSTE_AEROLINEA[aerolinea]
+        precio_base *= MULTIPLICADORES_INFO[info]
 
         dia_semana = fecha.weekday()
         if dia_semana in [4, 5, 6]:  # Viernes a domingo
@@ -129,25 +137,202 @@ def generar_datos_vuelos_peru(cantidad=10000):
 
     df = pd.DataFrame(datos)
     return df
-#def main():
-#    print("🇵🇪 Generando datos realistas de vuelos nacionales en Perú...")
-#    df = generar_datos_vuelos_peru(10000)
-#    archivo_excel = 'datos_vuelos.xlsx'
-#    df.to_excel(archivo_excel, index=False)
-#    print(f"✅ Datos guardados en: {archivo_excel}")
-#
-#if __name__ == "__main__":
-#    main()
-def main():
+
+
+# ========== TABLAS DE CONSULTA PARA LA VERSIÓN VECTORIZADA ==========
+# Se construyen una sola vez: cada columna se genera como un array de índices
+# y los multiplicadores se aplican indexando estas tablas.
+_RUTAS = [f"{o}-{d}" for o, d in RUTAS_POSIBLES]
+_ORIGENES = sorted({o for o, _ in RUTAS_POSIBLES})
+_DESTINOS = sorted({d for _, d in RUTAS_POSIBLES})
+_ORIGEN_DE_RUTA = np.array([_ORIGENES.index(o) for o, _ in RUTAS_POSIBLES])
+_DESTINO_DE_RUTA = np.array([_DESTINOS.index(d) for _, d in RUTAS_POSIBLES])
+_DURACION_RUTA = np.array([DURACIONES_PROMEDIO[r] for r in _RUTAS])
+_AJUSTE_AEROLINEA = np.array([AJUSTE_AEROLINEA[a] for a in AEROLINEAS])
+_MULTIPLICADOR_INFO = np.array([MULTIPLICADORES_INFO[i] for i in INFORMACION])
+
+_FECHAS = [FECHA_INICIO + timedelta(days=d) for d in range(365)]
+_FECHAS_TEXTO = [f.strftime('%Y-%m-%d') for f in _FECHAS]
+_FACTOR_FECHA = np.array([
+    (1.2 if f.weekday() in [4, 5, 6] else 1.0) *  # Viernes a domingo
+    (1.25 if f.month in [7, 12] else 1.0)          # Temporada alta
+    for f in _FECHAS
+])
+
+_HORAS_SALIDA = list(range(5, 22))
+_HORAS_TEXTO = [f"{h:02d}:{m:02d}" for h in range(24) for m in MINUTOS]
+
+
+def generar_datos_vuelos_peru_vectorizado(cantidad=10000, semilla=42):
+    """
+    Genera los mismos datos que generar_datos_vuelos_peru (misma distribución)
+    pero columna a columna con NumPy, sin bucles por fila 🚀
+    `semilla` puede ser un entero o un np.random.SeedSequence.
+    """
+    rng = np.random.default_rng(semilla)
+
+    idx_ruta = rng.integers(0, len(RUTAS_POSIBLES), cantidad)
+    idx_aerolinea = rng.integers(0, len(AEROLINEAS), cantidad)
+    idx_info = rng.integers(0, len(INFORMACION), cantidad)
+    idx_fecha = rng.integers(0, len(_FECHAS), cantidad)
+
+    hora_salida_h = rng.integers(_HORAS_SALIDA[0], _HORAS_SALIDA[-1] + 1, cantidad)
+    idx_minuto_salida = rng.integers(0, len(MINUTOS), cantidad)
+
+    duracion = np.round(_DURACION_RUTA[idx_ruta] + rng.normal(0, 0.1, cantidad), 1)
+
+    # choice([0, 0, 1], p=[0.85, 0.10, 0.05]) => 1 escala con probabilidad 0.05
+    escalas = (rng.random(cantidad) < 0.05).astype(np.int64)
+
+    hora_llegada_h = (hora_salida_h + np.floor(duracion).astype(np.int64)) % 24
+    idx_minuto_llegada = rng.integers(0, len(MINUTOS), cantidad)
+
+    precio_base = (150 + duracion * 80) \
+        * _AJUSTE_AEROLINEA[idx_aerolinea] \
+        * _MULTIPLICADOR_INFO[idx_info] \
+        * _FACTOR_FECHA[idx_fecha]
+    precio_final = np.maximum(120, np.round(precio_base + rng.normal(0, 20, cantidad), 2))
+
+    # Las columnas de texto se guardan como categóricas (códigos + tabla)
+    categorica = pd.Categorical.from_codes
+    return pd.DataFrame({
+        'Aerolínea': categorica(idx_aerolinea, AEROLINEAS),
+        'Fecha_del_viaje': categorica(idx_fecha, _FECHAS_TEXTO),
+        'Origen': categorica(_ORIGEN_DE_RUTA[idx_ruta], _ORIGENES),
+        'Destino': categorica(_DESTINO_DE_RUTA[idx_ruta], _DESTINOS),
+        'Ruta': categorica(idx_ruta, _RUTAS),
+        'Hora_de_salida': categorica(hora_salida_h * len(MINUTOS) + idx_minuto_salida, _HORAS_TEXTO),
+        'Hora_de_llegada': categorica(hora_llegada_h * len(MINUTOS) + idx_minuto_llegada, _HORAS_TEXTO),
+        'Duración': duracion,
+        'Total_de_escalas': escalas,
+        'Información_adicional': categorica(idx_info, INFORMACION),
+        'Precio (S/)': precio_final
+    })
+
+
+def benchmark_generadores(cantidades=(10_000, 100_000, 1_000_000, 10_000_000), filas_bucle=10_000):
+    """Compara el generador fila a fila con el vectorizado"""
+    print("⏱️  Benchmark de generación de datos")
+
+    inicio = time.perf_counter()
+    df_bucle = generar_datos_vuelos_peru(filas_bucle)
+    t_bucle = time.perf_counter() - inicio
+    print(f"  Bucle:       {filas_bucle:>12,} filas en {t_bucle:8.3f}s "
+          f"({filas_bucle / t_bucle:>12,.0f} filas/s)")
+
+    for cantidad in cantidades:
+        inicio = time.perf_counter()
+        df = generar_datos_vuelos_peru_vectorizado(cantidad)
+        t = time.perf_counter() - inicio
+        print(f"  Vectorizado: {cantidad:>12,} filas en {t:8.3f}s "
+              f"({cantidad / t:>12,.0f} filas/s, x{(t_bucle / filas_bucle) / (t / cantidad):,.0f})")
+
+    # Misma distribución: comparar momentos y frecuencias con la versión fila a fila
+    df_vec = generar_datos_vuelos_peru_vectorizado(filas_bucle)
+    print("\n📊 Distribución (bucle vs vectorizado)")
+    for col in ['Precio (S/)', 'Duración']:
+        print(f"  {col:<20} media {df_bucle[col].mean():8.2f} vs {df_vec[col].mean():8.2f} | "
+              f"std {df_bucle[col].std():8.2f} vs {df_vec[col].std():8.2f}")
+    print(f"  {'Con escalas':<20} {df_bucle['Total_de_escalas'].mean():8.2%} vs "
+          f"{df_vec['Total_de_escalas'].mean():8.2%}")
+    for col in ['Aerolínea', 'Ruta', 'Información_adicional']:
+        diferencia = (df_bucle[col].astype(str).value_counts(normalize=True)
+                      - df_vec[col].astype(str).value_counts(normalize=True)).abs().max()
+        print(f"  {col:<20} máx. diferencia de frecuencia {diferencia:.2%}")
+    return True
+
+
+# ========== GENERACIÓN MASIVA POR CHUNKS ==========
+def semilla_chunk(semilla_maestra, indice):
+    """Semilla del chunk derivada solo de la semilla maestra y su índice"""
+    return np.random.SeedSequence(semilla_maestra, spawn_key=(indice,))
+
+
+def escribir_chunk(indice, filas, semilla_maestra, directorio, formato):
+    """Genera un chunk independiente y lo escribe directamente a disco"""
+    df = generar_datos_vuelos_peru_vectorizado(filas, semilla_chunk(semilla_maestra, indice))
+    ruta = os.path.join(directorio, f"parte-{indice:05d}.{formato}")
+
+    # Escritura atómica: un archivo parte-*.csv siempre está completo
+    temporal = ruta + '.tmp'
+    if formato == 'parquet':
+        df.to_parquet(temporal, index=False)
+    else:
+        df.to_csv(temporal, index=False)
+    os.replace(temporal, ruta)
+    return indice, filas
+
+
+def generar_en_chunks(filas_totales, directorio, formato='csv', filas_por_chunk=1_000_000,
+                      trabajadores=None, semilla=42):
+    """
+    Genera `filas_totales` filas como chunks independientes en un pool de procesos.
+    Cada chunk usa una semilla derivada de la maestra, así que el resultado es
+    idéntico sin importar el número de trabajadores, y nunca se mantiene el
+    dataset completo en memoria.
+    """
+    if formato == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("❌ El formato parquet requiere pyarrow (pip install pyarrow)")
+            return False
+
+    os.makedirs(directorio, exist_ok=True)
+    n_chunks = -(-filas_totales // filas_por_chunk)
+    tareas = [
+        (i, min(filas_por_chunk, filas_totales - i * filas_por_chunk))
+        for i in range(n_chunks)
+    ]
+
+    print(f"🇵🇪 Generando {filas_totales:,} filas en {n_chunks} chunks ({formato}) -> {directorio}/")
+    inicio = time.perf_counter()
+    escritas = 0
+    with ProcessPoolExecutor(max_workers=trabajadores) as ejecutor:
+        futuros = [
+            ejecutor.submit(escribir_chunk, i, filas, semilla, directorio, formato)
+            for i, filas in tareas
+        ]
+        for futuro in futuros:
+            indice, filas = futuro.result()
+            escritas += filas
+            segundos = time.perf_counter() - inicio
+            print(f"  ✓ parte-{indice:05d}: {escritas:,}/{filas_totales:,} filas "
+                  f"({escritas / segundos:,.0f} filas/s)")
+
+    print(f"✅ {escritas:,} filas escritas en {time.perf_counter() - inicio:.1f}s")
+    return True
+
+
+def main(cantidad=10000):
     print("🇵🇪 Generando datos realistas de vuelos nacionales en Perú...")
-    df = generar_datos_vuelos_peru(10000)
+    df = generar_datos_vuelos_peru_vectorizado(cantidad)
     archivo_excel = 'datos_vuelos.xlsx'
     df.to_excel(archivo_excel, index=False)
     print(f"✅ Datos guardados en: {archivo_excel}")
     return True
 
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description='Generador de datos de vuelos nacionales en Perú')
+    parser.add_argument('--filas', type=int, default=10000)
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compara el generador fila a fila con el vectorizado')
+    parser.add_argument('--salida', metavar='DIRECTORIO',
+                        help='Genera por chunks en paralelo y escribe parte-*.csv/parquet en DIRECTORIO')
+    parser.add_argument('--formato', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--filas-por-chunk', type=int, default=1_000_000)
+    parser.add_argument('--trabajadores', type=int, default=None,
+                        help='Procesos del pool (por defecto, uno por núcleo)')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla maestra')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        success = benchmark_generadores()
+    elif args.salida:
+        success = generar_en_chunks(args.filas, args.salida, args.formato, args.filas_por_chunk,
+                                    args.trabajadores, args.semilla)
+    else:
+        success = main(args.filas)
     if not success:
         print("❌ Error generando datos")
         exit(1)
@@ -0,0 +1,60 @@
+"""
+Configuración de gunicorn para AeroPredict.
+
+    gunicorn 'app:crear_app()'
+
+Con preload_app el master importa la app y ejecuta crear_app() una sola vez:
+el modelo, los datos y el índice de precios quedan en memoria antes del fork y
+los workers los comparten por copy-on-write. gc.freeze() pasa esos objetos a
+la generación permanente para que el recolector de cada worker no los recorra
+(al actualizar sus cabeceras copiaría las páginas). Las conexiones a la base
+se cierran antes del fork: cada worker crea su propio pool.
+
+Las métricas de Prometheus de todos los workers se escriben en
+PROMETHEUS_MULTIPROC_DIR y /metrics las devuelve sumadas.
+"""
+import gc
+import glob
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 120
+loglevel = 'info'
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Debe existir antes de importar la app. Los archivos de una ejecución
+# anterior sumarían contadores viejos: se borran al arrancar.
+directorio_metricas = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                            os.path.join(tempfile.gettempdir(), 'aeropredict_metricas'))
+os.makedirs(directorio_metricas, exist_ok=True)
+for archivo in glob.glob(os.path.join(directorio_metricas, '*.db')):
+    os.remove(archivo)
+
+# Sin recolecciones en el master mientras se carga la app: no deja huecos en
+# las páginas que luego se comparten. when_ready lo vuelve a activar.
+if preload_app:
+    gc.disable()
+
+
+def when_ready(server):
+    # La app ya está cargada y aún no hay workers: se congela una sola vez
+    if preload_app:
+        gc.freeze()
+        gc.enable()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        from app import app, db
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+def child_exit(server, worker):
+    # Los gauges "live" dejan de contar al worker que terminó
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
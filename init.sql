@@ -7,8 +7,10 @@ CREATE TABLE IF NOT EXISTS usuarios (
     activo BOOLEAN DEFAULT TRUE
 );
 
+-- Particionada por mes de fecha_prediccion: la app crea las particiones
+-- mensuales al arrancar y `python mantenimiento_db.py archivar` retira las antiguas
 CREATE TABLE IF NOT EXISTS predicciones (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
     aerolinea VARCHAR(100) NOT NULL,
     origen VARCHAR(10) NOT NULL,
@@ -19,5 +21,24 @@ CREATE TABLE IF NOT EXISTS predicciones (
     escalas INTEGER NOT NULL,
     informacion VARCHAR(100) NOT NULL,
     precio_predicho FLOAT NOT NULL,
-    fecha_prediccion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    fecha_prediccion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, fecha_prediccion)
+) PARTITION BY RANGE (fecha_prediccion);
+
+CREATE TABLE IF NOT EXISTS predicciones_default PARTITION OF predicciones DEFAULT;
+
+CREATE INDEX IF NOT EXISTS ix_predicciones_usuario_fecha
+    ON predicciones (usuario_id, fecha_prediccion DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS usuario_estadisticas (
+    usuario_id INTEGER PRIMARY KEY REFERENCES usuarios(id) ON DELETE CASCADE,
+    total INTEGER NOT NULL DEFAULT 0,
+    suma_precio FLOAT NOT NULL DEFAULT 0,
+    precio_min FLOAT,
+    precio_max FLOAT,
+    suma_duracion FLOAT NOT NULL DEFAULT 0,
+    total_escalas INTEGER NOT NULL DEFAULT 0,
+    ultima_prediccion TIMESTAMP,
+    ultima_prediccion_id INTEGER,
+    rutas JSON NOT NULL DEFAULT '{}'
 );
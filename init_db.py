@@ -9,11 +9,11 @@ def main():
     
     try:
         # Importar app después de establecer variable de entorno
-        from app import app, db
+        from app import app, db, inicializar_esquema
         
         with app.app_context():
-            # Crear todas las tablas
-            db.create_all()
+            # Crear todas las tablas (e índices)
+            inicializar_esquema()
             print("✓ Tablas creadas exitosamente")
             
             # Verificar tablas
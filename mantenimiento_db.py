@@ -0,0 +1,294 @@
+"""
+Tareas de mantenimiento de la base de datos
+
+Uso:
+    python mantenimiento_db.py reconstruir-estadisticas
+    python mantenimiento_db.py verificar-estadisticas
+    python mantenimiento_db.py particionar
+    python mantenimiento_db.py crear-particiones [--meses-futuros 3]
+    python mantenimiento_db.py archivar [--meses-retencion 12] [--directorio archivo_predicciones]
+    python mantenimiento_db.py exportar --tabla predicciones --archivo predicciones.csv.gz
+    python mantenimiento_db.py importar --tabla predicciones --archivo predicciones.csv.gz
+"""
+import argparse
+import csv
+import gzip
+import io
+import os
+import sys
+import time
+from datetime import datetime
+
+TAMANO_LOTE = 10_000
+
+
+def reconstruir_estadisticas():
+    from app import app, reconstruir_estadisticas
+    
+    with app.app_context():
+        print("🔄 Reconstruyendo usuario_estadisticas...")
+        usuarios = reconstruir_estadisticas()
+        print(f"✓ Estadísticas reconstruidas para {usuarios} usuarios")
+    return True
+
+
+def verificar_estadisticas():
+    from app import app, verificar_estadisticas
+    
+    with app.app_context():
+        print("🔍 Verificando usuario_estadisticas contra predicciones...")
+        diferencias = verificar_estadisticas()
+    
+    if not diferencias:
+        print("✓ Estadísticas consistentes")
+        return True
+    
+    for usuario_id, campo, guardado, esperado in diferencias:
+        print(f"✗ Usuario {usuario_id} - {campo}: guardado={guardado} esperado={esperado}")
+    print(f"❌ {len(diferencias)} diferencias. Ejecuta: python mantenimiento_db.py reconstruir-estadisticas")
+    return False
+
+
+def particionar(args):
+    from app import app, particionar_predicciones
+    
+    with app.app_context():
+        print("🔄 Convirtiendo predicciones en tabla particionada por mes...")
+        filas = particionar_predicciones()
+        print(f"✓ Tabla particionada ({filas} filas migradas)")
+    return True
+
+
+def crear_particiones(args):
+    from app import app, asegurar_particiones, particiones_predicciones
+    
+    with app.app_context():
+        if not asegurar_particiones(meses_futuros=args.meses_futuros):
+            print("⚠️ predicciones no es una tabla particionada (ejecuta primero: particionar)")
+            return False
+        particiones = particiones_predicciones()
+        print(f"✓ {len(particiones)} particiones mensuales, hasta {particiones[-1][0]}")
+    return True
+
+
+def archivar(args):
+    """Vuelca a CSV comprimido y retira las particiones más antiguas que la retención"""
+    from app import (app, db, particiones_predicciones, predicciones_particionada,
+                     reconstruir_estadisticas, sumar_meses)
+    
+    with app.app_context():
+        if not predicciones_particionada():
+            print("⚠️ predicciones no es una tabla particionada (ejecuta primero: particionar)")
+            return False
+        
+        limite = sumar_meses(datetime.now().date(), -args.meses_retencion)
+        antiguas = [(nombre, mes) for nombre, mes in particiones_predicciones()
+                    if sumar_meses(mes, 1) <= limite]
+        if not antiguas:
+            print(f"✓ No hay particiones anteriores a {limite}")
+            return True
+        
+        os.makedirs(args.directorio, exist_ok=True)
+        for nombre, mes in antiguas:
+            ruta = os.path.join(args.directorio, f"{nombre}.csv.gz")
+            conexion = db.engine.raw_connection()
+            try:
+                cursor = conexion.cursor()
+                # 1. Volcar la partición (el archivo queda completo antes de borrar nada)
+                with gzip.open(ruta + '.tmp', 'wb') as archivo:
+                    cursor.copy_expert(f"COPY {nombre} TO STDOUT WITH CSV HEADER", archivo)
+                    filas = cursor.rowcount
+                os.replace(ruta + '.tmp', ruta)
+                
+                # 2. Separarla de la tabla y eliminarla
+                cursor.execute(f"ALTER TABLE predicciones DETACH PARTITION {nombre}")
+                cursor.execute(f"DROP TABLE {nombre}")
+                conexion.commit()
+            finally:
+                conexion.close()
+            print(f"✓ {nombre}: {filas} filas archivadas en {ruta}")
+        
+        # Las estadísticas por usuario pasan a reflejar solo el historial vigente
+        reconstruir_estadisticas()
+        print(f"✓ {len(antiguas)} particiones archivadas; estadísticas reconstruidas")
+    return True
+
+
+# ========== IMPORTACIÓN / EXPORTACIÓN MASIVA ==========
+def abrir_archivo(ruta, modo):
+    """Abre CSV plano o comprimido (.gz) en binario"""
+    return gzip.open(ruta, modo + 'b') if ruta.endswith('.gz') else open(ruta, modo + 'b')
+
+
+def reportar(accion, tabla, filas, inicio):
+    segundos = time.perf_counter() - inicio
+    print(f"✓ {filas:,} filas {accion} ({tabla}) en {segundos:.1f}s "
+          f"({filas / max(segundos, 1e-9):,.0f} filas/s)")
+
+
+def exportar(args):
+    """Vuelca una tabla a CSV en streaming (COPY TO STDOUT en Postgres)"""
+    from app import app, db, es_postgres, TABLAS_MASIVAS
+    
+    columnas = [c.name for c in TABLAS_MASIVAS[args.tabla].columns]
+    consulta = f"SELECT {', '.join(columnas)} FROM {args.tabla}"
+    
+    with app.app_context():
+        inicio = time.perf_counter()
+        conexion = db.engine.raw_connection()
+        try:
+            cursor = conexion.cursor()
+            with abrir_archivo(args.archivo, 'w') as archivo:
+                if es_postgres():
+                    cursor.copy_expert(f"COPY ({consulta}) TO STDOUT WITH CSV HEADER", archivo)
+                    filas = cursor.rowcount
+                else:
+                    # SQLite: lectura por lotes con fetchmany
+                    texto = io.TextIOWrapper(archivo, encoding='utf-8', newline='')
+                    escritor = csv.writer(texto)
+                    escritor.writerow(columnas)
+                    cursor.execute(consulta)
+                    filas = 0
+                    while lote := cursor.fetchmany(TAMANO_LOTE):
+                        escritor.writerows(lote)
+                        filas += len(lote)
+                    texto.flush()
+                    texto.detach()
+        finally:
+            conexion.close()
+    
+    reportar('exportadas', args.tabla, filas, inicio)
+    return True
+
+
+def _fecha_minima_csv(ruta, columna):
+    """Primera pasada sobre el CSV para conocer el rango de particiones necesario"""
+    with abrir_archivo(ruta, 'r') as archivo:
+        lector = csv.reader(io.TextIOWrapper(archivo, encoding='utf-8', newline=''))
+        indice = next(lector).index(columna)
+        fechas = (fila[indice] for fila in lector if fila[indice])
+        minimo = min(fechas, default=None)
+    return datetime.fromisoformat(minimo).date() if minimo else None
+
+
+def _columnas_csv(ruta, tabla):
+    """Encabezado del CSV validado contra las columnas de la tabla; None si alguna no existe"""
+    with abrir_archivo(ruta, 'r') as archivo:
+        columnas = next(csv.reader(io.TextIOWrapper(archivo, encoding='utf-8', newline='')), [])
+    if not columnas:
+        print(f"❌ {ruta} no tiene encabezado con los nombres de columna")
+        return None
+    desconocidas = [c for c in columnas if c not in tabla.columns]
+    if desconocidas:
+        print(f"❌ Columnas desconocidas en {tabla.name}: {', '.join(map(repr, desconocidas))}. "
+              f"Columnas permitidas: {', '.join(tabla.columns.keys())}")
+        return None
+    return columnas
+
+
+def importar(args):
+    """Carga un CSV en streaming (COPY FROM STDIN en Postgres, executemany por lotes en SQLite)"""
+    from app import (app, db, es_postgres, predicciones_particionada, asegurar_particiones,
+                     reconstruir_estadisticas, TABLAS_MASIVAS)
+    
+    tabla = TABLAS_MASIVAS[args.tabla]
+    columnas = _columnas_csv(args.archivo, tabla)
+    if columnas is None:
+        return False
+    
+    with app.app_context():
+        if args.tabla == 'predicciones' and predicciones_particionada():
+            desde = _fecha_minima_csv(args.archivo, 'fecha_prediccion')
+            if desde:
+                asegurar_particiones(desde=desde)
+        db.session.commit()
+        
+        # Nombres ya validados; se citan igual para que nunca se lean como SQL
+        citadas = ', '.join(db.engine.dialect.identifier_preparer.quote(c) for c in columnas)
+        inicio = time.perf_counter()
+        conexion = db.engine.raw_connection()
+        try:
+            cursor = conexion.cursor()
+            with abrir_archivo(args.archivo, 'r') as archivo:
+                if es_postgres():
+                    archivo.readline()  # encabezado, ya leído en _columnas_csv
+                    cursor.copy_expert(f"COPY {args.tabla} ({citadas}) FROM STDIN WITH CSV", archivo)
+                    filas = cursor.rowcount
+                    # Continuar la secuencia después de los ids importados
+                    cursor.execute(
+                        f"SELECT setval(pg_get_serial_sequence('{args.tabla}', 'id'), "
+                        f"COALESCE((SELECT max(id) FROM {args.tabla}), 0) + 1, false)"
+                    )
+                else:
+                    lector = csv.reader(io.TextIOWrapper(archivo, encoding='utf-8', newline=''))
+                    next(lector)
+                    booleanas = {i for i, c in enumerate(columnas)
+                                 if isinstance(tabla.columns[c].type, db.Boolean)}
+                    
+                    def convertir(fila):
+                        return [None if v == '' else
+                                (v.lower() in ('t', 'true', '1')) if i in booleanas else v
+                                for i, v in enumerate(fila)]
+                    
+                    sql = (f"INSERT INTO {args.tabla} ({citadas}) "
+                           f"VALUES ({', '.join('?' for _ in columnas)})")
+                    filas = 0
+                    lote = []
+                    for fila in lector:
+                        lote.append(convertir(fila))
+                        if len(lote) == TAMANO_LOTE:
+                            cursor.executemany(sql, lote)
+                            filas += len(lote)
+                            lote = []
+                    if lote:
+                        cursor.executemany(sql, lote)
+                        filas += len(lote)
+            conexion.commit()
+        finally:
+            conexion.close()
+        reportar('importadas', args.tabla, filas, inicio)
+        
+        print("🔄 Reconstruyendo usuario_estadisticas...")
+        reconstruir_estadisticas()
+    return True
+
+
+COMANDOS = {
+    'reconstruir-estadisticas': lambda args: reconstruir_estadisticas(),
+    'verificar-estadisticas': lambda args: verificar_estadisticas(),
+    'particionar': particionar,
+    'crear-particiones': crear_particiones,
+    'archivar': archivar,
+    'exportar': exportar,
+    'importar': importar,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mantenimiento de la base de datos')
+    parser.add_argument('comando', choices=COMANDOS)
+    parser.add_argument('--meses-futuros', type=int, default=3,
+                        help='crear-particiones: meses por delante a crear')
+    parser.add_argument('--meses-retencion', type=int, default=12,
+                        help='archivar: meses de historial que se conservan en la tabla')
+    parser.add_argument('--directorio', default='archivo_predicciones',
+                        help='archivar: destino de los CSV comprimidos')
+    parser.add_argument('--tabla', choices=['usuarios', 'predicciones'],
+                        help='exportar/importar: tabla a transferir')
+    parser.add_argument('--archivo', help='exportar/importar: CSV de origen o destino (.gz opcional)')
+    args = parser.parse_args()
+    if args.comando in ('exportar', 'importar') and not (args.tabla and args.archivo):
+        parser.error(f"{args.comando} requiere --tabla y --archivo")
+    
+    try:
+        return COMANDOS[args.comando](args)
+    except Exception as e:
+        print(f"❌ Error en {args.comando}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
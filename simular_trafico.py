@@ -0,0 +1,314 @@
+"""
+Generador de trazas de tráfico realistas y reproductor concurrente para
+pruebas de carga de la app Flask.
+
+Uso:
+    # 1. Generar una traza (JSONL, una sesión por línea)
+    python simular_trafico.py generar --sesiones 500 --duracion 120 --perfil feriado -o traza.jsonl
+
+    # 2. Reproducirla contra una instancia local (SQLite temporal) o una URL
+    python simular_trafico.py reproducir traza.jsonl --local
+    python simular_trafico.py reproducir traza.jsonl --url http://localhost:5000
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+from generar_datos import AEROLINEAS, DURACIONES_PROMEDIO, INFORMACION, RUTAS_POSIBLES
+
+CONTRASENA_PRUEBA = 'carga123'
+
+MENSAJES_CHAT = [
+    'hola', 'analiza mi predicción', '¿es temporada alta?', 'dame consejos',
+    'compara aerolíneas', '¿cuándo comprar?', 'escalas', 'mejor día para viajar', 'gracias'
+]
+
+
+# ========== PERFILES DE LLEGADA ==========
+def tasa_llegada(perfil, t, duracion, tasa_base):
+    """Sesiones por segundo en el instante t según el perfil"""
+    fase = t / duracion
+    if perfil == 'diurno':
+        # Valle al inicio y al final, pico a mitad de la ventana
+        return tasa_base * (0.2 + 1.6 * math.sin(math.pi * fase) ** 2)
+    if perfil == 'feriado':
+        # Tráfico base con dos ráfagas de 5x (p. ej. víspera de Fiestas Patrias)
+        en_rafaga = 0.25 <= fase < 0.35 or 0.70 <= fase < 0.80
+        return tasa_base * (5.0 if en_rafaga else 1.0)
+    return tasa_base
+
+
+def tiempos_llegada(rng, perfil, duracion, tasa_base):
+    """Proceso de Poisson no homogéneo por adelgazamiento (thinning)"""
+    tasa_max = max(tasa_llegada(perfil, t, duracion, tasa_base)
+                   for t in np.linspace(0, duracion, 200))
+    t, llegadas = 0.0, []
+    while True:
+        t += rng.exponential(1 / tasa_max)
+        if t >= duracion:
+            return llegadas
+        if rng.random() < tasa_llegada(perfil, t, duracion, tasa_base) / tasa_max:
+            llegadas.append(t)
+
+
+def probabilidades_zipf(n, s):
+    pesos = 1.0 / np.arange(1, n + 1) ** s
+    return pesos / pesos.sum()
+
+
+# ========== GENERACIÓN DE TRAZAS ==========
+def consulta_prediccion(rng, p_rutas, p_aerolineas):
+    origen, destino = RUTAS_POSIBLES[rng.choice(len(RUTAS_POSIBLES), p=p_rutas)]
+    fecha = date(2025, 1, 1) + timedelta(days=int(rng.integers(0, 365)))
+    return {
+        'aerolinea': AEROLINEAS[rng.choice(len(AEROLINEAS), p=p_aerolineas)],
+        'origen': origen,
+        'destino': destino,
+        'fecha': fecha.isoformat(),
+        'hora_salida': f"{int(rng.integers(5, 22)):02d}:{int(rng.choice([0, 15, 30, 45])):02d}",
+        'duracion': DURACIONES_PROMEDIO[f"{origen}-{destino}"],
+        'escalas': int(rng.random() < 0.05),
+        'informacion': INFORMACION[int(rng.integers(0, len(INFORMACION)))]
+    }
+
+
+def generar_sesion(rng, inicio, usuario, p_rutas, p_aerolineas, p_repetir, p_chat):
+    """Una sesión: login, catálogos, predicciones (con repeticiones), historial y chat"""
+    espera = lambda: round(float(rng.exponential(2.0)), 3)  # "think time" del usuario
+    acciones = [
+        {'espera': 0, 'metodo': 'POST', 'ruta': '/login',
+         'form': {'usuario': usuario, 'contrasena': CONTRASENA_PRUEBA}},
+        {'espera': espera(), 'metodo': 'GET', 'ruta': '/api/datos'},
+    ]
+
+    consulta = consulta_prediccion(rng, p_rutas, p_aerolineas)
+    for _ in range(int(rng.geometric(1 / 3))):
+        if rng.random() >= p_repetir:
+            consulta = consulta_prediccion(rng, p_rutas, p_aerolineas)
+        acciones.append({'espera': espera(), 'metodo': 'POST', 'ruta': '/api/predecir', 'json': consulta})
+        acciones.append({'espera': 0.2, 'metodo': 'GET', 'ruta': '/api/historial-json'})
+
+    if rng.random() < p_chat:
+        for _ in range(int(rng.integers(1, 4))):
+            mensaje = MENSAJES_CHAT[int(rng.integers(0, len(MENSAJES_CHAT)))]
+            acciones.append({'espera': espera(), 'metodo': 'POST', 'ruta': '/api/chat-bot',
+                             'json': {'mensaje': mensaje}})
+
+    return {'inicio': round(inicio, 3), 'usuario': usuario, 'acciones': acciones}
+
+
+def generar_traza(sesiones=500, duracion=120, perfil='constante', usuarios=100, zipf_rutas=1.1,
+                  zipf_aerolineas=1.2, zipf_usuarios=1.0, p_repetir=0.4, p_chat=0.3, semilla=42):
+    rng = np.random.default_rng(semilla)
+
+    # Popularidad con sesgo Zipf; el ranking de rutas/aerolíneas se baraja con la semilla
+    p_rutas = probabilidades_zipf(len(RUTAS_POSIBLES), zipf_rutas)[rng.permutation(len(RUTAS_POSIBLES))]
+    p_aerolineas = probabilidades_zipf(len(AEROLINEAS), zipf_aerolineas)[rng.permutation(len(AEROLINEAS))]
+    p_usuarios = probabilidades_zipf(usuarios, zipf_usuarios)
+
+    # Se normaliza la tasa para que el total esperado sea `sesiones` en cualquier perfil
+    factor_medio = np.mean([tasa_llegada(perfil, t, duracion, 1.0)
+                            for t in np.linspace(0, duracion, 1000)])
+    llegadas = tiempos_llegada(rng, perfil, duracion, sesiones / duracion / factor_medio)
+    return [
+        generar_sesion(rng, t, f"carga_{rng.choice(usuarios, p=p_usuarios):05d}",
+                       p_rutas, p_aerolineas, p_repetir, p_chat)
+        for t in llegadas
+    ]
+
+
+# ========== REPRODUCCIÓN ==========
+class SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    """Mide cada petición por separado (el login no arrastra la carga de '/')"""
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def crear_cliente():
+    return urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+        SinRedirecciones()
+    )
+
+
+def enviar(cliente, base_url, accion, timeout=60):
+    datos, cabeceras = None, {}
+    if 'json' in accion:
+        datos = json.dumps(accion['json']).encode()
+        cabeceras['Content-Type'] = 'application/json'
+    elif 'form' in accion:
+        datos = urllib.parse.urlencode(accion['form']).encode()
+
+    peticion = urllib.request.Request(base_url + accion['ruta'], data=datos,
+                                      headers=cabeceras, method=accion['metodo'])
+    try:
+        with cliente.open(peticion, timeout=timeout) as respuesta:
+            respuesta.read()
+            return respuesta.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+
+
+def registrar_usuarios(base_url, usuarios):
+    for usuario in sorted(usuarios):
+        enviar(crear_cliente(), base_url, {
+            'metodo': 'POST', 'ruta': '/registro',
+            'form': {'usuario': usuario, 'email': f"{usuario}@carga.local",
+                     'contrasena': CONTRASENA_PRUEBA, 'confirmar_contrasena': CONTRASENA_PRUEBA}
+        })
+
+
+def reproducir_traza(traza, base_url, concurrencia=32, velocidad=1.0):
+    """Reproduce las sesiones respetando sus instantes de llegada (escalados por `velocidad`).
+
+    La latencia se mide desde el instante en que cada petición debía salir, no
+    desde que salió: si las sesiones esperan un hilo libre, esa espera cuenta
+    (sin "coordinated omission")."""
+    latencias = defaultdict(list)
+    errores = defaultdict(int)
+    retrasos = []
+    candado = threading.Lock()
+
+    def ejecutar_sesion(sesion, programado):
+        with candado:
+            retrasos.append(max(time.perf_counter() - programado, 0.0))
+        cliente = crear_cliente()
+        for accion in sesion['acciones']:
+            # El usuario piensa `espera` segundos después de la respuesta anterior
+            programado += accion['espera'] / velocidad
+            pausa = programado - time.perf_counter()
+            if pausa > 0:
+                time.sleep(pausa)
+            try:
+                estado = enviar(cliente, base_url, accion)
+            except OSError:
+                estado = 0
+            fin = time.perf_counter()
+            with candado:
+                latencias[accion['ruta']].append(fin - programado)
+                # El login responde 302 cuando es correcto
+                if estado >= 400 or estado == 0:
+                    errores[accion['ruta']] += 1
+            programado = fin
+
+    inicio = time.perf_counter()
+    futuros = []
+    with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        for sesion in sorted(traza, key=lambda s: s['inicio']):
+            programado = inicio + sesion['inicio'] / velocidad
+            retraso = programado - time.perf_counter()
+            if retraso > 0:
+                time.sleep(retraso)
+            futuros.append(ejecutor.submit(ejecutar_sesion, sesion, programado))
+    # Una excepción dentro de una sesión no debe perderse en silencio
+    for futuro in futuros:
+        futuro.result()
+    return latencias, errores, time.perf_counter() - inicio, retrasos
+
+
+def imprimir_reporte(latencias, errores, segundos, retrasos):
+    print("\n" + "=" * 86)
+    print(f"{'Endpoint':<26} {'Peticiones':>10} {'Errores':>8} {'p50':>8} {'p95':>8} "
+          f"{'p99':>8} {'máx':>8} {'req/s':>7}")
+    print("=" * 86)
+    total = 0
+    for ruta in sorted(latencias):
+        ms = np.array(latencias[ruta]) * 1000
+        total += len(ms)
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        print(f"{ruta:<26} {len(ms):>10} {errores[ruta]:>8} {p50:>6.1f}ms {p95:>6.1f}ms "
+              f"{p99:>6.1f}ms {ms.max():>6.0f}ms {len(ms) / segundos:>7.1f}")
+    print("=" * 86)
+    print(f"Total: {total} peticiones en {segundos:.1f}s ({total / segundos:.1f} req/s)")
+    if retrasos:
+        ms = np.array(retrasos) * 1000
+        p50, p95 = np.percentile(ms, [50, 95])
+        print(f"Inicio de sesiones tras lo programado (esperando hilo, incluido en latencias): "
+              f"p50 {p50:.1f}ms  p95 {p95:.1f}ms  máx {ms.max():.0f}ms")
+
+
+def iniciar_app_local(puerto):
+    """Levanta la app en un hilo con una base SQLite temporal (sustituto de Postgres)"""
+    directorio = tempfile.mkdtemp(prefix='carga_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directorio, 'carga.db')}"
+
+    from werkzeug.serving import make_server
+    from app import crear_app
+    app = crear_app()
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    servidor = make_server('127.0.0.1', puerto, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    print(f"🚀 App local en http://127.0.0.1:{puerto} (SQLite en {directorio})")
+    return f"http://127.0.0.1:{puerto}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trazas de tráfico y pruebas de carga')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    gen = sub.add_parser('generar', help='Genera una traza de sesiones en JSONL')
+    gen.add_argument('-o', '--salida', default='traza.jsonl')
+    gen.add_argument('--sesiones', type=int, default=500, help='Sesiones esperadas en la ventana')
+    gen.add_argument('--duracion', type=float, default=120, help='Ventana en segundos')
+    gen.add_argument('--perfil', choices=['constante', 'diurno', 'feriado'], default='constante')
+    gen.add_argument('--usuarios', type=int, default=100)
+    gen.add_argument('--zipf-rutas', type=float, default=1.1)
+    gen.add_argument('--zipf-aerolineas', type=float, default=1.2)
+    gen.add_argument('--zipf-usuarios', type=float, default=1.0)
+    gen.add_argument('--p-repetir', type=float, default=0.4,
+                     help='Probabilidad de repetir la misma consulta en la sesión')
+    gen.add_argument('--p-chat', type=float, default=0.3)
+    gen.add_argument('--semilla', type=int, default=42)
+
+    rep = sub.add_parser('reproducir', help='Reproduce una traza y reporta latencias')
+    rep.add_argument('traza')
+    rep.add_argument('--url', default='http://127.0.0.1:5000')
+    rep.add_argument('--local', action='store_true', help='Levanta la app con SQLite temporal')
+    rep.add_argument('--puerto', type=int, default=5055)
+    rep.add_argument('--concurrencia', type=int, default=32)
+    rep.add_argument('--velocidad', type=float, default=1.0, help='Factor de aceleración del reloj')
+
+    args = parser.parse_args()
+
+    if args.comando == 'generar':
+        traza = generar_traza(args.sesiones, args.duracion, args.perfil, args.usuarios,
+                              args.zipf_rutas, args.zipf_aerolineas, args.zipf_usuarios,
+                              args.p_repetir, args.p_chat, args.semilla)
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            for sesion in traza:
+                f.write(json.dumps(sesion, ensure_ascii=False) + '\n')
+        peticiones = sum(len(s['acciones']) for s in traza)
+        print(f"✅ {len(traza)} sesiones / {peticiones} peticiones guardadas en {args.salida}")
+        return True
+
+    with open(args.traza, encoding='utf-8') as f:
+        traza = [json.loads(linea) for linea in f if linea.strip()]
+
+    base_url = iniciar_app_local(args.puerto) if args.local else args.url.rstrip('/')
+    print(f"👥 Registrando {len({s['usuario'] for s in traza})} usuarios de prueba...")
+    registrar_usuarios(base_url, {s['usuario'] for s in traza})
+
+    print(f"▶️  Reproduciendo {len(traza)} sesiones (x{args.velocidad})...")
+    imprimir_reporte(*reproducir_traza(traza, base_url, args.concurrencia, args.velocidad))
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
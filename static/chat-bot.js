@@ -0,0 +1,133 @@
+// ============ CHAT BOT JAVASCRIPT ============
+let chatBotAbierto = false;
+
+function toggleChatBot() {
+  const chatWindow = document.getElementById('chat-bot-window');
+  const chatButton = document.getElementById('chat-bot-toggle');
+  const chatBadge = document.getElementById('chat-badge');
+
+  chatBotAbierto = !chatBotAbierto;
+
+  if (chatBotAbierto) {
+    chatWindow.classList.add('active');
+    chatButton.style.transform = 'scale(0.9)';
+    chatBadge.style.display = 'none';
+
+    setTimeout(() => {
+      const messages = document.getElementById('chat-bot-messages');
+      messages.scrollTop = messages.scrollHeight;
+    }, 100);
+  } else {
+    chatWindow.classList.remove('active');
+    chatButton.style.transform = 'scale(1)';
+  }
+}
+
+async function enviarMensaje() {
+  const input = document.getElementById('chat-input');
+  const mensaje = input.value.trim();
+
+  if (!mensaje) return;
+
+  agregarMensaje(mensaje, 'user');
+  input.value = '';
+
+  document.getElementById('chat-suggestions').style.display = 'none';
+  mostrarIndicadorEscritura(true);
+
+  await procesarMensajeIA(mensaje);
+
+  mostrarIndicadorEscritura(false);
+}
+
+function enviarPreguntaRapida(pregunta) {
+  document.getElementById('chat-input').value = pregunta;
+  enviarMensaje();
+}
+
+function agregarMensaje(texto, tipo) {
+  const messagesContainer = document.getElementById('chat-bot-messages');
+  const ahora = new Date();
+  const hora = ahora.toLocaleTimeString('es-PE', { hour: '2-digit', minute: '2-digit' });
+
+  const messageDiv = document.createElement('div');
+  messageDiv.className = `chat-message ${tipo}-message`;
+
+  messageDiv.innerHTML = `
+    <div class="message-avatar">
+      <i class="fas fa-${tipo === 'bot' ? 'robot' : 'user'}"></i>
+    </div>
+    <div class="message-content">
+      <div class="message-text">${texto}</div>
+      <div class="message-time">${hora}</div>
+    </div>
+  `;
+
+  messagesContainer.appendChild(messageDiv);
+
+  setTimeout(() => {
+    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+  }, 100);
+}
+
+function mostrarIndicadorEscritura(mostrar) {
+  const indicator = document.getElementById('chat-typing-indicator');
+  indicator.style.display = mostrar ? 'flex' : 'none';
+
+  if (mostrar) {
+    const messages = document.getElementById('chat-bot-messages');
+    messages.scrollTop = messages.scrollHeight;
+  }
+}
+
+async function procesarMensajeIA(mensajeUsuario) {
+  try {
+    // El servidor guarda la conversación y busca la última predicción:
+    // solo hace falta enviar el mensaje nuevo
+    const response = await fetch('/api/chat-bot', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ mensaje: mensajeUsuario })
+    });
+
+    const data = await response.json();
+
+    if (data.exito) {
+      agregarMensaje(data.respuesta, 'bot');
+
+      // NUEVO: Cerrar automáticamente si el bot lo indica
+      if (data.cerrar_chat) {
+        setTimeout(() => {
+          toggleChatBot();
+        }, 2000); // Espera 2 segundos antes de cerrar
+      }
+    } else {
+      agregarMensaje('Lo siento, tuve un problema al procesar tu solicitud. ¿Podrías intentarlo de nuevo?', 'bot');
+    }
+  } catch (error) {
+    console.error('Error en procesarMensajeIA:', error);
+    agregarMensaje('Disculpa, estoy teniendo problemas de conexión. Por favor intenta más tarde.', 'bot');
+  }
+}
+
+// Capturar predicciones automáticamente
+const formularioOriginalSubmit = document.getElementById('formulario');
+if (formularioOriginalSubmit) {
+  formularioOriginalSubmit.addEventListener('submit', async function(e) {
+    // El evento ya está manejado arriba, solo agregamos la notificación del chat
+    setTimeout(async () => {
+      const resHistorial = await fetch('/api/historial-json');
+      const historial = await resHistorial.json();
+
+      if (historial.length > 0 && !chatBotAbierto) {
+        const badge = document.getElementById('chat-badge');
+        badge.style.display = 'flex';
+        badge.textContent = '1';
+      }
+    }, 1500);
+  });
+}
+
+console.log('✅ Chat Bot Inteligente inicializado');
@@ -0,0 +1,387 @@
+      let chart = null;
+
+      document.addEventListener("DOMContentLoaded", () => {
+        const hoy = new Date().toISOString().split("T")[0];
+        document.getElementById("fecha").min = hoy;
+
+        cargarDatos();
+        cargarDashboard();
+        cargarHistorial();
+        cargarPerfil();
+      });
+
+      function mostrarSeccion(seccion) {
+        // Ocultar todas las secciones
+        document
+          .querySelectorAll(".section")
+          .forEach((s) => s.classList.remove("active"));
+        document
+          .querySelectorAll(".nav-link")
+          .forEach((l) => l.classList.remove("active"));
+
+        // Mostrar sección seleccionada
+        document.getElementById(seccion).classList.add("active");
+        event.target.closest(".nav-link")?.classList.add("active");
+
+        // Cargar datos dinámicos
+        if (seccion === "dashboard") {
+          cargarDashboard();
+        } else if (seccion === "historial") {
+          cargarHistorial();
+        } else if (seccion === "perfil") {
+          cargarPerfil();
+        }
+      }
+
+      async function cargarDatos() {
+        try {
+          const res = await fetch("/api/datos");
+          const data = await res.json();
+
+          llenarSelect("aerolinea", data.aerolineas);
+          llenarSelect("origen", data.origenes);
+          llenarSelect("destino", data.destinos);
+          llenarSelect("informacion", data.informaciones);
+        } catch (e) {
+          console.error("Error cargando datos:", e);
+        }
+      }
+
+      function llenarSelect(id, valores) {
+        const select = document.getElementById(id);
+        select.innerHTML = '<option value="">Seleccionar...</option>';
+        valores.forEach((v) => {
+          const opt = document.createElement("option");
+          opt.value = v;
+          opt.textContent = v;
+          select.appendChild(opt);
+        });
+      }
+
+      document
+        .getElementById("formulario")
+        .addEventListener("submit", async (e) => {
+          e.preventDefault();
+
+          const datos = {
+            aerolinea: document.getElementById("aerolinea").value,
+            fecha: document.getElementById("fecha").value,
+            origen: document.getElementById("origen").value,
+            destino: document.getElementById("destino").value,
+            hora_salida: document.getElementById("hora_salida").value,
+            duracion: document.getElementById("duracion").value,
+            escalas: document.getElementById("escalas").value,
+            informacion: document.getElementById("informacion").value,
+          };
+
+          try {
+            const res = await fetch("/api/predecir", {
+              method: "POST",
+              headers: { "Content-Type": "application/json" },
+              body: JSON.stringify(datos),
+            });
+
+            const result = await res.json();
+
+            if (result.exito) {
+              document.getElementById("precio").textContent =
+                result.precio.toFixed(2);
+              document.getElementById("resultado-ruta").textContent =
+                result.ruta;
+              document.getElementById("resultado-aerolinea").textContent =
+                result.aerolinea;
+              document.getElementById("resultado-fecha").textContent =
+                result.fecha;
+              document.getElementById("resultado").classList.add("show");
+
+              document.getElementById("formulario").reset();
+
+            // Restablecer fecha mínima
+            const hoy = new Date().toISOString().split("T")[0];
+            document.getElementById("fecha").min = hoy;
+            } else {
+              alert("Error: " + result.error);
+            }
+          } catch (e) {
+            alert("Error al predecir: " + e);
+          }
+        });
+
+      async function cargarDashboard() {
+        try {
+          const res = await fetch("/api/historial-json");
+          const predicciones = await res.json();
+
+          if (predicciones.length > 0) {
+            const precios = predicciones.map((p) => p.precio);
+            document.getElementById("total-pred").textContent =
+              predicciones.length;
+            document.getElementById("promedio-precio").textContent = (
+              precios.reduce((a, b) => a + b) / precios.length
+            ).toFixed(2);
+            document.getElementById("min-precio").textContent = Math.min(
+              ...precios
+            ).toFixed(2);
+            document.getElementById("max-precio").textContent = Math.max(
+              ...precios
+            ).toFixed(2);
+
+            // Gráfico
+            if (chart) chart.destroy();
+            const ctx = document
+              .getElementById("chartPrecios")
+              .getContext("2d");
+            chart = new Chart(ctx, {
+              type: "line",
+              data: {
+                labels: predicciones.map((p) => p.fecha),
+                datasets: [
+                  {
+                    label: "Precio Predicho (S/)",
+                    data: precios,
+                    borderColor: "#667eea",
+                    backgroundColor: "rgba(102, 126, 234, 0.1)",
+                    borderWidth: 3,
+                    fill: true,
+                    tension: 0.4,
+                    pointRadius: 6,
+                    pointBackgroundColor: "#667eea",
+                    pointBorderColor: "#fff",
+                    pointBorderWidth: 2,
+                  },
+                ],
+              },
+              options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: {
+                  legend: {
+                    display: true,
+                    labels: { color: "#666", font: { size: 14 } },
+                  },
+                },
+                scales: {
+                  y: {
+                    beginAtZero: true,
+                    grid: { color: "rgba(0,0,0,0.05)" },
+                    ticks: { color: "#666" },
+                  },
+                  x: {
+                    grid: { display: false },
+                    ticks: { color: "#666" },
+                  },
+                },
+              },
+            });
+          } else {
+            document.getElementById("total-pred").textContent = "0";
+            document.getElementById("promedio-precio").textContent = "0";
+            document.getElementById("min-precio").textContent = "0";
+            document.getElementById("max-precio").textContent = "0";
+          }
+        } catch (e) {
+          console.error("Error cargando dashboard:", e);
+        }
+      }
+
+      async function cargarHistorial() {
+        try {
+          const res = await fetch("/api/historial-json");
+          const predicciones = await res.json();
+
+          const tbody = document.getElementById("historial-body");
+          tbody.innerHTML = "";
+
+          if (predicciones.length === 0) {
+            tbody.innerHTML =
+              '<tr><td colspan="5" style="text-align: center; color: #999;">No hay predicciones aún</td></tr>';
+            return;
+          }
+
+          predicciones.forEach((p) => {
+            const tr = document.createElement("tr");
+            tr.innerHTML = `
+                        <td>${p.fecha}</td>
+                        <td><strong>${p.ruta}</strong></td>
+                        <td>${p.aerolinea}</td>
+                        <td><span class="badge-custom badge-price">S/ ${p.precio.toFixed(
+                          2
+                        )}</span></td>
+                        <td><small>${p.hora}</small></td>
+                    `;
+            tbody.appendChild(tr);
+          });
+        } catch (e) {
+          console.error("Error cargando historial:", e);
+        }
+      }
+
+
+      async function cargarPerfil() {
+        try {
+          const res = await fetch("/api/perfil");
+          const perfil = await res.json();
+
+          document.getElementById("perfil-usuario-input").value = perfil.usuario;
+          document.getElementById("perfil-email-input").value = perfil.email;
+          document.getElementById("perfil-fecha").textContent = perfil.fecha_creacion;
+          document.getElementById("perfil-total").textContent = perfil.total_predicciones + " predicciones";
+        } catch (e) {
+          console.error("Error cargando perfil:", e);
+        }
+      }
+
+      // ============ FUNCIONES NUEVAS DE EDICIÓN ============
+
+      function habilitarEdicion() {
+        document.getElementById("perfil-usuario-input").disabled = false;
+        document.getElementById("perfil-email-input").disabled = false;
+        document.querySelector(".perfil-actions").style.display = "none";
+        document.getElementById("perfil-save-actions").style.display = "flex";
+      }
+
+      function cancelarEdicion() {
+        document.getElementById("perfil-usuario-input").disabled = true;
+        document.getElementById("perfil-email-input").disabled = true;
+        document.querySelector(".perfil-actions").style.display = "flex";
+        document.getElementById("perfil-save-actions").style.display = "none";
+        cargarPerfil(); // Recargar datos originales
+      }
+
+      async function guardarPerfil() {
+        const usuario = document.getElementById("perfil-usuario-input").value.trim();
+        const email = document.getElementById("perfil-email-input").value.trim();
+
+        if (!usuario || !email) {
+          alert("Todos los campos son obligatorios");
+          return;
+        }
+
+        try {
+          const res = await fetch("/api/perfil/actualizar", {
+            method: "PUT",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ usuario, email })
+          });
+
+          const result = await res.json();
+
+          if (result.exito) {
+            alert("✓ " + result.mensaje);
+            cancelarEdicion();
+            cargarPerfil();
+          } else {
+            alert("✗ " + result.error);
+          }
+        } catch (e) {
+          alert("Error al actualizar perfil: " + e);
+        }
+      }
+
+      function mostrarCambiarContrasena() {
+        document.getElementById("perfil-info").style.display = "none";
+        document.getElementById("cambiar-contrasena-form").style.display = "block";
+      }
+
+      function ocultarCambiarContrasena() {
+        document.getElementById("perfil-info").style.display = "block";
+        document.getElementById("cambiar-contrasena-form").style.display = "none";
+        // Limpiar campos
+        document.getElementById("contrasena-actual").value = "";
+        document.getElementById("nueva-contrasena").value = "";
+        document.getElementById("confirmar-nueva-contrasena").value = "";
+      }
+
+      async function cambiarContrasena() {
+        const contrasena_actual = document.getElementById("contrasena-actual").value;
+        const nueva_contrasena = document.getElementById("nueva-contrasena").value;
+        const confirmar_contrasena = document.getElementById("confirmar-nueva-contrasena").value;
+
+        if (!contrasena_actual || !nueva_contrasena || !confirmar_contrasena) {
+          alert("Todos los campos son obligatorios");
+          return;
+        }
+
+        if (nueva_contrasena.length < 6) {
+          alert("La nueva contraseña debe tener al menos 6 caracteres");
+          return;
+        }
+
+        if (nueva_contrasena !== confirmar_contrasena) {
+          alert("Las contraseñas no coinciden");
+          return;
+        }
+
+        try {
+          const res = await fetch("/api/perfil/cambiar-contrasena", {
+            method: "PUT",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({
+              contrasena_actual,
+              nueva_contrasena,
+              confirmar_contrasena
+            })
+          });
+
+          const result = await res.json();
+
+          if (result.exito) {
+            alert("✓ " + result.mensaje);
+            ocultarCambiarContrasena();
+          } else {
+            alert("✗ " + result.error);
+          }
+        } catch (e) {
+          alert("Error al cambiar contraseña: " + e);
+        }
+      }
+// ============ FUNCIONES DE EXPORTACIÓN ============
+
+// Las exportaciones se generan en segundo plano: se encola el trabajo,
+// se consulta su estado y al terminar se descarga el archivo
+async function exportarHistorial(formato, nombre) {
+  try {
+    let response = await fetch('/api/exportaciones', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ formato: formato })
+    });
+    let trabajo = await response.json();
+
+    if (!response.ok) {
+      alert('Error: ' + trabajo.error);
+      return;
+    }
+
+    while (trabajo.estado === 'pendiente' || trabajo.estado === 'procesando') {
+      await new Promise(resolve => setTimeout(resolve, 1000));
+      response = await fetch(trabajo.url_estado);
+      trabajo = await response.json();
+    }
+
+    if (trabajo.estado !== 'listo') {
+      alert('Error: ' + (trabajo.error || 'No se pudo generar el archivo'));
+      return;
+    }
+
+    // Descargar archivo
+    const a = document.createElement('a');
+    a.href = trabajo.url_descarga;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+
+    alert(`✓ ${nombre} exportado exitosamente`);
+  } catch (e) {
+    alert(`Error al exportar ${nombre}: ` + e);
+    console.error(e);
+  }
+}
+
+function exportarExcel() {
+  return exportarHistorial('xlsx', 'Excel');
+}
+
+function exportarPDF() {
+  return exportarHistorial('pdf', 'PDF');
+}
@@ -0,0 +1,116 @@
+"""
+Pruebas del detector de intenciones y de las conversaciones del chat bot.
+
+    pytest test_predictor.py
+"""
+import os
+
+import numpy as np
+import pytest
+
+# Base en memoria: importar la app no debe necesitar Postgres
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import (PALABRAS_INTENCION, detectar_intencion, normalizar_texto, elegir_respuesta_bot,
+                 registrar_turnos, terminar_conversacion, ultima_plantilla)
+
+
+# ========== IMPLEMENTACIÓN ANTERIOR ==========
+def detectar_intencion_legado(mensaje):
+    """Copia de la implementación anterior (cadena de any(... in ...))"""
+    mensaje_lower = mensaje.lower()
+    saludos = ['hola', 'hey', 'buenos dias', 'buenas tardes', 'buenas noches', 'que tal', 'como estas', 'como estás', 'saludos']
+    if any(saludo in mensaje_lower for saludo in saludos):
+        return 'saludo'
+    despedidas = ['gracias', 'muchas gracias', 'perfecto', 'excelente', 'ok', 'vale', 'adios', 'adiós', 'chao', 'bye', 'hasta luego', 'nos vemos', 'listo', 'entendido', 'ya esta', 'ya está']
+    if any(despedida in mensaje_lower for despedida in despedidas):
+        return 'despedida'
+    if any(palabra in mensaje_lower for palabra in ['analiza', 'analizar', 'última', 'ultima', 'predicción', 'prediccion', 'resultado', 'mi vuelo', 'mi precio']):
+        return 'analizar_prediccion'
+    if any(palabra in mensaje_lower for palabra in ['ayuda', 'ayudar', 'ayudame', 'ayúdame', 'necesito', 'quiero', 'puedes']):
+        if any(palabra in mensaje_lower for palabra in ['predicción', 'prediccion', 'precio', 'vuelo', 'viajar', 'comprar']):
+            return 'ayuda_prediccion'
+    if 'temporada' in mensaje_lower:
+        return 'temporada'
+    if 'compar' in mensaje_lower and ('aerolínea' in mensaje_lower or 'aerolinea' in mensaje_lower):
+        return 'comparar_aerolineas'
+    if any(palabra in mensaje_lower for palabra in ['cuándo', 'cuando', 'mejor momento', 'cuando comprar', 'cuándo comprar']):
+        return 'cuando_comprar'
+    if 'escala' in mensaje_lower:
+        return 'escalas'
+    if any(palabra in mensaje_lower for palabra in ['día', 'dia', 'mejor dia', 'mejor día']):
+        return 'dias_semana'
+    if any(palabra in mensaje_lower for palabra in ['consejo', 'tip', 'recomendación', 'recomendacion', 'sugerencia']):
+        return 'consejos'
+    return 'generico'
+
+
+def corpus_intenciones(cantidad, semilla=7):
+    """Mensajes sintéticos: palabras clave (con y sin tildes, mayúsculas) mezcladas con relleno"""
+    rng = np.random.default_rng(semilla)
+    claves = sorted({p for palabras in PALABRAS_INTENCION.values() for p in palabras})
+    claves += ['día', 'Cuándo', 'aerolínea', 'predicción', 'última', 'ayúdame', 'adiós', 'ya está',
+               'cómo estás', 'recomendación', 'BUENOS DÍAS', 'Mejor Día']
+    relleno = ['el', 'vuelo', 'a', 'cusco', 'por', 'favor', 'tokio', 'media', 'compra', 'escalera',
+               'lima', 'mañana', 'barato', 'qué', 'precios', 'tipo', 'también', 'hoy', '?', '!']
+    mensajes = ['', 'hola', 'Buenos días', 'cuándo compro', 'compara aerolíneas', 'mejor día para volar',
+                'necesito ayuda con el precio', 'tips de escalas', 'ok gracias']
+    while len(mensajes) < cantidad:
+        palabras = list(rng.choice(relleno, rng.integers(0, 8)))
+        palabras += list(rng.choice(claves, rng.integers(0, 3)))
+        rng.shuffle(palabras)
+        mensajes.append(' '.join(palabras))
+    return mensajes
+
+
+# ========== PRUEBAS ==========
+def test_paridad_con_implementacion_anterior():
+    # La anterior no trataba 'buenos días' como 'buenos dias': se compara sobre el texto sin tildes
+    diferencias = [m for m in corpus_intenciones(5_000)
+                   if detectar_intencion(m) != detectar_intencion_legado(normalizar_texto(m))]
+    assert diferencias == []
+
+
+def test_paridad_en_mensajes_sin_tildes():
+    sin_tildes = [m for m in corpus_intenciones(5_000) if m == normalizar_texto(m)]
+    assert [m for m in sin_tildes if detectar_intencion(m) != detectar_intencion_legado(m)] == []
+
+
+@pytest.mark.parametrize('con_tilde, sin_tilde, intencion', [
+    ('¿qué día conviene?', '¿que dia conviene?', 'dias_semana'),
+    ('Mejor Día para volar', 'mejor dia para volar', 'dias_semana'),
+    ('¿cuándo compro?', '¿cuando compro?', 'cuando_comprar'),
+    ('Buenos días', 'buenos dias', 'saludo'),
+    ('compara aerolíneas', 'compara aerolineas', 'comparar_aerolineas'),
+    ('analiza mi predicción', 'analiza mi prediccion', 'analizar_prediccion'),
+    ('adiós', 'adios', 'despedida'),
+])
+def test_tildes_y_mayusculas(con_tilde, sin_tilde, intencion):
+    assert detectar_intencion(con_tilde) == intencion
+    assert detectar_intencion(sin_tilde) == intencion
+    assert detectar_intencion(con_tilde.upper()) == intencion
+
+
+def test_mensaje_sin_palabras_clave():
+    assert detectar_intencion('') == 'generico'
+    assert detectar_intencion('vuelo a cusco') == 'generico'
+
+
+# ========== CONVERSACIÓN ==========
+def test_seguimiento_usa_el_tema_anterior():
+    assert elegir_respuesta_bot('¿y en julio?', None, 'escalas') == ('escalas', None)
+    assert elegir_respuesta_bot('¿y en julio?', None, 'saludo') == ('generico', None)
+    assert elegir_respuesta_bot('¿y en julio?', None) == ('generico', None)
+    # Un mensaje con palabras clave cambia de tema
+    assert elegir_respuesta_bot('dame consejos', None, 'escalas') == ('consejos', None)
+
+
+def test_ultima_plantilla_de_la_conversacion():
+    usuario_id = -1
+    assert ultima_plantilla(usuario_id) is None
+    registrar_turnos(usuario_id, {'role': 'user', 'content': 'escalas'},
+                     {'role': 'assistant', 'plantilla': 'escalas'},
+                     {'role': 'user', 'content': '¿y en julio?'})
+    assert ultima_plantilla(usuario_id) == 'escalas'
+    terminar_conversacion(usuario_id)
+    assert ultima_plantilla(usuario_id) is None
@@ -18,8 +18,79 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import os
 import sys  # ✅ AGREGAR ESTA LÍNEA
+import time
+
+# Hiperparámetros del bosque (compartidos por el entrenamiento local y el distribuido)
+N_ESTIMADORES = 200
+PARAMETROS_BOSQUE = {
+    'max_depth': 20,          # Profundidad máxima de 20 niveles
+    'min_samples_split': 5,   # Mínimo 5 muestras para dividir nodo
+    'min_samples_leaf': 2,    # Mínimo 2 muestras por hoja
+}
+SEMILLA_BASE = 42
+ARCHIVO_DATOS_SHARDS = 'datos_preprocesados.pkl'
+
+
+# ========== ENTRENAMIENTO DISTRIBUIDO (SHARDS) ==========
+def semilla_shard(indice_shard, semilla_base=SEMILLA_BASE):
+    """Semilla independiente de cada shard, derivada solo de su índice"""
+    secuencia = np.random.SeedSequence(semilla_base, spawn_key=(indice_shard,))
+    return int(secuencia.generate_state(1)[0])
+
+
+def repartir_arboles(total_arboles, n_shards):
+    """Reparte el presupuesto de árboles entre los shards"""
+    base, resto = divmod(total_arboles, n_shards)
+    return [base + (1 if i < resto else 0) for i in range(n_shards)]
+
+
+def ruta_subbosque(directorio, indice_shard):
+    return os.path.join(directorio, f'subbosque_{indice_shard:03d}.pkl')
+
+
+def entrenar_subbosque(directorio, indice_shard, n_shards, total_arboles=N_ESTIMADORES,
+                       fragmentar_filas=False):
+    """Entrena el sub-bosque de un shard (un nodo) y lo guarda en el directorio compartido"""
+    datos = joblib.load(os.path.join(directorio, ARCHIVO_DATOS_SHARDS), mmap_mode='r')
+    X, y = datos['X'], datos['y']
+
+    # Opcionalmente cada nodo ve solo su fragmento de filas
+    if fragmentar_filas:
+        X = X[indice_shard::n_shards]
+        y = y[indice_shard::n_shards]
+
+    n_arboles = repartir_arboles(total_arboles, n_shards)[indice_shard]
+    inicio = time.perf_counter()
+    subbosque = RandomForestRegressor(
+        n_estimators=n_arboles,
+        random_state=semilla_shard(indice_shard),
+        n_jobs=1,  # Un proceso por shard: el paralelismo lo dan los nodos
+        **PARAMETROS_BOSQUE
+    )
+    subbosque.fit(X, y)
+    segundos = time.perf_counter() - inicio
+
+    # Escritura atómica para que el coordinador nunca lea un archivo a medias
+    ruta = ruta_subbosque(directorio, indice_shard)
+    joblib.dump(subbosque, ruta + '.tmp')
+    os.replace(ruta + '.tmp', ruta)
+
+    return {'shard': indice_shard, 'arboles': n_arboles, 'filas': len(y), 'segundos': segundos}
+
+
+def fusionar_subbosques(subbosques):
+    """Une los estimators_ de varios sub-bosques en un único RandomForestRegressor"""
+    modelo = subbosques[0]
+    for subbosque in subbosques[1:]:
+        modelo.estimators_ += subbosque.estimators_
+    modelo.n_estimators = len(modelo.estimators_)
+    modelo.n_jobs = -1
+    return modelo
+
 
 class EntrenadorModeloVuelos:
     def __init__(self, archivo_datos='datos_vuelos_peru.xlsx'):
@@ -124,18 +195,72 @@ class EntrenadorModeloVuelos:
         print("\n🤖 Entrenando modelo RandomForest...")
         
         self.modelo = RandomForestRegressor(
-            n_estimators=200, # 200 árboles de decisión
-            max_depth=20,     # Profundidad máxima de 20 niveles
-            min_samples_split=5, # Mínimo 5 muestras para dividir nodo
-            min_samples_leaf=2,  # Mínimo 2 muestras por hoja
-            random_state=42,  # Semilla para reproducibilidad
+            n_estimators=N_ESTIMADORES, # 200 árboles de decisión
+            random_state=SEMILLA_BASE,  # Semilla para reproducibilidad
             n_jobs=-1,  # Usa todos los núcleos CPU disponibles
-            verbose=1   # Muestra progreso
+            verbose=1,  # Muestra progreso
+            **PARAMETROS_BOSQUE
         )
         
         self.modelo.fit(self.X_train_scaled, self.y_train)
         print("✓ Modelo entrenado exitosamente")
     
+    def exportar_datos_shards(self, directorio):
+        """Deja los datos preprocesados en el directorio compartido por los nodos"""
+        os.makedirs(directorio, exist_ok=True)
+        for archivo in os.listdir(directorio):
+            if archivo.startswith('subbosque_'):
+                os.remove(os.path.join(directorio, archivo))
+        
+        joblib.dump({
+            'X': np.ascontiguousarray(self.X_train_scaled, dtype=np.float32),
+            'y': np.ascontiguousarray(self.y_train, dtype=np.float64)
+        }, os.path.join(directorio, ARCHIVO_DATOS_SHARDS))
+    
+    def entrenar_modelo_distribuido(self, n_shards, directorio='shards_entrenamiento',
+                                    fragmentar_filas=False, esperar_trabajadores=False,
+                                    timeout=3600):
+        """Entrena el bosque repartido en N shards y fusiona los sub-bosques
+        
+        Por defecto lanza un proceso local por shard (como sustituto de cada
+        máquina). Con esperar_trabajadores=True solo publica los datos y espera
+        a que otros hosts ejecuten `python training.py --trabajador I` sobre el
+        mismo directorio compartido.
+        """
+        print(f"\n🌐 Entrenando modelo distribuido en {n_shards} shards...")
+        
+        self.exportar_datos_shards(directorio)
+        inicio = time.perf_counter()
+        
+        if esperar_trabajadores:
+            print(f"⏳ Esperando sub-bosques en {directorio}/ ...")
+            pendientes = set(range(n_shards))
+            while pendientes:
+                pendientes = {i for i in pendientes
+                              if not os.path.exists(ruta_subbosque(directorio, i))}
+                if time.perf_counter() - inicio > timeout:
+                    raise TimeoutError(f"Shards sin terminar: {sorted(pendientes)}")
+                time.sleep(1)
+            resultados = []
+        else:
+            with ProcessPoolExecutor(max_workers=n_shards) as ejecutor:
+                futuros = [
+                    ejecutor.submit(entrenar_subbosque, directorio, i, n_shards,
+                                    N_ESTIMADORES, fragmentar_filas)
+                    for i in range(n_shards)
+                ]
+                resultados = [f.result() for f in futuros]
+            for r in resultados:
+                print(f"✓ Shard {r['shard']}: {r['arboles']} árboles, "
+                      f"{r['filas']} filas, {r['segundos']:.2f}s")
+        
+        subbosques = [joblib.load(ruta_subbosque(directorio, i)) for i in range(n_shards)]
+        self.modelo = fusionar_subbosques(subbosques)
+        segundos = time.perf_counter() - inicio
+        
+        print(f"✓ Bosque fusionado: {self.modelo.n_estimators} árboles en {segundos:.2f}s")
+        return segundos
+    
     def evaluar_modelo(self):
         """Evalúa el rendimiento del modelo"""
         print("\n📋 Evaluando modelo...")
@@ -214,7 +339,7 @@ class EntrenadorModeloVuelos:
         print(f"Total de registros: {len(self.df)}")
         print(f"Features usados: {len(self.features)}")
         print(f"\nModelo: RandomForestRegressor")
-        print(f"Estimadores: 200")
+        print(f"Estimadores: {self.modelo.n_estimators}")
         print(f"Profundidad máxima: 20")
         print(f"\nRendimiento en PRUEBA:")
         print(f"  R² Score: {metricas['test_r2']:.4f}")
@@ -237,7 +362,8 @@ class EntrenadorModeloVuelos:
     
     #    print("\n✅ ¡Modelo entrenado y guardado exitosamente!")
     #    return True
-    def entrenar_completo(self):
+    def entrenar_completo(self, n_shards=1, directorio_shards='shards_entrenamiento',
+                          fragmentar_filas=False, esperar_trabajadores=False):
         """Ejecuta el pipeline completo de entrenamiento"""
         try:
             if not self.cargar_datos():
@@ -246,7 +372,11 @@ class EntrenadorModeloVuelos:
             self.preprocesar_datos()
             self.dividir_datos()
             self.escalar_datos()
-            self.entrenar_modelo()
+            if n_shards > 1 or esperar_trabajadores:
+                self.entrenar_modelo_distribuido(n_shards, directorio_shards,
+                                                 fragmentar_filas, esperar_trabajadores)
+            else:
+                self.entrenar_modelo()
             metricas = self.evaluar_modelo()
             self.guardar_modelo()
             self.generar_reporte(metricas)
@@ -274,9 +404,61 @@ class EntrenadorModeloVuelos:
 #if __name__ == "__main__":
 #    main()
 
-def main():
+def benchmark_shards(archivo, lista_shards=(1, 2, 4, 8), directorio='shards_entrenamiento',
+                     fragmentar_filas=False):
+    """Mide la eficiencia de escalado del entrenamiento distribuido"""
+    lista_shards = sorted(set(lista_shards) | {1})
+    
+    entrenador = EntrenadorModeloVuelos(archivo)
+    if not entrenador.cargar_datos():
+        return False
+    entrenador.preprocesar_datos()
+    entrenador.dividir_datos()
+    entrenador.escalar_datos()
+    
+    resultados = []
+    for n_shards in lista_shards:
+        segundos = entrenador.entrenar_modelo_distribuido(n_shards, directorio, fragmentar_filas)
+        y_pred = entrenador.modelo.predict(entrenador.X_test_scaled)
+        resultados.append({
+            'shards': n_shards,
+            'segundos': segundos,
+            'r2': r2_score(entrenador.y_test, y_pred),
+            'rmse': np.sqrt(mean_squared_error(entrenador.y_test, y_pred))
+        })
+    
+    t1 = resultados[0]['segundos']
+    print("\n" + "="*50)
+    print("ESCALADO DEL ENTRENAMIENTO DISTRIBUIDO")
+    print("="*50)
+    print(f"Núcleos disponibles: {os.cpu_count()}")
+    print(f"{'Shards':>6} {'Tiempo':>9} {'Speedup':>8} {'Eficiencia':>10} {'R²':>7} {'RMSE':>8}")
+    for r in resultados:
+        speedup = t1 / r['segundos']
+        print(f"{r['shards']:>6} {r['segundos']:>8.2f}s {speedup:>7.2f}x "
+              f"{speedup / r['shards']:>9.0%} {r['r2']:>7.4f} {r['rmse']:>8.2f}")
+    return True
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description='Entrenamiento del modelo de precios de vuelos')
+    parser.add_argument('--archivo', default='datos_vuelos.xlsx')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='Número de sub-bosques entrenados en procesos/nodos independientes')
+    parser.add_argument('--directorio', default='shards_entrenamiento',
+                        help='Directorio compartido entre el coordinador y los nodos')
+    parser.add_argument('--fragmentar-filas', action='store_true',
+                        help='Cada shard entrena solo con su fragmento de filas')
+    parser.add_argument('--esperar-trabajadores', action='store_true',
+                        help='No lanzar procesos locales: esperar a nodos remotos')
+    parser.add_argument('--trabajador', type=int, metavar='INDICE',
+                        help='Ejecuta solo el shard INDICE (modo nodo remoto)')
+    parser.add_argument('--benchmark-shards', metavar='LISTA',
+                        help='Mide el escalado, p. ej. 1,2,4,8')
+    return parser.parse_args()
+
+def main(archivo='datos_vuelos.xlsx', n_shards=1, directorio_shards='shards_entrenamiento',
+         fragmentar_filas=False, esperar_trabajadores=False):
     # Verificar si existen los datos
-    archivo = 'datos_vuelos.xlsx'
     if not os.path.exists(archivo):
         print(f"⚠️  {archivo} no encontrado")
         print("Ejecuta primero: python generar_datos.py")
@@ -284,10 +466,24 @@ def main():
     
     # Entrenar modelo
     entrenador = EntrenadorModeloVuelos(archivo)
-    resultado = entrenador.entrenar_completo()
+    resultado = entrenador.entrenar_completo(n_shards, directorio_shards,
+                                             fragmentar_filas, esperar_trabajadores)
     return resultado
 
 if __name__ == "__main__":
-    success = main()
+    args = parsear_argumentos()
+    
+    if args.trabajador is not None:
+        # Modo nodo: entrena un shard sobre los datos publicados por el coordinador
+        r = entrenar_subbosque(args.directorio, args.trabajador, args.shards,
+                               fragmentar_filas=args.fragmentar_filas)
+        print(f"✓ Shard {r['shard']}: {r['arboles']} árboles en {r['segundos']:.2f}s")
+        success = True
+    elif args.benchmark_shards:
+        lista = [int(n) for n in args.benchmark_shards.split(',')]
+        success = benchmark_shards(args.archivo, lista, args.directorio, args.fragmentar_filas)
+    else:
+        success = main(args.archivo, args.shards, args.directorio,
+                       args.fragmentar_filas, args.esperar_trabajadores)
     if not success:
         exit(1)
\ No newline at end of file